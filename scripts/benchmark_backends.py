@@ -0,0 +1,120 @@
+"""
+Benchmark the compiled and the pure Python parser against each other.
+
+Runs the same workloads with both backends: a large file upload in big and in
+small chunks, and a form with many small fields. Run it with PyPy to see how the
+pure Python parser does there (the compiled one is not available on PyPy).
+"""
+
+import argparse
+import importlib
+import platform
+import time
+
+from numpy import random
+from requests_toolbelt import MultipartEncoder
+
+from streaming_form_data import StreamingFormDataParser, parser
+from streaming_form_data.targets import NullTarget, ValueTarget
+
+BACKENDS = {
+    "cython": "streaming_form_data._parser",
+    "python": "streaming_form_data._pyparser",
+}
+
+
+def use_backend(name: str) -> bool:
+    """Make StreamingFormDataParser use the given backend, if available."""
+    try:
+        module = importlib.import_module(BACKENDS[name])
+    except ImportError:
+        return False
+
+    for attribute in ("ErrorGroup", "Part", "PartIndex", "_Parser"):
+        setattr(parser, attribute, getattr(module, attribute))
+
+    return True
+
+
+def file_workload(size_mb: int) -> tuple[bytes, str, list[str]]:
+    encoder = MultipartEncoder(
+        fields={
+            "file": (
+                "file.bin",
+                random.bytes(size_mb * 1024 * 1024),
+                "application/octet-stream",
+            )
+        }
+    )
+
+    return encoder.to_string(), encoder.content_type, ["file"]
+
+
+def fields_workload(count: int) -> tuple[bytes, str, list[str]]:
+    names = [f"field{index}" for index in range(count)]
+    encoder = MultipartEncoder(fields={name: "value " * 8 for name in names})
+
+    return encoder.to_string(), encoder.content_type, names
+
+
+def run_single_benchmark(
+    multipart_data: bytes, content_type: str, names: list[str], chunk_size: int
+):
+    parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+
+    for name in names:
+        parser.register(name, NullTarget() if name == "file" else ValueTarget())
+
+    view = memoryview(multipart_data)
+    chunks = [
+        bytes(view[index : index + chunk_size])
+        for index in range(0, len(multipart_data), chunk_size)
+    ]
+
+    start_time = time.perf_counter()
+
+    for chunk in chunks:
+        parser.data_received(chunk)
+
+    return time.perf_counter() - start_time
+
+
+def benchmark_backends(size_mb: int, fields: int, iterations: int):
+    workloads = [
+        (f"{size_mb}MB file, 256KB chunks", file_workload(size_mb), 256 * 1024),
+        (f"{size_mb}MB file, 1KB chunks", file_workload(size_mb), 1024),
+        (f"{fields} fields, 64KB chunks", fields_workload(fields), 64 * 1024),
+    ]
+
+    print(f"{platform.python_implementation()} {platform.python_version()}")
+    print(f"best of {iterations} iterations\n")
+
+    for name in BACKENDS:
+        if not use_backend(name):
+            print(f"{name}: not available\n")
+            continue
+
+        print(name)
+
+        for label, (multipart_data, content_type, names), chunk_size in workloads:
+            duration = min(
+                run_single_benchmark(multipart_data, content_type, names, chunk_size)
+                for _ in range(iterations)
+            )
+            throughput = len(multipart_data) / duration / 1024**2
+
+            print(f"  {label:<28} {duration * 1000:>8.1f}ms {throughput:>8.0f}MB/s")
+
+        print()
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(
+        description="Benchmark the compiled and the pure Python parser"
+    )
+    arguments.add_argument("--size", type=int, default=32, help="File size in MB")
+    arguments.add_argument("--fields", type=int, default=1000)
+    arguments.add_argument("--iterations", type=int, default=5)
+    args = arguments.parse_args()
+
+    benchmark_backends(args.size, args.fields, args.iterations)
@@ -0,0 +1,87 @@
+"""
+Benchmark the cost of setting up a parser for a request.
+
+Compares creating a parser and registering the targets for every request with
+binding a prebuilt schema and resetting a pooled parser, for both a boundary seen
+before (cached) and a new one for every request.
+"""
+
+import argparse
+import time
+import uuid
+
+from streaming_form_data import FormSchema, StreamingFormDataParser
+from streaming_form_data.parser import parse_content_boundary
+from streaming_form_data.targets import ValueTarget
+
+
+def make_headers(count: int, unique: bool) -> list[dict[str, str]]:
+    boundaries = [uuid.uuid4().hex if unique else "----boundary" for _ in range(count)]
+
+    return [
+        {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        for boundary in boundaries
+    ]
+
+
+def benchmark(label: str, function, headers: list[dict[str, str]]):
+    start_time = time.perf_counter()
+
+    for value in headers:
+        function(value)
+
+    duration = time.perf_counter() - start_time
+
+    print(f"{label:<24} {duration * 1e6 / len(headers):>8.2f}us")
+
+
+def benchmark_constructor(fields: int, requests: int):
+    names = [f"field{index}" for index in range(fields)]
+
+    schema = FormSchema()
+    for name in names:
+        schema.register(name, ValueTarget)
+
+    pooled = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=pool"}, schema=schema
+    )
+
+    def parse_boundary(headers):
+        parse_content_boundary(headers)
+
+    def register(headers):
+        parser = StreamingFormDataParser(headers=headers)
+        for name in names:
+            parser.register(name, ValueTarget())
+
+    def bind(headers):
+        StreamingFormDataParser(headers=headers, schema=schema)
+
+    def reset(headers):
+        pooled.reset(headers)
+
+    print(f"{fields} fields, {requests} requests\n")
+
+    for unique in (False, True):
+        print("new boundary per request" if unique else "same boundary")
+
+        for label, function in (
+            ("parse_content_boundary", parse_boundary),
+            ("constructor + register", register),
+            ("constructor + schema", bind),
+            ("reset", reset),
+        ):
+            benchmark(label, function, make_headers(requests, unique))
+
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark setting up streaming-form-data parsers"
+    )
+    parser.add_argument("--fields", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=10000)
+    args = parser.parse_args()
+
+    benchmark_constructor(args.fields, args.requests)
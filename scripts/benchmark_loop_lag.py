@@ -0,0 +1,120 @@
+"""
+Measure how long the event loop is blocked while parsing large chunks.
+
+A ticker task sleeps for a millisecond in a loop and records how late it wakes up,
+while the parser handles a large file upload with adata_received. Compare the lag
+with and without --offload-threshold, --scan-budget or --time-budget (along with
+--max-emit-size).
+"""
+
+import argparse
+import asyncio
+import time
+
+from numpy import random
+from requests_toolbelt import MultipartEncoder
+
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.targets import NullTarget
+
+TICK = 0.001
+
+
+async def ticker(lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        start_time = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start_time - TICK)
+
+
+def percentile_of(values: list[float], percentile: int) -> float:
+    return values[min(len(values) - 1, len(values) * percentile // 100)]
+
+
+async def run_benchmark(
+    size_mb: int,
+    chunk_size_kb: int,
+    offload_threshold_kb: int | None,
+    scan_budget_kb: int | None,
+    time_budget_us: int | None,
+    max_emit_size_kb: int | None,
+):
+    encoder = MultipartEncoder(
+        fields={
+            "file": (
+                "file.bin",
+                random.bytes(size_mb * 1024 * 1024),
+                "application/octet-stream",
+            )
+        }
+    )
+    multipart_data = encoder.to_string()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type},
+        offload_threshold=(
+            offload_threshold_kb * 1024 if offload_threshold_kb is not None else None
+        ),
+        scan_budget=scan_budget_kb * 1024 if scan_budget_kb is not None else None,
+        scan_time_budget=time_budget_us,
+        max_emit_size=max_emit_size_kb * 1024 if max_emit_size_kb is not None else None,
+    )
+    parser.register("file", NullTarget())
+
+    chunk_size = chunk_size_kb * 1024
+    view = memoryview(multipart_data)
+    chunks = [
+        view[index : index + chunk_size]
+        for index in range(0, len(multipart_data), chunk_size)
+    ]
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK)
+
+    start_time = time.perf_counter()
+
+    for chunk in chunks:
+        await parser.adata_received(chunk)
+        await asyncio.sleep(0)
+
+    duration = time.perf_counter() - start_time
+
+    stop.set()
+    await task
+
+    lags.sort()
+    percentiles = ", ".join(
+        f"p{percentile} {percentile_of(lags, percentile) * 1000:.2f}ms"
+        for percentile in (50, 90, 99)
+    )
+
+    print(f"parsed {size_mb}MB in {chunk_size_kb}KB chunks in {duration * 1000:.1f}ms")
+    print(
+        f"loop lag over {len(lags)} ticks: {percentiles}, max {lags[-1] * 1000:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(
+        description="Measure event loop lag while parsing large chunks"
+    )
+    arguments.add_argument("--size", type=int, default=256, help="File size in MB")
+    arguments.add_argument("--chunk-size", type=int, default=16384, help="In KB")
+    arguments.add_argument("--offload-threshold", type=int, help="In KB")
+    arguments.add_argument("--scan-budget", type=int, help="In KB")
+    arguments.add_argument("--time-budget", type=int, help="In microseconds")
+    arguments.add_argument("--max-emit-size", type=int, help="In KB")
+    args = arguments.parse_args()
+
+    asyncio.run(
+        run_benchmark(
+            args.size,
+            args.chunk_size,
+            args.offload_threshold,
+            args.scan_budget,
+            args.time_budget,
+            args.max_emit_size,
+        )
+    )
@@ -0,0 +1,102 @@
+"""
+Benchmark feeding the parser with very small chunks.
+
+Proxies forwarding tiny TCP segments result in lots of 1-100 byte chunks. The time
+spent per input byte should stay constant regardless of the total input size, even
+while a large header block is pending.
+"""
+
+import argparse
+import time
+
+from numpy import random
+from requests_toolbelt import MultipartEncoder
+
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.targets import NullTarget
+
+CHUNK_SIZES = (1, 7, 64)
+BODY_SIZES_KB = (32, 64, 128, 256)
+
+
+def create_multipart_data(size_kb: int, header_size: int) -> tuple[bytes, str]:
+    """Create a multipart body with one file field and a large header block."""
+    filename = "f" * header_size + ".bin"
+
+    encoder = MultipartEncoder(
+        fields={
+            "file": (filename, random.bytes(size_kb * 1024), "application/octet-stream")
+        }
+    )
+
+    return encoder.to_string(), encoder.content_type
+
+
+def run_single_benchmark(
+    multipart_data: bytes, content_type: str, chunk_size: int, min_emit_size: int
+):
+    """Feed the whole body in chunks of chunk_size bytes and return the duration."""
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type}, min_emit_size=min_emit_size
+    )
+    parser.register("file", NullTarget())
+
+    chunks = [
+        multipart_data[index : index + chunk_size]
+        for index in range(0, len(multipart_data), chunk_size)
+    ]
+
+    start_time = time.perf_counter()
+
+    for chunk in chunks:
+        parser.data_received(chunk)
+
+    return time.perf_counter() - start_time
+
+
+def benchmark_small_chunks(header_size: int, min_emit_size: int, iterations: int):
+    print(
+        f"Header block: {header_size} bytes, minimum emit size: {min_emit_size} "
+        f"bytes, best of {iterations} iterations\n"
+    )
+    print(f"{'chunk':>6} {'body':>8} {'time':>10} {'per byte':>10}")
+
+    for chunk_size in CHUNK_SIZES:
+        for size_kb in BODY_SIZES_KB:
+            multipart_data, content_type = create_multipart_data(size_kb, header_size)
+
+            duration = min(
+                run_single_benchmark(
+                    multipart_data, content_type, chunk_size, min_emit_size
+                )
+                for _ in range(iterations)
+            )
+
+            print(
+                f"{chunk_size:>5}B {size_kb:>6}KB {duration * 1000:>8.1f}ms "
+                f"{duration * 1e9 / len(multipart_data):>8.1f}ns"
+            )
+
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark streaming-form-data parser with small chunks"
+    )
+    parser.add_argument(
+        "--header-size",
+        type=int,
+        default=16 * 1024,
+        help="Size of the (pending) part header block in bytes",
+    )
+    parser.add_argument(
+        "--min-emit-size",
+        type=int,
+        default=0,
+        help="Minimum amount of body data handed over to the target at once",
+    )
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark_small_chunks(args.header_size, args.min_emit_size, args.iterations)
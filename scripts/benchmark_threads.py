@@ -0,0 +1,102 @@
+"""
+Benchmark parsing uploads in multiple threads at once.
+
+The parser releases the GIL while searching large chunks for the boundary (and
+while copying large body slices), so threaded servers parsing several uploads at
+the same time should see the throughput scale with the number of cores.
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from numpy import random
+from requests_toolbelt import MultipartEncoder
+
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.targets import NullTarget
+
+
+def create_multipart_data(size_mb: int) -> tuple[bytes, str]:
+    """Create a multipart body with one file field."""
+    encoder = MultipartEncoder(
+        fields={
+            "file": (
+                "file.bin",
+                random.bytes(size_mb * 1024 * 1024),
+                "application/octet-stream",
+            )
+        }
+    )
+
+    return encoder.to_string(), encoder.content_type
+
+
+def parse(multipart_data: bytes, content_type: str, chunk_size: int, rounds: int):
+    view = memoryview(multipart_data)
+
+    for _ in range(rounds):
+        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+        parser.register("file", NullTarget())
+
+        for index in range(0, len(multipart_data), chunk_size):
+            parser.data_received(view[index : index + chunk_size])
+
+
+def run_single_benchmark(
+    multipart_data: bytes, content_type: str, chunk_size: int, threads: int, rounds: int
+):
+    """Parse the body rounds times in each of the given number of threads."""
+    workers = [
+        threading.Thread(
+            target=parse, args=(multipart_data, content_type, chunk_size, rounds)
+        )
+        for _ in range(threads)
+    ]
+
+    start_time = time.perf_counter()
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    return time.perf_counter() - start_time
+
+
+def benchmark_threads(size_mb: int, chunk_size: int, max_threads: int, rounds: int):
+    multipart_data, content_type = create_multipart_data(size_mb)
+
+    print(f"Body: {size_mb}MB, chunk size: {chunk_size} bytes, {rounds} rounds\n")
+    print(f"{'threads':>7} {'time':>10} {'throughput':>12} {'scaling':>8}")
+
+    baseline = None
+
+    for threads in range(1, max_threads + 1):
+        duration = run_single_benchmark(
+            multipart_data, content_type, chunk_size, threads, rounds
+        )
+        throughput = threads * rounds * len(multipart_data) / duration / 1024**2
+
+        if baseline is None:
+            baseline = throughput
+
+        print(
+            f"{threads:>7} {duration * 1000:>8.1f}ms {throughput:>8.0f}MB/s "
+            f"{throughput / baseline:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark streaming-form-data parser in multiple threads"
+    )
+    parser.add_argument("--size", type=int, default=64, help="Body size in MB")
+    parser.add_argument("--chunk-size", type=int, default=256 * 1024)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark_threads(args.size, args.chunk_size, args.threads, args.rounds)
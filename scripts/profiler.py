@@ -58,6 +58,11 @@ def parse_args():
         required=False,
         help="Size of generated data" + " to be used instead of real file",
     )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print the statistics collected by the parser",
+    )
     return parser.parse_args()
 
 
@@ -84,11 +89,17 @@ def main():
     with open_data(args) as fd:
         encoder = MultipartEncoder(fields={"file": ("file", fd, args.content_type)})
 
-        parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": encoder.content_type}, stats=args.stats
+        )
         parser.register("file", ValueTarget())
 
         parser.data_received(encoder.to_string())
 
+        if parser.stats is not None:
+            for name, value in parser.stats._asdict().items():
+                print(f"{name}: {value}")
+
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,5 @@
 from streaming_form_data.parser import (  # NOQA
+    FormSchema,
     StreamingFormDataParser,
     ParseFailedException,
 )
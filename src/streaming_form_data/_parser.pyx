@@ -1,10 +1,21 @@
 # cython: language_level=3
 
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
+from cpython.mem cimport PyMem_Free, PyMem_Malloc, PyMem_Realloc
+from libc.string cimport memcmp, memcpy, memmove, memset
+
+import asyncio
+import inspect
+import re
 from operator import eq
+from time import perf_counter
+from urllib.parse import unquote_to_bytes
 
 from email.policy import HTTP
 from email.parser import Parser
 
+from streaming_form_data.events import Data, PartEnd, PartStart
+from streaming_form_data.tracing import PartTrace
 from streaming_form_data.targets import NullTarget
 
 
@@ -16,8 +27,40 @@ ctypedef unsigned char Byte  # noqa: E999
 cdef int c_hyphen = 45
 cdef int c_cr = 13
 cdef int c_lf = 10
+cdef int c_tab = 9
+cdef int c_space = 32
+cdef int c_quote = 34
+cdef int c_percent = 37
+cdef int c_apostrophe = 39
+cdef int c_asterisk = 42
+cdef int c_slash = 47
+cdef int c_colon = 58
+cdef int c_semicolon = 59
+cdef int c_equals = 61
+cdef int c_backslash = 92
+
+cdef int c_header_cache_size = 64
+
+# Body data is handed over to targets in pieces of at least this many bytes by
+# default, unless the part ends before
 cdef int c_min_file_body_chunk_size = 1024
 
+# Searching or copying at least this many bytes is done without holding the GIL,
+# so that other threads can run meanwhile. Below that, releasing and acquiring
+# it again costs more than what there is to gain.
+cdef size_t c_nogil_min_length = 16384
+
+# RFC 7230 token characters
+cdef bint c_tchar[256]
+
+for _byte in range(256):
+    c_tchar[_byte] = (
+        48 <= _byte <= 57
+        or 65 <= _byte <= 90
+        or 97 <= _byte <= 122
+        or _byte in b"!#$%&'*+-.^_`|~"
+    )
+
 
 cdef enum FinderState:
     FS_START, FS_WORKING, FS_END
@@ -33,6 +76,13 @@ cpdef enum ErrorGroup:
     PartHeaders = 300
     UnexpectedPart = 400
 
+# Results of searching a buffer for the boundary
+cdef enum MatchKind:
+    MK_NONE,
+    MK_PARTIAL,
+    MK_DELIMITER,
+    MK_ENDER
+
 # Scanner Actions
 cdef enum Action:
     ACT_CONTINUE,
@@ -100,6 +150,36 @@ cdef class Finder:
         return self.index
 
 
+# Run the coroutines of several targets concurrently. All of them run to
+# completion even if some fail, after which the first error (in order of the
+# targets) is raised. Cancelling the caller cancels all of them.
+async def _gather(coros):
+    for result in await asyncio.gather(*coros, return_exceptions=True):
+        if isinstance(result, BaseException):
+            raise result
+
+
+c_tracer_hooks = ('on_part_start', 'on_first_byte', 'on_part_end', 'on_complete')
+
+
+# Whether any hook of the tracer is a coroutine function
+def _is_async_tracer(tracer):
+    return any(
+        inspect.iscoroutinefunction(getattr(tracer, hook)) for hook in c_tracer_hooks
+    )
+
+
+def _call_hook(result):
+    if inspect.isawaitable(result):
+        result.close()
+        raise TypeError('Async tracers require the async parser methods')
+
+
+async def _await_hook(result):
+    if inspect.isawaitable(result):
+        await result
+
+
 cdef class Part:
     """One part of a multipart/form-data request
     """
@@ -108,13 +188,123 @@ cdef class Part:
     cdef list targets
     cdef public object matches
 
+    # Whether all targets accept memoryview chunks, and whether they are all
+    # nonblocking (see BaseTarget)
+    cdef readonly bint accepts_memoryview
+    cdef readonly bint is_nonblocking
+
+    # Whether the async methods run the targets concurrently
+    cdef public bint concurrent
+
+    # Whether the time spent in the targets is added up, in elapsed for all of
+    # them (concurrent ones counted once) and in target_elapsed for each one
+    cdef public bint timed
+    cdef public double elapsed
+    cdef readonly list target_elapsed
+
+    # The tracer (see set_tracer) and the trace of the part being handed over,
+    # along with elapsed at the time it started
+    cdef readonly object tracer
+    cdef object _trace
+    cdef double _trace_elapsed
+
     def __init__(self, str name, object target, object matches=None):
         self.name = name
         self.targets = [target]
         self.matches = matches or eq
+        self.accepts_memoryview = getattr(target, 'accepts_memoryview', False)
+        self.is_nonblocking = getattr(target, 'is_nonblocking', False)
+        self.concurrent = False
+        self.timed = False
+        self.elapsed = 0
+        self.target_elapsed = [0.0]
+        self.tracer = None
+        self._trace = None
+
+    # Report the lifecycle of the parts handed over to the targets to the given
+    # tracer. Parts with async tracers are never called synchronously.
+    def set_tracer(self, object tracer):
+        self.tracer = tracer
+
+        if tracer is not None:
+            self.timed = True
+            if _is_async_tracer(tracer):
+                self.is_nonblocking = False
+
+    # The headers of the part to be handed over next have been parsed
+    def begin_trace(self, str name, str filename, str content_type):
+        self._trace = PartTrace(
+            name, filename, content_type, list(self.targets), perf_counter()
+        )
+        self._trace_elapsed = self.elapsed
+
+    cdef object _trace_data(self, object chunk):
+        cdef object trace = self._trace
+
+        trace.bytes_received += len(chunk)
+
+        if trace.first_byte_at is None:
+            trace.first_byte_at = perf_counter()
+            return self.tracer.on_first_byte(trace)
+
+    cdef object _end_trace(self):
+        cdef object trace = self._trace
+
+        self._trace = None
+        trace.ended_at = perf_counter()
+        trace.target_time = self.elapsed - self._trace_elapsed
+
+        return self.tracer.on_part_end(trace)
 
     def add_target(self, object target):
         self.targets.append(target)
+        self.target_elapsed.append(0.0)
+        self.accepts_memoryview = self.accepts_memoryview and getattr(
+            target, 'accepts_memoryview', False
+        )
+        self.is_nonblocking = self.is_nonblocking and getattr(
+            target, 'is_nonblocking', False
+        )
+
+    # Call the given method of every target, timing each one
+    cdef _call_timed(self, str method, tuple args):
+        cdef Py_ssize_t position
+        cdef double started, elapsed
+
+        for position, target in enumerate(self.targets):
+            started = perf_counter()
+            try:
+                getattr(target, method)(*args)
+            finally:
+                elapsed = perf_counter() - started
+                self.target_elapsed[position] += elapsed
+                self.elapsed += elapsed
+
+    async def _await_timed(self, Py_ssize_t position, object coro):
+        cdef double started = perf_counter()
+
+        try:
+            await coro
+        finally:
+            self.target_elapsed[position] += perf_counter() - started
+
+    # Await the given method of every target (concurrently if enabled), timing
+    # each one
+    async def _acall_timed(self, str method, tuple args):
+        cdef Py_ssize_t position
+        cdef double started = perf_counter()
+
+        try:
+            if self.concurrent and len(self.targets) > 1:
+                await _gather([
+                    self._await_timed(position, getattr(target, method)(*args))
+                    for position, target in enumerate(self.targets)
+                ])
+            else:
+                for position, target in enumerate(self.targets):
+                    await self._await_timed(position, getattr(target, method)(*args))
+        finally:
+            self.elapsed += perf_counter() - started
 
     def set_multipart_filename(self, str value):
         for target in self.targets:
@@ -125,28 +315,416 @@ cdef class Part:
             target.set_multipart_content_type(value)
 
     def start(self):
-        for target in self.targets:
-            target.start()
+        if self._trace is not None:
+            _call_hook(self.tracer.on_part_start(self._trace))
 
-    def data_received(self, bytes chunk):
-        for target in self.targets:
-            target.data_received(chunk)
+        if self.timed:
+            self._call_timed('start', ())
+        else:
+            for target in self.targets:
+                target.start()
+
+    def data_received(self, object chunk):
+        if self._trace is not None:
+            _call_hook(self._trace_data(chunk))
+
+        if self.timed:
+            self._call_timed('data_received', (chunk,))
+        else:
+            for target in self.targets:
+                target.data_received(chunk)
 
     def finish(self):
-        for target in self.targets:
-            target.finish()
+        if self.timed:
+            self._call_timed('finish', ())
+        else:
+            for target in self.targets:
+                target.finish()
+
+        if self._trace is not None:
+            _call_hook(self._end_trace())
 
     async def astart(self):
-        for target in self.targets:
-            await target.astart()
+        if self._trace is not None:
+            await _await_hook(self.tracer.on_part_start(self._trace))
 
-    async def adata_received(self, bytes chunk):
-        for target in self.targets:
-            await target.adata_received(chunk)
+        if self.timed:
+            await self._acall_timed('astart', ())
+        elif self.concurrent and len(self.targets) > 1:
+            await _gather([target.astart() for target in self.targets])
+        else:
+            for target in self.targets:
+                await target.astart()
+
+    async def adata_received(self, object chunk):
+        if self._trace is not None:
+            await _await_hook(self._trace_data(chunk))
+
+        if self.timed:
+            await self._acall_timed('adata_received', (chunk,))
+        elif self.concurrent and len(self.targets) > 1:
+            await _gather([target.adata_received(chunk) for target in self.targets])
+        else:
+            for target in self.targets:
+                await target.adata_received(chunk)
 
     async def afinish(self):
-        for target in self.targets:
-            await target.afinish()
+        if self.timed:
+            await self._acall_timed('afinish', ())
+        elif self.concurrent and len(self.targets) > 1:
+            await _gather([target.afinish() for target in self.targets])
+        else:
+            for target in self.targets:
+                await target.afinish()
+
+        if self._trace is not None:
+            await _await_hook(self._end_trace())
+
+
+# Regular expression matchers which can be combined into a single pattern. The
+# templates turn each pattern into one which is to be matched at the start of
+# the name, like re.match does.
+c_regex_templates = {
+    re.fullmatch: r'(?:%s)\Z',
+    re.match: r'(?:%s)',
+    re.search: r'(?s:.*?)(?:%s)',
+}
+
+
+cdef class PartIndex:
+    """Finds the first registered part matching a name
+
+    The index is built from the (name, matches) pairs of the parts, in order of
+    registration, and returns positions in that list. Parts using the default
+    matcher are looked up by name in a dict. Parts matching using re.fullmatch,
+    re.match or re.search are combined into a single alternation, in which the
+    first alternative matching wins. Only parts with any other matcher are
+    checked one by one. The result is the same as checking every part in
+    registration order.
+    """
+
+    cdef dict exact
+    cdef object pattern
+    cdef list pattern_positions
+    cdef list others
+
+    def __init__(self, list entries):
+        cdef Py_ssize_t position
+        cdef list alternatives = []
+
+        self.exact = {}
+        self.pattern = None
+        self.pattern_positions = []
+        self.others = []
+
+        for position, (name, matches) in enumerate(entries):
+            if matches is None or matches is eq:
+                self.exact.setdefault(name, position)
+                continue
+
+            template = c_regex_templates.get(matches)
+
+            if template is not None and PartIndex._combinable(name):
+                alternatives.append('(' + template % name + ')')
+                self.pattern_positions.append(position)
+            else:
+                self.others.append((position, name, matches))
+
+        if alternatives:
+            self.pattern = re.compile('|'.join(alternatives))
+
+    @staticmethod
+    def _combinable(str pattern):
+        # Patterns with groups of their own (and thus possibly backreferences)
+        # or global flags can not be embedded into a larger one.
+        try:
+            compiled = re.compile(pattern)
+        except re.error:
+            return False
+
+        return compiled.groups == 0 and compiled.flags == re.UNICODE
+
+    cpdef Py_ssize_t find(self, str name) except -2:
+        cdef Py_ssize_t best = self.exact.get(name, -1)
+        cdef Py_ssize_t position
+
+        if self.pattern is not None:
+            match = self.pattern.match(name)
+            if match is not None:
+                position = self.pattern_positions[match.lastindex - 1]
+                if best < 0 or position < best:
+                    best = position
+
+        for position, entry_name, matches in self.others:
+            if best >= 0 and position > best:
+                break
+            if matches(entry_name, name):
+                return position
+
+        return best
+
+
+# Part header parsing
+#
+# The parser only cares about the Content-Disposition and Content-Type headers
+# of each part. These are parsed natively, which handles everything commonly
+# sent by clients (tokens, quoted strings, RFC 5987 extended values and
+# case-insensitive names). Whenever a header line looks unusual in any way, it is
+# parsed using the email package instead, which has been the only parser before.
+
+cdef enum HeaderKind:
+    HK_OTHER,
+    HK_CONTENT_DISPOSITION,
+    HK_CONTENT_TYPE
+
+
+cdef inline Py_ssize_t _skip_ows(
+    const Byte *ptr, Py_ssize_t pos, Py_ssize_t end
+) noexcept:
+    while pos < end and (ptr[pos] == c_space or ptr[pos] == c_tab):
+        pos += 1
+    return pos
+
+
+cdef inline Py_ssize_t _skip_token(
+    const Byte *ptr, Py_ssize_t pos, Py_ssize_t end
+) noexcept:
+    while pos < end and c_tchar[ptr[pos]]:
+        pos += 1
+    return pos
+
+
+cdef inline Py_ssize_t _skip_attribute(
+    const Byte *ptr, Py_ssize_t pos, Py_ssize_t end
+) noexcept:
+    # RFC 2231 attribute characters, i.e. token characters except "*'%"
+    while (
+        pos < end
+        and c_tchar[ptr[pos]]
+        and ptr[pos] != c_asterisk
+        and ptr[pos] != c_apostrophe
+        and ptr[pos] != c_percent
+    ):
+        pos += 1
+    return pos
+
+
+cdef object _decode_ext_value(bytes value):
+    # RFC 5987: charset "'" [ language ] "'" value-chars
+    cdef const Byte *ptr = value
+    cdef Py_ssize_t pos, end = len(value)
+
+    fields = value.split(b"'", 2)
+    if len(fields) != 3:
+        return None
+
+    charset = fields[0].lower()
+    if charset not in (b'utf-8', b'iso-8859-1', b'us-ascii'):
+        return None
+
+    pos = len(fields[0]) + len(fields[1]) + 2
+
+    while pos < end:
+        if ptr[pos] == c_percent:
+            if pos + 2 >= end:
+                return None
+            pos += 3
+        elif (
+            ptr[pos] == c_asterisk
+            or ptr[pos] == c_apostrophe
+            or not c_tchar[ptr[pos]]
+        ):
+            return None
+        else:
+            pos += 1
+
+    try:
+        return unquote_to_bytes(fields[2]).decode(charset.decode('ascii'))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+cdef object _parse_params(const Byte *ptr, Py_ssize_t pos, Py_ssize_t end):
+    # *( OWS ";" OWS attribute [ "*" ] OWS "=" OWS ( token / quoted-string ) ) OWS
+    #
+    # Returns a dict of (lowercase) parameter names to values, or None if the
+    # parameters look unusual. If a parameter is given more than once, the first
+    # value wins; an extended (name*=) value always wins over a regular one.
+    cdef dict params = {}
+    cdef dict extended = {}
+    cdef Py_ssize_t start
+    cdef bint quoted
+    cdef bytearray unescaped
+    cdef const char *chars = <const char *> ptr
+
+    while True:
+        pos = _skip_ows(ptr, pos, end)
+        if pos == end:
+            break
+        if ptr[pos] != c_semicolon:
+            return None
+
+        pos = _skip_ows(ptr, pos + 1, end)
+        if pos == end:
+            break
+
+        start = pos
+        pos = _skip_attribute(ptr, pos, end)
+        if pos == start:
+            return None
+        # RFC 2231 continuations (name*0=...) are left to the email package
+        if pos < end and ptr[pos] == c_asterisk:
+            pos += 1
+        name = chars[start:pos].lower()
+
+        pos = _skip_ows(ptr, pos, end)
+        if pos == end or ptr[pos] != c_equals:
+            return None
+        pos = _skip_ows(ptr, pos + 1, end)
+
+        if pos < end and ptr[pos] == c_quote:
+            quoted = True
+            unescaped = None
+            pos += 1
+            start = pos
+
+            while pos < end and ptr[pos] != c_quote:
+                if ptr[pos] == c_backslash:
+                    if unescaped is None:
+                        unescaped = bytearray(chars[start:pos])
+                    pos += 1
+                    if pos == end:
+                        return None
+                elif ptr[pos] < c_space and ptr[pos] != c_tab or ptr[pos] == 127:
+                    return None
+                if unescaped is not None:
+                    unescaped.append(ptr[pos])
+                pos += 1
+
+            if pos == end:
+                return None
+
+            if unescaped is None:
+                value = chars[start:pos]
+            else:
+                value = bytes(unescaped)
+            pos += 1
+        else:
+            quoted = False
+            start = pos
+            pos = _skip_token(ptr, pos, end)
+            if pos == start:
+                return None
+            value = chars[start:pos]
+            if b'*' in value:
+                return None
+
+        if name.endswith(b'*'):
+            if quoted:
+                return None
+            value = _decode_ext_value(value)
+            if value is None:
+                return None
+            extended.setdefault(name[:-1].decode('ascii'), value)
+        elif not quoted and b"'" in value:
+            return None
+        else:
+            try:
+                params.setdefault(name.decode('ascii'), value.decode('utf-8'))
+            except UnicodeDecodeError:
+                return None
+
+    params.update(extended)
+    return params
+
+
+cdef tuple _parse_header_line_email(bytes line):
+    message = Parser(policy=HTTP).parsestr(line.decode('utf-8'))
+
+    if 'content-disposition' in message:
+        return (
+            HeaderKind.HK_CONTENT_DISPOSITION,
+            message.get_content_disposition(),
+            dict(message['content-disposition'].params),
+        )
+    elif 'content-type' in message:
+        return (HeaderKind.HK_CONTENT_TYPE, message.get_content_type(), None)
+
+    return (HeaderKind.HK_OTHER, None, None)
+
+
+cdef tuple _parse_header_line(bytes line):
+    # Parse a single header line (without the trailing CRLF) and return a
+    # (kind, value, params) tuple. For Content-Disposition the value is the
+    # (lowercase) disposition type, for Content-Type the (lowercase) media type.
+    cdef const Byte *ptr = line
+    cdef const char *chars = <const char *> ptr
+    cdef Py_ssize_t end = len(line)
+    cdef Py_ssize_t pos, start
+
+    pos = _skip_token(ptr, 0, end)
+    if pos == 0 or pos == end or ptr[pos] != c_colon:
+        return _parse_header_line_email(line)
+
+    name = chars[:pos].lower()
+
+    if name == b'content-disposition':
+        start = _skip_ows(ptr, pos + 1, end)
+        pos = _skip_token(ptr, start, end)
+        if pos > start:
+            params = _parse_params(ptr, pos, end)
+            if params is not None:
+                return (
+                    HeaderKind.HK_CONTENT_DISPOSITION,
+                    chars[start:pos].lower().decode('ascii'),
+                    params,
+                )
+
+    elif name == b'content-type':
+        start = _skip_ows(ptr, pos + 1, end)
+        pos = _skip_token(ptr, start, end)
+        if pos > start and pos < end and ptr[pos] == c_slash:
+            pos = _skip_token(ptr, pos + 1, end)
+            if chars[pos - 1] != c_slash:
+                media_type_end = pos
+                pos = _skip_ows(ptr, pos, end)
+                if pos == end or ptr[pos] == c_semicolon:
+                    return (
+                        HeaderKind.HK_CONTENT_TYPE,
+                        chars[start:media_type_end].lower().decode('ascii'),
+                        None,
+                    )
+
+    else:
+        return (HeaderKind.HK_OTHER, None, None)
+
+    return _parse_header_line_email(line)
+
+
+cdef tuple _parse_part_headers(bytes block):
+    # Parse the header block of a part (all header lines including the CRLF
+    # terminating the block) into a (valid, name, filename, content_type) tuple
+    cdef tuple header
+    cdef dict params = None
+    cdef str content_type = None
+
+    for line in block.split(b'\r\n'):
+        if not line:
+            continue
+
+        header = _parse_header_line(line)
+
+        if header[0] == HeaderKind.HK_CONTENT_DISPOSITION:
+            if header[1] != 'form-data':
+                return (False, None, None, None)
+            params = header[2]
+        elif header[0] == HeaderKind.HK_CONTENT_TYPE:
+            content_type = header[1]
+
+    if params is None:
+        return (True, None, None, content_type)
+
+    return (True, params.get('name'), params.get('filename'), content_type)
 
 
 cdef enum ParserState:
@@ -172,61 +750,367 @@ cdef enum ParserState:
 cdef class _Parser:
     cdef ParserState state
 
-    cdef Finder delimiter_finder, ender_finder
-    cdef size_t delimiter_length, ender_length
+    # The delimiter (\r\n--{boundary}\r\n) and the ender (\r\n--{boundary}--)
+    # have the same length and only differ in their last two bytes, so the body
+    # is searched for their shared prefix using Boyer-Moore-Horspool, with
+    # _skip being the bad character shift table for the prefix.
+    cdef bytes delimiter, ender
+    cdef const Byte *delimiter_ptr
+    cdef size_t delimiter_length, ender_length, prefix_length
+    cdef size_t _skip[256]
 
-    cdef object expected_parts
-    cdef object active_part, default_part
+    # Scratch space for searching the boundary across the carried over bytes
+    # and the beginning of a new chunk
+    cdef Byte *_window
 
-    cdef bytes _leftover_buffer
-    cdef bytes _emit_data
+    cdef object expected_parts
+    cdef Part active_part, default_part
+
+    # Index over expected_parts, built once parsing starts
+    cdef PartIndex part_index
+
+    # Stream bytes which could not be resolved by the time a chunk ended: the
+    # beginning of an unfinished boundary or header line, or the tail of a body
+    # which might still turn out to be the start of a delimiter. This is the
+    # only data carried over between chunks. While scanning, these bytes are
+    # addressed with negative offsets, i.e. they logically occupy the range
+    # [-_carry_len, 0) in front of the current chunk.
+    cdef Byte *_carry
+    cdef size_t _carry_len, _carry_size
+
+    # Parsed header blocks, since identical ones tend to repeat within a request
+    cdef dict _header_cache
+
+    # Body data to be handed over to the active part. In zero copy mode, this
+    # is a memoryview into the current chunk (_view) whenever the part's targets
+    # accept that, which is released as soon as the targets are done with it.
+    cdef object _emit_data
+    cdef bint zero_copy, _emit_views
+    cdef object _view
+
+    # Emit sizing: resolved body data is collected in _coalesce until at least
+    # min_emit_size bytes are available (or the part ends), and handed over in
+    # pieces of at most max_emit_size bytes (0 meaning no limit). _emit_rest is
+    # the data still to be handed over, starting at _emit_offset.
+    cdef size_t min_emit_size, max_emit_size
+    cdef bytearray _coalesce
+    cdef object _emit_rest
+    cdef size_t _emit_offset
+
+    cdef bint _pending_finish
+    cdef int _error_code
 
-    cdef bint strict
+    # In event mode (see events), parts are reported as events instead of being
+    # passed on to targets. _part_start is the event for the part which has just
+    # started, _event_part the name of the part whose body is being read.
+    cdef bint _events
+    cdef object _part_start
+    cdef str _event_part
+
+    # In index mode (see index), which builds on event mode, bodies are skipped
+    # instead of being emitted, and only the offsets of the part at hand are
+    # recorded, relative to the first byte passed to index.
+    cdef bint _indexing
+    cdef long long _stream_offset, _body_start, _body_end
+
+    # While scanning in an executor thread (see adata_received_offloaded), the
+    # parts are looked up and set up by the caller on the event loop instead, as
+    # that calls into user code (matchers, targets and tracers). _part_start is
+    # then the event for the part which has just started. _abandoned is set when
+    # the caller went away while the executor was still scanning, which leaves the
+    # parser in an undefined state.
+    cdef bint _deferred, _abandoned
+
+    cdef bint strict, concurrent_targets
     cdef public str unexpected_part_name
 
-    def __init__(self, bytes delimiter, bytes ender, bint strict):
-        self.delimiter_finder = Finder(delimiter)
-        self.ender_finder = Finder(ender)
+    # Passed on to the registered parts, see Part.set_tracer
+    cdef object tracer
+
+    # In async mode, the loop yields to the event loop between actions once
+    # _scan_time_budget seconds have passed (if not negative), or else once
+    # _scan_budget bytes of body data have been emitted, since the call started
+    # or the loop last yielded.
+    cdef bint _budgeted
+    cdef size_t _scan_budget, _scan_used
+    cdef double _scan_time_budget, _scan_started
+
+    # Statistics (see stats), only collected when _stats is set, apart from
+    # _false_matches: the prefix of the boundary found in body data without
+    # being followed by the end of the boundary line, which is rare enough to be
+    # counted in any case. _emit_sizes[n] counts the emits of at least 2**(n-1)
+    # and less than 2**n bytes.
+    cdef bint _stats
+    cdef unsigned long long _chunks, _bytes_received
+    cdef unsigned long long _searches, _bytes_searched, _false_matches
+    cdef unsigned long long _emits, _emitted_bytes
+    cdef unsigned long long _emit_sizes[65]
+    cdef unsigned long long _headers_parsed, _header_cache_hits
+    cdef double _header_time
+    cdef unsigned long long _carries, _carried_bytes
+
+    def __cinit__(self):
+        self._carry = NULL
+        self._carry_len = 0
+        self._carry_size = 0
+        self._window = NULL
+
+    def __init__(
+        self,
+        bytes delimiter,
+        bytes ender,
+        bint strict,
+        bint zero_copy=False,
+        Py_ssize_t min_emit_size=c_min_file_body_chunk_size,
+        object max_emit_size=None,
+        bint concurrent_targets=False,
+        bint stats=False,
+        object tracer=None,
+        object scan_budget=None,
+        object scan_time_budget=None,
+    ):
+        if min_emit_size < 0:
+            raise ValueError('min_emit_size must not be negative')
 
-        self.delimiter_length = len(delimiter)
-        self.ender_length = len(ender)
+        if max_emit_size is not None and max_emit_size < max(min_emit_size, 1):
+            raise ValueError('max_emit_size must be positive and not below min_emit_size')
+
+        self.default_part = Part('_default', NullTarget())
+
+        self._header_cache = {}
+
+        self.zero_copy = zero_copy
+        self.min_emit_size = min_emit_size
+        self.max_emit_size = max_emit_size or 0
+
+        self.strict = strict
+        self.concurrent_targets = concurrent_targets
+        self._stats = stats
+        self.tracer = tracer
+
+        self._budgeted = scan_budget is not None or scan_time_budget is not None
+        self._scan_budget = scan_budget or 0
+        self._scan_time_budget = (
+            scan_time_budget / 1e6 if scan_time_budget is not None else -1
+        )
+
+        self.reset(delimiter, ender)
+
+    # Prepare the parser for a new request, which may use a different boundary.
+    # Registered parts are dropped, the configuration and allocated buffers are
+    # kept.
+    def reset(self, bytes delimiter, bytes ender):
+        if delimiter != self.delimiter or ender != self.ender:
+            self._set_delimiter(delimiter, ender)
 
         self.state = ParserState.PS_START
 
         self.expected_parts = []
+        self.part_index = None
 
         self.active_part = None
-        self.default_part = Part('_default', NullTarget())
 
-        self._leftover_buffer = None
+        self._carry_len = 0
+
         self._emit_data = None
+        self._emit_views = False
+        self._view = None
+
+        self._coalesce = bytearray()
+        self._emit_rest = None
+        self._emit_offset = 0
+
+        self._pending_finish = False
+        self._error_code = 0
+
+        self._events = False
+        self._part_start = None
+        self._event_part = None
+
+        self._indexing = False
+        self._deferred = False
+        self._abandoned = False
+        self._stream_offset = 0
+        self._body_start = 0
+        self._body_end = 0
 
-        self.strict = strict
         self.unexpected_part_name = ''
 
+        self._chunks = self._bytes_received = 0
+        self._searches = self._bytes_searched = self._false_matches = 0
+        self._emits = self._emitted_bytes = 0
+        memset(self._emit_sizes, 0, sizeof(self._emit_sizes))
+        self._headers_parsed = self._header_cache_hits = 0
+        self._header_time = 0
+        self._carries = self._carried_bytes = 0
+
+    # The statistics collected since the last reset as a dict, or None if not
+    # enabled
+    def stats(self):
+        cdef Part part
+        cdef dict target_time = {}
+
+        if not self._stats:
+            return None
+
+        for part in self.expected_parts:
+            target_time.update(zip(part.targets, part.target_elapsed))
+
+        return {
+            'chunks': self._chunks,
+            'bytes_received': self._bytes_received,
+            'searches': self._searches,
+            'bytes_searched': self._bytes_searched,
+            'false_matches': self._false_matches,
+            'emits': self._emits,
+            'emitted_bytes': self._emitted_bytes,
+            'emit_sizes': {
+                1 << (bits - 1): self._emit_sizes[bits]
+                for bits in range(1, 65)
+                if self._emit_sizes[bits]
+            },
+            'headers_parsed': self._headers_parsed,
+            'header_cache_hits': self._header_cache_hits,
+            'header_time': self._header_time,
+            'carries': self._carries,
+            'carried_bytes': self._carried_bytes,
+            'target_time': target_time,
+        }
+
+    cdef inline void _count_chunk(self, size_t size):
+        if self._stats:
+            self._chunks += 1
+            self._bytes_received += size
+
+    # Whether the final boundary has been reached
+    @property
+    def finished(self):
+        return self.state == ParserState.PS_END
+
+    cdef _set_delimiter(self, bytes delimiter, bytes ender):
+        cdef size_t index
+        cdef Byte *buffer
+
+        if (
+            len(delimiter) != len(ender)
+            or len(delimiter) < 5
+            or delimiter[:-2] != ender[:-2]
+        ):
+            raise ValueError('Delimiter and ender must only differ in the end')
+
+        self.delimiter = delimiter
+        self.ender = ender
+        self.delimiter_ptr = self.delimiter
+
+        self.delimiter_length = len(delimiter)
+        self.ender_length = len(ender)
+        self.prefix_length = self.delimiter_length - 2
+
+        for index in range(256):
+            self._skip[index] = self.prefix_length
+        for index in range(self.prefix_length - 1):
+            self._skip[self.delimiter_ptr[index]] = self.prefix_length - 1 - index
+
+        buffer = <Byte *> PyMem_Realloc(self._window, 2 * self.delimiter_length)
+        if buffer is NULL:
+            raise MemoryError()
+        self._window = buffer
+
+        if self._carry_size < self.delimiter_length:
+            buffer = <Byte *> PyMem_Realloc(self._carry, self.delimiter_length)
+            if buffer is NULL:
+                raise MemoryError()
+            self._carry = buffer
+            self._carry_size = self.delimiter_length
+
+    def __dealloc__(self):
+        PyMem_Free(self._carry)
+        PyMem_Free(self._window)
+
     def register(self, str name, object target, object matches=None):
         part = self._part_for(name)
 
         if part:
             part.add_target(target)
         else:
-            self.expected_parts.append(Part(name, target, matches))
+            part = Part(name, target, matches)
+            part.concurrent = self.concurrent_targets
+            part.timed = self._stats
+            part.set_tracer(self.tracer)
+            self.expected_parts.append(part)
+            self.part_index = None
+
+    # Use the given parts, along with an index built for them beforehand
+    def set_parts(self, list parts, PartIndex part_index):
+        cdef Part part
+
+        for part in parts:
+            part.concurrent = self.concurrent_targets
+            part.timed = self._stats
+            part.set_tracer(self.tracer)
+
+        self.expected_parts = parts
+        self.part_index = part_index
 
     # Helper to setup active part (called internally during scan)
-    cdef _set_active_part(self, part, str filename):
+    cdef _set_active_part(self, Part part, str name, str filename, str content_type):
+        if part.tracer is not None:
+            part.begin_trace(name, filename, content_type)
         self.active_part = part
+        self._emit_views = self.zero_copy and part.accepts_memoryview
         self.active_part.set_multipart_filename(filename)
+        if content_type is not None:
+            self.active_part.set_multipart_content_type(content_type)
         # We don't call start() here, we let the caller do it based on return action
 
+    cdef tuple _parse_part_headers(self, bytes block):
+        cdef double started
+
+        if self._stats:
+            started = perf_counter()
+
+        headers = self._header_cache.get(block)
+
+        if headers is None:
+            headers = _parse_part_headers(block)
+
+            if len(self._header_cache) < c_header_cache_size:
+                self._header_cache[block] = headers
+        elif self._stats:
+            self._header_cache_hits += 1
+
+        if self._stats:
+            self._headers_parsed += 1
+            self._header_time += perf_counter() - started
+
+        return headers
+
+    cdef Part _find_part(self, str name):
+        cdef Py_ssize_t position
+
+        if self.part_index is None:
+            self.part_index = PartIndex(
+                [(part.name, part.matches) for part in self.expected_parts]
+            )
+
+        position = self.part_index.find(name)
+        if position < 0:
+            return None
+        return self.expected_parts[position]
+
+    # The registered part the part with the given name is passed on to, if any
+    def lookup(self, str name):
+        return self._find_part(name)
+
     cdef _part_for(self, str name, bint exact=True):
         for part in self.expected_parts:
             if exact and part.name == name or part.matches(part.name, name):
                 return part
 
-    def data_received(self, bytes data):
+    def data_received(self, object data):
         return self._run_loop(data, is_async=False)
 
-    async def adata_received(self, bytes data):
+    async def adata_received(self, object data):
         ret = self._run_loop(data, is_async=True)
         # If the return is an int (status code), return it directly.
         # If it is a coroutine (from async target action), await it.
@@ -234,118 +1118,600 @@ cdef class _Parser:
             return ret
         return await ret
 
+    # Process several chunks in a row, stopping at the first error. A boundary
+    # straddling chunks is handled through the carried over bytes, exactly as
+    # when passing in the chunks one by one.
+    def data_received_many(self, object chunks):
+        cdef int result
+
+        for data in chunks:
+            result = self._run_loop(data, is_async=False)
+            if result:
+                return result
+
+        return 0
+
+    async def adata_received_many(self, object chunks):
+        for data in chunks:
+            ret = self._run_loop(data, is_async=True)
+            if type(ret) is not int:
+                ret = await ret
+            if ret:
+                return ret
+
+        return 0
+
     # Combined loop runner (Handles Sync/Async dispatch)
-    def _run_loop(self, bytes data, bint is_async):
-        if not data:
+    #
+    # data may be any object supporting the buffer protocol (bytes, bytearray,
+    # memoryview, mmap, numpy uint8 arrays, ...). It is scanned in place; only
+    # the body slices handed over to the targets are copied, unless they are
+    # handed over as views in zero copy mode.
+    def _run_loop(self, object data, bint is_async):
+        cdef const Byte[::1] buffer = data
+
+        if buffer.shape[0] == 0:
             return 0
 
-        cdef bytes chunk
-        cdef size_t index
-        cdef size_t buffer_start
+        self._count_chunk(buffer.shape[0])
+
+        cdef size_t index = 0
+        cdef Py_ssize_t buffer_start = -<Py_ssize_t> self._carry_len
         cdef Action action
+        cdef bint suspended = False
 
-        if self._leftover_buffer:
-            chunk = self._leftover_buffer + data
-            index = len(self._leftover_buffer)
-            # Important: When we have leftover buffer, we start scanning at 'index'
-            # (to avoid re-scanning bytes and corrupting state), but the buffer 
-            # we want to potentially emit starts at 0.
-            buffer_start = 0 
-            self._leftover_buffer = None
-        else:
-            chunk = data
-            index = 0
-            buffer_start = 0
-
-        # Loop processing via _scan
-        while True:
-            action = self._scan(chunk, &index, &buffer_start)
-            
-            if action == ACT_CONTINUE:
-                continue
-            
-            elif action == ACT_DONE:
-                break
-                
-            elif action == ACT_EMIT_BODY:
-                if self.active_part:
-                    if is_async:
-                        return self._await_action(self.active_part.adata_received(self._emit_data), chunk, index, buffer_start)
-                    else:
-                        self.active_part.data_received(self._emit_data)
-                self._emit_data = None
-                
-            elif action == ACT_PART_START:
-                if self.active_part:
-                    if is_async:
-                        return self._await_action(self.active_part.astart(), chunk, index, buffer_start)
-                    else:
-                        self.active_part.start()
-            
-            elif action == ACT_PART_END:
-                if self.active_part:
-                    if is_async:
-                        return self._await_action(self.active_part.afinish(), chunk, index, buffer_start)
-                    else:
-                        self.active_part.finish()
-                    self.active_part = None
-            
-            elif action == ACT_ERROR:
-                if self.active_part:
-                    if is_async:
-                        return self._await_action(self.active_part.afinish(), chunk, index, buffer_start)
-                    else:
-                        self.active_part.finish()
-                return self._get_error_code()
+        if self.zero_copy or self.min_emit_size or self.max_emit_size:
+            self._view = memoryview(data)
+            if self._view.format != 'B':
+                self._view = self._view.cast('B')
 
-        return 0
+        if is_async and self._budgeted:
+            self._reset_budget()
+
+        try:
+            # Loop processing via _scan
+            while True:
+                action = self._scan(&buffer[0], buffer.shape[0], &index, &buffer_start)
+
+                if action == ACT_CONTINUE:
+                    continue
+
+                elif action == ACT_DONE:
+                    break
+
+                # Nonblocking parts are called synchronously in async mode as
+                # well, which saves creating and awaiting a coroutine.
+                elif action == ACT_EMIT_BODY:
+                    if self.active_part:
+                        if is_async and not self.active_part.is_nonblocking:
+                            suspended = True
+                            return self._await_action(self.active_part.adata_received(self._emit_data), data, index, buffer_start)
+                        else:
+                            self.active_part.data_received(self._emit_data)
+                    self._release_emit_data()
+
+                elif action == ACT_PART_START:
+                    if self.active_part:
+                        if is_async and not self.active_part.is_nonblocking:
+                            suspended = True
+                            return self._await_action(self.active_part.astart(), data, index, buffer_start)
+                        else:
+                            self.active_part.start()
+
+                elif action == ACT_PART_END:
+                    if self.active_part:
+                        if is_async and not self.active_part.is_nonblocking:
+                            part, self.active_part = self.active_part, None
+                            suspended = True
+                            return self._await_action(part.afinish(), data, index, buffer_start)
+                        else:
+                            self.active_part.finish()
+                        self.active_part = None
+
+                elif action == ACT_ERROR:
+                    if self.active_part:
+                        part, self.active_part = self.active_part, None
+                        if is_async and not part.is_nonblocking:
+                            return self._await_error(part.afinish())
+                        else:
+                            part.finish()
+                    return self._get_error_code()
+
+                if is_async and self._budgeted and self._over_budget():
+                    suspended = True
+                    return self._await_action(self._yield(), data, index, buffer_start)
+
+            return 0
+        finally:
+            # once suspended, the view is released by _await_action instead
+            if not suspended:
+                self._release_view()
 
     # Helper for async recursion to keep the loop going after an await
-    async def _await_action(self, coro, bytes chunk, size_t index, size_t buffer_start):
+    async def _await_action(self, coro, object data, size_t index, Py_ssize_t buffer_start):
+        cdef const Byte[::1] buffer
+        cdef Action action
+        cdef Part part
+
+        try:
+            await coro
+            self._release_emit_data() # Clear data if it was used
+
+            # Resume loop
+            buffer = data
+            while True:
+                action = self._scan(&buffer[0], buffer.shape[0], &index, &buffer_start)
+
+                if action == ACT_CONTINUE:
+                    continue
+                elif action == ACT_DONE:
+                    break
+                elif action == ACT_EMIT_BODY:
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.data_received(self._emit_data)
+                        else:
+                            await part.adata_received(self._emit_data)
+                    self._release_emit_data()
+                elif action == ACT_PART_START:
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.start()
+                        else:
+                            await part.astart()
+                elif action == ACT_PART_END:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+                elif action == ACT_ERROR:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+                    return self._get_error_code()
+
+                if self._budgeted and self._over_budget():
+                    await self._yield()
+            return 0
+        finally:
+            self._release_view()
+
+    async def _await_error(self, coro):
         await coro
-        self._emit_data = None # Clear data if it was used
-        
-        # Resume loop
+        return self._get_error_code()
+
+    cdef void _reset_budget(self):
+        self._scan_used = 0
+        if self._scan_time_budget >= 0:
+            self._scan_started = perf_counter()
+
+    cdef bint _over_budget(self):
+        if self._scan_time_budget >= 0:
+            return perf_counter() - self._scan_started >= self._scan_time_budget
+        return self._scan_used >= self._scan_budget
+
+    async def _yield(self):
+        await asyncio.sleep(0)
+        self._reset_budget()
+
+    # Scan data, yielding the actions the caller has to carry out (anything but
+    # ACT_CONTINUE and ACT_DONE). Body data to be emitted is released when the
+    # generator is resumed, and scanning stops after ACT_ERROR.
+    def _actions(self, object data):
+        cdef const Byte[::1] buffer = data
+
+        if buffer.shape[0] == 0:
+            return
+
+        self._count_chunk(buffer.shape[0])
+
+        cdef size_t index = 0
+        cdef Py_ssize_t buffer_start = -<Py_ssize_t> self._carry_len
         cdef Action action
-        while True:
-            action = self._scan(chunk, &index, &buffer_start)
-            
-            if action == ACT_CONTINUE:
-                continue
-            elif action == ACT_DONE:
-                break
-            elif action == ACT_EMIT_BODY:
-                if self.active_part:
-                    await self.active_part.adata_received(self._emit_data)
-                self._emit_data = None
-            elif action == ACT_PART_START:
-                if self.active_part:
-                    await self.active_part.astart()
-            elif action == ACT_PART_END:
-                if self.active_part:
-                    await self.active_part.afinish()
-                    self.active_part = None
-            elif action == ACT_ERROR:
-                if self.active_part:
-                    await self.active_part.afinish()
-                return self._get_error_code()
-        return 0
+
+        if self.zero_copy or self.min_emit_size or self.max_emit_size:
+            self._view = memoryview(data)
+            if self._view.format != 'B':
+                self._view = self._view.cast('B')
+
+        try:
+            while True:
+                action = self._scan(&buffer[0], buffer.shape[0], &index, &buffer_start)
+
+                if action == ACT_CONTINUE:
+                    continue
+
+                if action == ACT_DONE:
+                    return
+
+                yield action
+
+                if action == ACT_ERROR:
+                    return
+
+                self._release_emit_data()
+        finally:
+            self._release_emit_data()
+            self._release_view()
+
+    # Parse data like data_received, but yield PartStart, Data and PartEnd events
+    # instead of calling the targets. The generator returns the error code.
+    def events(self, object data):
+        actions = self._actions(data)
+
+        self._events = True
+
+        try:
+            for action in actions:
+                if action == ACT_EMIT_BODY:
+                    if self._event_part is not None:
+                        yield Data(self._emit_data)
+
+                elif action == ACT_PART_START:
+                    self._event_part = self._part_start.name
+                    yield self._part_start
+
+                elif action == ACT_PART_END:
+                    if self._event_part is not None:
+                        name, self._event_part = self._event_part, None
+                        yield PartEnd(name)
+
+                elif action == ACT_ERROR:
+                    self._event_part = None
+                    return self._get_error_code()
+
+            return 0
+        finally:
+            self._events = False
+            self._part_start = None
+            actions.close()
+
+    # Scan data without emitting any body data, appending the name, filename,
+    # content type and body offsets of every complete part to form_index.
+    def index(self, object data, object form_index):
+        cdef const Byte[::1] buffer = data
+        cdef size_t index = 0
+        cdef Py_ssize_t buffer_start = -<Py_ssize_t> self._carry_len
+        cdef Action action
+
+        if buffer.shape[0] == 0:
+            return 0
+
+        self._count_chunk(buffer.shape[0])
+
+        self._events = True
+        self._indexing = True
+
+        try:
+            while True:
+                action = self._scan(&buffer[0], buffer.shape[0], &index, &buffer_start)
+
+                if action == ACT_DONE:
+                    return 0
+
+                elif action == ACT_PART_START:
+                    self._body_start = self._stream_offset + <long long> index
+
+                elif action == ACT_PART_END:
+                    if self._part_start is not None:
+                        form_index.append(
+                            *self._part_start, self._body_start, self._body_end
+                        )
+                        self._part_start = None
+
+                elif action == ACT_ERROR:
+                    self._part_start = None
+                    return self._get_error_code()
+        finally:
+            self._events = False
+            self._indexing = False
+            self._stream_offset += buffer.shape[0]
+
+    # Look up and set up the part which has just started while scanning in
+    # deferred mode, returning whether that worked out (not in strict mode with
+    # an unexpected part)
+    cdef bint _start_deferred_part(self):
+        name, filename, content_type = self._part_start
+        self._part_start = None
+
+        part = self._find_part(name)
+        if part is None:
+            if self.strict:
+                self.unexpected_part_name = name
+                self.mark_error()
+                self._error_code = ErrorGroup.UnexpectedPart
+                return False
+
+            part = self.default_part
+
+        self._set_active_part(part, name, filename, content_type)
+        return True
+
+    # Parse data like adata_received, but scan it in a thread of the given
+    # executor (the default one if None), so that the event loop can run
+    # meanwhile. The parts are still looked up, and the targets called, on the
+    # event loop, in between.
+    async def adata_received_offloaded(self, object data, object executor=None):
+        cdef Part part
+
+        loop = asyncio.get_running_loop()
+        actions = self._actions(data)
+
+        self._deferred = True
+
+        try:
+            while True:
+                action = await loop.run_in_executor(executor, next, actions, ACT_DONE)
+
+                if action == ACT_DONE:
+                    return 0
+
+                elif action == ACT_EMIT_BODY:
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.data_received(self._emit_data)
+                        else:
+                            await part.adata_received(self._emit_data)
+
+                elif action == ACT_PART_START:
+                    if not self._start_deferred_part():
+                        return self._get_error_code()
+
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.start()
+                        else:
+                            await part.astart()
+
+                elif action == ACT_PART_END:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+
+                elif action == ACT_ERROR:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+                    return self._get_error_code()
+        finally:
+            self._deferred = False
+            self._part_start = None
+
+            try:
+                actions.close()
+            except ValueError:
+                # cancelled while the executor is still scanning
+                self._abandoned = True
+                self.mark_error()
+                self._error_code = ErrorGroup.Internal + 6
+
+    # Views handed over to the targets are only valid during the callback.
+    # Releasing them right after makes sure they cannot be used afterwards,
+    # and that the buffer passed in by the caller is not pinned any longer.
+    cdef _release_emit_data(self):
+        if type(self._emit_data) is memoryview:
+            self._emit_data.release()
+        self._emit_data = None
+
+    cdef _release_view(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
 
     cdef int _get_error_code(self):
         return self._error_code
 
-    cdef int _error_code
+    # Return the stream bytes in [start, end) as a new bytes object. Negative
+    # offsets refer to the bytes carried over from the previous chunk.
+    cdef bytes _slice(self, const Byte *chunk_ptr, Py_ssize_t start, Py_ssize_t end):
+        cdef bytes result
+        cdef char *result_ptr
+
+        if start >= 0:
+            if <size_t> (end - start) < c_nogil_min_length:
+                return (<const char *> chunk_ptr)[start:end]
+
+            result = PyBytes_FromStringAndSize(NULL, end - start)
+            result_ptr = PyBytes_AS_STRING(result)
+
+            with nogil:
+                memcpy(result_ptr, chunk_ptr + start, end - start)
+
+            return result
+
+        if end <= 0:
+            return (<char *> self._carry)[
+                <Py_ssize_t> self._carry_len + start:
+                <Py_ssize_t> self._carry_len + end
+            ]
+
+        result = PyBytes_FromStringAndSize(NULL, end - start)
+        result_ptr = PyBytes_AS_STRING(result)
+
+        memcpy(result_ptr, self._carry + <Py_ssize_t> self._carry_len + start, -start)
+
+        if <size_t> end < c_nogil_min_length:
+            memcpy(result_ptr - start, chunk_ptr, end)
+        else:
+            with nogil:
+                memcpy(result_ptr - start, chunk_ptr, end)
+
+        return result
+
+    # Return the body data in [start, end), which is a view into the current
+    # chunk where possible, leaving copying to _next_piece.
+    cdef object _body(self, const Byte *chunk_ptr, Py_ssize_t start, Py_ssize_t end):
+        if self._view is not None and start >= 0:
+            return self._view[start:end]
+        return self._slice(chunk_ptr, start, end)
+
+    # Queue resolved body data for being handed over to the targets, taking the
+    # emit sizing into account. Returns whether there is anything to emit now.
+    # final flushes everything collected so far, at the end of a part.
+    cdef bint _queue(self, object data, bint final):
+        cdef Py_ssize_t size = len(data) + len(self._coalesce)
+
+        if size == 0:
+            return False
+
+        if self.min_emit_size:
+            if not final and size < <Py_ssize_t> self.min_emit_size:
+                self._coalesce += data
+                if type(data) is memoryview:
+                    data.release()
+                return False
+
+            if self._coalesce:
+                self._coalesce += data
+                if type(data) is memoryview:
+                    data.release()
+
+                data, self._coalesce = self._coalesce, bytearray()
+                if self._emit_views:
+                    data = memoryview(data)
+
+        self._emit_rest = data
+        self._emit_offset = 0
+        return True
+
+    # Take the next piece of at most max_emit_size bytes off _emit_rest, as
+    # bytes unless the targets accept views.
+    cdef Action _next_piece(self):
+        cdef object data = self._emit_rest
+        cdef size_t start = self._emit_offset
+        cdef size_t end = len(data)
+
+        if self.max_emit_size and end - start > self.max_emit_size:
+            end = start + self.max_emit_size
+            self._emit_offset = end
+        else:
+            self._emit_rest = None
+
+        if self._stats:
+            self._count_emit(end - start)
+
+        self._scan_used += end - start
+
+        if type(data) is bytes:
+            if start == 0 and self._emit_rest is None:
+                self._emit_data = data
+            else:
+                self._emit_data = data[start:end]
+        elif self._emit_views:
+            self._emit_data = data[start:end]
+        else:
+            self._emit_data = bytes(data[start:end])
+
+        if self._emit_rest is None and type(data) is memoryview:
+            data.release()
+
+        return ACT_EMIT_BODY
+
+    cdef void _count_emit(self, size_t size):
+        cdef int bits = 0
+
+        while size >> bits:
+            bits += 1
+
+        self._emits += 1
+        self._emitted_bytes += size
+        self._emit_sizes[bits] += 1
+
+    # Keep the stream bytes in [start, chunk_len) around for the next chunk.
+    # start may be negative, in which case the tail of the current carry-over
+    # is kept as well.
+    cdef int _keep(
+        self, const Byte *chunk_ptr, Py_ssize_t start, size_t chunk_len
+    ) except -1:
+        cdef size_t kept = 0
+        cdef size_t size
+        cdef Byte *carry
+
+        if start < 0:
+            kept = -start
+            memmove(self._carry, self._carry + self._carry_len - kept, kept)
+            start = 0
+
+        size = kept + chunk_len - start
+
+        if size > self._carry_size:
+            carry = <Byte *> PyMem_Realloc(
+                self._carry, max(size, 2 * self._carry_size)
+            )
+            if carry is NULL:
+                raise MemoryError()
+
+            self._carry = carry
+            self._carry_size = max(size, 2 * self._carry_size)
+
+        memcpy(self._carry + kept, chunk_ptr + start, chunk_len - start)
+        self._carry_len = size
+
+        if self._stats and size:
+            self._carries += 1
+            self._carried_bytes += size
+
+        return 0
+
+    cdef Action _error(self, int error_code, size_t *index_ptr, size_t idx):
+        self.mark_error()
+        self._error_code = error_code
+        index_ptr[0] = idx + 1
+        return ACT_ERROR
 
     # The core state machine
-    cdef Action _scan(self, bytes chunk, size_t *index_ptr, size_t *buffer_start_ptr):
-        cdef size_t idx, buffer_start, chunk_len
-        cdef size_t match_start, skip_count, matched_length
+    cdef Action _scan(
+        self,
+        const Byte *chunk_ptr,
+        size_t chunk_len,
+        size_t *index_ptr,
+        Py_ssize_t *buffer_start_ptr,
+    ):
+        cdef size_t idx
+        cdef Py_ssize_t buffer_start
         cdef Byte byte
-        cdef const Byte *chunk_ptr
+        cdef bytes line
+        cdef str name, filename, content_type
+
+        if self._abandoned:
+            self._error_code = ErrorGroup.Internal + 6
+            return ACT_ERROR
+
+        if self._emit_rest is not None:
+            return self._next_piece()
+
+        if self._pending_finish:
+            self._pending_finish = False
+            return ACT_PART_END
+
+        if self.state == ParserState.PS_END:
+            index_ptr[0] = chunk_len
+            return ACT_DONE
+
+        if self.state == ParserState.PS_ERROR:
+            self._error_code = ErrorGroup.Internal + 5
+            return ACT_ERROR
+
+        if self.state == ParserState.PS_READING_BODY:
+            return self._scan_body(
+                chunk_ptr, chunk_len, index_ptr, buffer_start_ptr
+            )
 
-        chunk_ptr = chunk
-        chunk_len = len(chunk)
-        
         buffer_start = buffer_start_ptr[0]
         idx = index_ptr[0]
 
@@ -359,29 +1725,17 @@ cdef class _Parser:
                 elif byte == c_cr:
                     self.state = ParserState.PS_START_CR
                 else:
-                    self.mark_error()
-                    self._error_code = ErrorGroup.Delimiting + 1
-                    index_ptr[0] = idx + 1
-                    buffer_start_ptr[0] = buffer_start
-                    return ACT_ERROR
+                    return self._error(ErrorGroup.Delimiting + 1, index_ptr, idx)
 
             elif self.state == ParserState.PS_START_CR:
                 if byte == c_lf:
                     self.state = ParserState.PS_START
                 else:
-                    self.mark_error()
-                    self._error_code = ErrorGroup.Delimiting + 4
-                    index_ptr[0] = idx + 1
-                    buffer_start_ptr[0] = buffer_start
-                    return ACT_ERROR
+                    return self._error(ErrorGroup.Delimiting + 4, index_ptr, idx)
 
             elif self.state == ParserState.PS_STARTING_BOUNDARY:
                 if byte != c_hyphen:
-                    self.mark_error()
-                    self._error_code = ErrorGroup.Delimiting + 2
-                    index_ptr[0] = idx + 1
-                    buffer_start_ptr[0] = buffer_start
-                    return ACT_ERROR
+                    return self._error(ErrorGroup.Delimiting + 2, index_ptr, idx)
                 self.state = ParserState.PS_READING_BOUNDARY
 
             elif self.state == ParserState.PS_READING_BOUNDARY:
@@ -390,85 +1744,36 @@ cdef class _Parser:
 
             elif self.state == ParserState.PS_ENDING_BOUNDARY:
                 if byte != c_lf:
-                    self.mark_error()
-                    self._error_code = ErrorGroup.Delimiting + 3
-                    index_ptr[0] = idx + 1
-                    buffer_start_ptr[0] = buffer_start
-                    return ACT_ERROR
+                    return self._error(ErrorGroup.Delimiting + 3, index_ptr, idx)
 
                 # ensure we have read a valid boundary delimiter
-                boundary_candidate = b'\r\n' + chunk[buffer_start: idx + 1]
+                line = self._slice(chunk_ptr, buffer_start, idx + 1)
 
-                if boundary_candidate == self.delimiter_finder.target:
+                if b'\r\n' + line == self.delimiter:
                     buffer_start = idx + 1
-                    self.state = ParserState.PS_READING_HEADER
-                elif chunk[buffer_start: idx + 1].startswith(self.ender_finder.target[2:]):
+                    self._carry_len = 0
+                    self.state = ParserState.PS_ENDED_HEADER
+                elif line.startswith(self.ender[2:]):
                     # End boundary at the start of the stream (empty multipart form)
-                    # self.ender_finder.target is \r\n--{boundary}--
+                    # self.ender is \r\n--{boundary}--
                     # Without the leading \r\n, the end boundary pattern is --{boundary}--
-                    buffer_start = idx + 1
                     self.state = ParserState.PS_END
+                    self._carry_len = 0
+                    index_ptr[0] = chunk_len
+                    return ACT_DONE
                 else:
-                    self.mark_error()
-                    self._error_code = ErrorGroup.Delimiting + 5
-                    index_ptr[0] = idx + 1
-                    buffer_start_ptr[0] = buffer_start
-                    return ACT_ERROR
+                    return self._error(ErrorGroup.Delimiting + 5, index_ptr, idx)
+
             elif self.state == ParserState.PS_READING_HEADER:
                 if byte == c_cr:
                     self.state = ParserState.PS_ENDING_HEADER
 
             elif self.state == ParserState.PS_ENDING_HEADER:
                 if byte != c_lf:
-                    self.mark_error()
-                    self._error_code = ErrorGroup.PartHeaders + 1
-                    index_ptr[0] = idx + 1
-                    buffer_start_ptr[0] = buffer_start
-                    return ACT_ERROR
-
-                message = Parser(policy=HTTP).parsestr(
-                    chunk[buffer_start: idx + 1].decode('utf-8')
-                )
-
-                if 'content-disposition' in message:
-                    if not message.get_content_disposition() == 'form-data':
-                        self.mark_error()
-                        self._error_code = ErrorGroup.PartHeaders + 1
-                        index_ptr[0] = idx + 1
-                        buffer_start_ptr[0] = buffer_start
-                        return ACT_ERROR
-
-                    params = message['content-disposition'].params
-                    name = params.get('name')
-
-                    if name:
-                        part = self._part_for(name, exact=False)
-                        if part is None:
-                            part = self.default_part
-                            if self.strict:
-                                self.unexpected_part_name = name
-                                self.mark_error()
-                                self._error_code = ErrorGroup.UnexpectedPart
-                                index_ptr[0] = idx + 1
-                                buffer_start_ptr[0] = buffer_start
-                                return ACT_ERROR
-
-                        self._set_active_part(part, params.get('filename'))
-                        buffer_start = idx + 1
-                        self.state = ParserState.PS_ENDED_HEADER
-                        index_ptr[0] = idx + 1
-                        buffer_start_ptr[0] = buffer_start
-                        return ACT_PART_START 
-
-                elif 'content-type' in message:
-                    if self.active_part:
-                        self.active_part.set_multipart_content_type(
-                            message.get_content_type()
-                        )
-
-                buffer_start = idx + 1
+                    return self._error(ErrorGroup.PartHeaders + 1, index_ptr, idx)
 
                 self.state = ParserState.PS_ENDED_HEADER
+
             elif self.state == ParserState.PS_ENDED_HEADER:
                 if byte == c_cr:
                     self.state = ParserState.PS_ENDING_ALL_HEADERS
@@ -477,230 +1782,273 @@ cdef class _Parser:
 
             elif self.state == ParserState.PS_ENDING_ALL_HEADERS:
                 if byte != c_lf:
-                    self.mark_error()
-                    self._error_code = ErrorGroup.PartHeaders + 2
-                    index_ptr[0] = idx + 1
-                    buffer_start_ptr[0] = buffer_start
-                    return ACT_ERROR
+                    return self._error(ErrorGroup.PartHeaders + 2, index_ptr, idx)
+
+                # buffer_start points to the beginning of the header block
+                valid, name, filename, content_type = self._parse_part_headers(
+                    self._slice(chunk_ptr, buffer_start, idx + 1)
+                )
+                self._carry_len = 0
+                self._emit_views = False
+                self._coalesce = bytearray()
+
+                if not valid:
+                    return self._error(ErrorGroup.PartHeaders + 1, index_ptr, idx)
 
-                buffer_start = idx + 1
                 self.state = ParserState.PS_READING_BODY
 
-            elif self.state == ParserState.PS_READING_BODY:
-                self.delimiter_finder.feed(byte)
-                self.ender_finder.feed(byte)
+                index_ptr[0] = idx + 1
+                buffer_start_ptr[0] = idx + 1
 
-                if self.delimiter_finder.found():
-                    self.state = ParserState.PS_READING_HEADER
+                if name:
+                    if self._deferred:
+                        self._part_start = PartStart(name, filename, content_type)
+                        return ACT_PART_START
 
-                    if idx + 1 < self.delimiter_length:
-                        self.mark_error()
-                        self._error_code = ErrorGroup.Internal + 1
-                        index_ptr[0] = idx + 1
-                        buffer_start_ptr[0] = buffer_start
-                        return ACT_ERROR
-
-                    match_start = idx + 1 - self.delimiter_length
-
-                    if match_start >= buffer_start:
-                        self._emit_data = chunk[buffer_start: match_start]
-                        self.delimiter_finder.reset()
-                        buffer_start = idx + 1
-                        index_ptr[0] = idx + 1 
-                        buffer_start_ptr[0] = buffer_start
-                        self._pending_finish = True
-                        return ACT_EMIT_BODY
-                    else:
-                        self.delimiter_finder.reset()
-                        buffer_start = idx + 1
-                        self._pending_finish = True
-                        index_ptr[0] = idx + 1
-                        buffer_start_ptr[0] = buffer_start
-                        return ACT_PART_END
-
-                elif self.ender_finder.found():
-                    self.state = ParserState.PS_END
+                    # in event mode, parts only need to be looked up in strict mode
+                    if self.strict or not self._events:
+                        part = self._find_part(name)
+                        if part is None:
+                            part = self.default_part
+                            if self.strict:
+                                self.unexpected_part_name = name
+                                return self._error(
+                                    ErrorGroup.UnexpectedPart, index_ptr, idx
+                                )
 
-                    if idx + 1 < self.ender_length:
-                        self.mark_error()
-                        self._error_code = ErrorGroup.Internal + 3
-                        index_ptr[0] = idx + 1
-                        buffer_start_ptr[0] = buffer_start
-                        return ACT_ERROR
-                        
-                    match_start = idx + 1 - self.ender_length
-
-                    if match_start >= buffer_start:
-                        self._emit_data = chunk[buffer_start: match_start]
-                        self.ender_finder.reset()
-                        buffer_start = idx + 1
-                        index_ptr[0] = idx + 1
-                        buffer_start_ptr[0] = buffer_start
-                        self._pending_finish = True
-                        return ACT_EMIT_BODY
+                    if self._events:
+                        self._part_start = PartStart(name, filename, content_type)
+                        self._emit_views = self.zero_copy
                     else:
-                        self.ender_finder.reset()
-                        buffer_start = idx + 1
-                        self._pending_finish = True
-                        index_ptr[0] = idx + 1
-                        buffer_start_ptr[0] = buffer_start
-                        return ACT_PART_END
+                        self._set_active_part(part, name, filename, content_type)
+                    return ACT_PART_START
 
-                else:
-                    # This block is purely for speed optimization.
-                    # The idea is to skip all data not containing the delimiter
-                    # starting sequence '\r\n--' when we are not already in the
-                    # middle of a potential delimiter.
-
-                    if self.delimiter_finder.inactive():
-                        skip_count = self.rewind_fast_forward(
-                            chunk_ptr, idx + 1, chunk_len - 1
-                        )
-                        idx += skip_count
-            
-            if self._pending_finish:
-                 self._pending_finish = False
-                 index_ptr[0] = idx
-                 buffer_start_ptr[0] = buffer_start
-                 return ACT_PART_END
-
-            elif self.state == ParserState.PS_END:
-                index_ptr[0] = idx + 1
-                buffer_start_ptr[0] = buffer_start
-                return ACT_DONE 
-            
-            elif self.state == ParserState.PS_ERROR:
-                self._error_code = ErrorGroup.Internal + 5
-                index_ptr[0] = idx + 1
-                buffer_start_ptr[0] = buffer_start
-                return ACT_ERROR
+                return ACT_CONTINUE
 
             idx += 1
 
-        if idx != chunk_len:
-            self.mark_error()
-            self._error_code = ErrorGroup.Internal + 6
-            index_ptr[0] = idx
-            buffer_start_ptr[0] = buffer_start
-            return ACT_ERROR
+        index_ptr[0] = idx
 
-        if buffer_start > chunk_len:
-            self.mark_error()
-            self._error_code = ErrorGroup.Internal + 7
-            index_ptr[0] = idx
-            buffer_start_ptr[0] = buffer_start
-            return ACT_ERROR
+        if (
+            self.state == ParserState.PS_STARTING_BOUNDARY
+            or self.state == ParserState.PS_READING_BOUNDARY
+            or self.state == ParserState.PS_ENDING_BOUNDARY
+            or self.state == ParserState.PS_READING_HEADER
+            or self.state == ParserState.PS_ENDING_HEADER
+            or self.state == ParserState.PS_ENDED_HEADER
+            or self.state == ParserState.PS_ENDING_ALL_HEADERS
+        ):
+            # unfinished boundary line or header block
+            self._keep(chunk_ptr, buffer_start, chunk_len)
+        else:
+            self._carry_len = 0
 
-        if self.state == ParserState.PS_READING_BODY:
-            matched_length = max(
-                self.delimiter_finder.matched_length(),
-                self.ender_finder.matched_length()
-            )
-            match_start = idx - matched_length
+        buffer_start_ptr[0] = chunk_len
+        return ACT_DONE
 
-            if match_start >= buffer_start + c_min_file_body_chunk_size:
-                self._emit_data = chunk[buffer_start: match_start]
-                buffer_start = match_start
-                index_ptr[0] = idx
-                buffer_start_ptr[0] = buffer_start
-                return ACT_EMIT_BODY
+    # Scan the body of a part, starting at index_ptr[0], for the next boundary.
+    # All body data up to the boundary (or up to a potential boundary at the end
+    # of the chunk) is emitted in a single piece.
+    cdef Action _scan_body(
+        self,
+        const Byte *chunk_ptr,
+        size_t chunk_len,
+        size_t *index_ptr,
+        Py_ssize_t *buffer_start_ptr,
+    ):
+        cdef size_t idx = index_ptr[0]
+        cdef Py_ssize_t buffer_start = buffer_start_ptr[0]
+        cdef Py_ssize_t match_start
+        cdef size_t carried, window_len
+        cdef MatchKind kind
+
+        if idx == chunk_len:
+            # the chunk has been dealt with already
+            return ACT_DONE
+
+        if idx == 0 and buffer_start < 0:
+            # The carried over bytes are the beginning of a potential boundary.
+            # Check whether the boundary actually starts in there, using just
+            # enough bytes from the new chunk to complete it.
+            carried = -buffer_start
+            window_len = carried + min(chunk_len, self.delimiter_length - 1)
+
+            memcpy(self._window, self._carry, carried)
+            memcpy(self._window + carried, chunk_ptr, window_len - carried)
+
+            match_start = self._find(self._window, 0, window_len, &kind)
+
+            if self._stats:
+                self._searches += 1
+                self._bytes_searched += window_len
+
+            if kind != MatchKind.MK_NONE and match_start < <Py_ssize_t> carried:
+                match_start -= carried
+
+                if kind == MatchKind.MK_PARTIAL:
+                    # the whole chunk might still be part of the boundary
+                    return self._end_body(
+                        chunk_ptr, chunk_len, buffer_start, match_start,
+                        index_ptr, buffer_start_ptr,
+                    )
+
+                return self._end_part(
+                    kind, chunk_ptr, buffer_start, match_start,
+                    index_ptr, buffer_start_ptr,
+                )
 
-        if idx - buffer_start > 0:
-            self._leftover_buffer = chunk[buffer_start: idx]
+            if self._view is not None:
+                # The carried over bytes are body data. Hand them over on their
+                # own, so that the rest of the chunk can be passed on as a view.
+                data = self._slice(chunk_ptr, buffer_start, 0)
+                self._carry_len = 0
+                buffer_start = 0
+                buffer_start_ptr[0] = 0
+                if self._queue(data, False):
+                    return ACT_CONTINUE
+
+        if chunk_len - idx >= c_nogil_min_length:
+            with nogil:
+                match_start = self._find(chunk_ptr, idx, chunk_len, &kind)
+        else:
+            match_start = self._find(chunk_ptr, idx, chunk_len, &kind)
 
-        if self._pending_finish:
-             self._pending_finish = False
-             return ACT_PART_END
+        if self._stats:
+            self._searches += 1
+            if kind == MatchKind.MK_DELIMITER or kind == MatchKind.MK_ENDER:
+                self._bytes_searched += match_start + self.delimiter_length - idx
+            else:
+                self._bytes_searched += chunk_len - idx
 
-        if self._emit_data is not None:
-             index_ptr[0] = idx
-             buffer_start_ptr[0] = buffer_start
-             return ACT_EMIT_BODY
+        if kind == MatchKind.MK_NONE:
+            match_start = chunk_len
 
-        index_ptr[0] = idx
-        buffer_start_ptr[0] = buffer_start
-        return ACT_DONE
+        if kind == MatchKind.MK_DELIMITER or kind == MatchKind.MK_ENDER:
+            return self._end_part(
+                kind, chunk_ptr, buffer_start, match_start,
+                index_ptr, buffer_start_ptr,
+            )
 
-    # rewind_fast_forward searches for the '\r\n--' sequence in the provided
-    # buffer. It returns the number of characters which can be skipped before
-    # the delimiter starts (including potential 4-byte match). It may also
-    # update Finder object states.
+        return self._end_body(
+            chunk_ptr, chunk_len, buffer_start, match_start,
+            index_ptr, buffer_start_ptr,
+        )
+
+    # A boundary starting at match_start has been found
+    cdef Action _end_part(
+        self,
+        MatchKind kind,
+        const Byte *chunk_ptr,
+        Py_ssize_t buffer_start,
+        Py_ssize_t match_start,
+        size_t *index_ptr,
+        Py_ssize_t *buffer_start_ptr,
+    ):
+        if kind == MatchKind.MK_DELIMITER:
+            # the delimiter includes the CRLF ending its line
+            self.state = ParserState.PS_ENDED_HEADER
+        else:
+            self.state = ParserState.PS_END
 
-    cdef size_t rewind_fast_forward(
-        self, const Byte *chunk_ptr, size_t pos_first, size_t pos_last
+        index_ptr[0] = match_start + self.delimiter_length
+        buffer_start_ptr[0] = match_start + self.delimiter_length
+
+        if self._indexing:
+            self._body_end = self._stream_offset + match_start
+            self._carry_len = 0
+            return ACT_PART_END
+
+        if match_start > buffer_start:
+            data = self._body(chunk_ptr, buffer_start, match_start)
+        else:
+            data = b''
+
+        self._carry_len = 0
+
+        if self._queue(data, True):
+            self._pending_finish = True
+            return ACT_CONTINUE
+
+        return ACT_PART_END
+
+    # The chunk ends without a boundary. Everything before match_start (the
+    # start of a potential boundary, if any) is resolved body data; the rest has
+    # to be carried over to the next chunk.
+    cdef Action _end_body(
+        self,
+        const Byte *chunk_ptr,
+        size_t chunk_len,
+        Py_ssize_t buffer_start,
+        Py_ssize_t match_start,
+        size_t *index_ptr,
+        Py_ssize_t *buffer_start_ptr,
     ):
-        cdef const Byte *ptr
-        cdef const Byte *ptr_end
-        cdef size_t skipped
+        index_ptr[0] = chunk_len
+        buffer_start_ptr[0] = chunk_len
 
-        # we need at least 4 characters in buffer
-        if pos_first + 3 > pos_last:
-            return 0
+        if match_start > buffer_start and not self._indexing:
+            data = self._body(chunk_ptr, buffer_start, match_start)
+            self._keep(chunk_ptr, match_start, chunk_len)
+            if self._queue(data, False):
+                return ACT_CONTINUE
+            return ACT_DONE
 
-        # calculate pointer to the first character of the buffer and the
-        # pointer to a character after the end of the buffer
-        ptr = chunk_ptr + pos_first + 3
-        ptr_end = chunk_ptr + pos_last + 1
-        skipped = 0
-
-        # try to match starting from the 4th character of the multipart
-        # delimiter (which always starts with a '\r\n--'). An additional
-        # optimization is checking only every second character while no hyphen
-        # is found.
-
-        while True:
-            if ptr >= ptr_end:
-                # normalize pointer value because we could jump few characters
-                # past the buffer end
-                ptr = ptr_end - 1
-
-                # if we iterated till the end of the buffer, we may need to
-                # keep up to 3 characters in the buffer until next chunk
-                # guess we will skip all characters in the buffer
-                skipped = pos_last - pos_first + 1
-
-                if ptr[0] == c_cr:
-                    skipped = skipped - 1
-                elif ptr[0] == c_lf and ptr[-1] == c_cr:
-                    skipped = skipped - 2
+        self._keep(chunk_ptr, match_start, chunk_len)
+        return ACT_DONE
+
+    # Search ptr[start:end] for the first boundary. Returns its position and
+    # sets kind_ptr to MK_DELIMITER or MK_ENDER accordingly. If there is no
+    # complete boundary, but the buffer ends with the beginning of one, its
+    # position is returned along with MK_PARTIAL. Otherwise the result is
+    # MK_NONE.
+    cdef Py_ssize_t _find(
+        self, const Byte *ptr, size_t start, size_t end, MatchKind *kind_ptr
+    ) noexcept nogil:
+        cdef const Byte *prefix = self.delimiter_ptr
+        cdef size_t length = self.prefix_length
+        cdef size_t pos = start
+        cdef Byte last = prefix[length - 1]
+        cdef Byte byte
+
+        while pos + length <= end:
+            byte = ptr[pos + length - 1]
+
+            if byte == last and memcmp(ptr + pos, prefix, length - 1) == 0:
+                if pos + length + 2 <= end:
+                    if ptr[pos + length] == c_cr and ptr[pos + length + 1] == c_lf:
+                        kind_ptr[0] = MatchKind.MK_DELIMITER
+                        return pos
+                    if (
+                        ptr[pos + length] == c_hyphen
+                        and ptr[pos + length + 1] == c_hyphen
+                    ):
+                        kind_ptr[0] = MatchKind.MK_ENDER
+                        return pos
                 elif (
-                    ptr[0] == c_hyphen
-                    and ptr[-1] == c_lf
-                    and ptr[-2] == c_cr
+                    pos + length == end
+                    or ptr[pos + length] == c_cr
+                    or ptr[pos + length] == c_hyphen
                 ):
-                    skipped = skipped - 3
-                break
+                    kind_ptr[0] = MatchKind.MK_PARTIAL
+                    return pos
 
-            if ptr[0] != c_hyphen:
-                ptr += 2
-            else:
-                if ptr[-1] != c_hyphen:
-                    ptr += 1
-                else:
-                    if ptr[-2] == c_lf and ptr[-3] == c_cr:
-                        self.delimiter_finder.reset()
-                        self.delimiter_finder.feed(c_cr)
-                        self.delimiter_finder.feed(c_lf)
-                        self.delimiter_finder.feed(c_hyphen)
-                        self.delimiter_finder.feed(c_hyphen)
+                self._false_matches += 1
 
-                        self.ender_finder.reset()
-                        self.ender_finder.feed(c_cr)
-                        self.ender_finder.feed(c_lf)
-                        self.ender_finder.feed(c_hyphen)
-                        self.ender_finder.feed(c_hyphen)
+            pos += self._skip[byte]
 
-                        skipped = (ptr - chunk_ptr) - pos_first + 1
+        # the prefix does not fit in anymore, but the buffer may still end with
+        # the beginning of it
+        if end >= length:
+            pos = max(start, end - length + 1)
 
-                        break
-                    ptr += 4
+        while pos < end:
+            if ptr[pos] == c_cr and memcmp(ptr + pos, prefix, end - pos) == 0:
+                kind_ptr[0] = MatchKind.MK_PARTIAL
+                return pos
+            pos += 1
 
-        return skipped
+        kind_ptr[0] = MatchKind.MK_NONE
+        return end
 
     cdef mark_error(self):
         self.state = ParserState.PS_ERROR
-
-        if self.active_part:
-            self.active_part.finish()
-
-    cdef bint _pending_finish
\ No newline at end of file
@@ -0,0 +1,1657 @@
+"""Pure Python implementation of the parser
+
+This is a drop-in replacement for the compiled _parser extension, for platforms
+where it is not available and for PyPy, whose JIT does a good job on it. Both have
+the same interface and behave the same. Instead of scanning byte by byte, the
+boundary is searched for using bytes.find, and so are the line endings in
+boundary lines and part headers.
+"""
+
+import asyncio
+import inspect
+import re
+from email.parser import Parser
+from email.policy import HTTP
+from enum import IntEnum
+from operator import eq
+from time import perf_counter
+from urllib.parse import unquote_to_bytes
+
+from streaming_form_data.events import Data, PartEnd, PartStart
+from streaming_form_data.tracing import PartTrace
+from streaming_form_data.targets import NullTarget
+
+_cr = 13
+_lf = 10
+_hyphen = 45
+_quote = 34
+_asterisk = 42
+_slash = 47
+_colon = 58
+_semicolon = 59
+_equals = 61
+
+_header_cache_size = 64
+
+# Body data is handed over to targets in pieces of at least this many bytes by
+# default, unless the part ends before
+_min_file_body_chunk_size = 1024
+
+
+# 100..199: internal program errors (asserts)
+# 200..299: problems with delimiting multipart stream into parts
+# 300..399: problems with parsing particular part headers
+# 400..499: problems with unregistered parts
+class ErrorGroup(IntEnum):
+    Internal = 100
+    Delimiting = 200
+    PartHeaders = 300
+    UnexpectedPart = 400
+
+
+# Results of searching a buffer for the boundary
+MK_NONE = 0
+MK_PARTIAL = 1
+MK_DELIMITER = 2
+MK_ENDER = 3
+
+# Scanner Actions
+ACT_CONTINUE = 0
+ACT_DONE = 1
+ACT_EMIT_BODY = 2
+ACT_PART_START = 3
+ACT_PART_END = 4
+ACT_ERROR = 5
+
+
+# Run the coroutines of several targets concurrently. All of them run to
+# completion even if some fail, after which the first error (in order of the
+# targets) is raised. Cancelling the caller cancels all of them.
+async def _gather(coros):
+    for result in await asyncio.gather(*coros, return_exceptions=True):
+        if isinstance(result, BaseException):
+            raise result
+
+
+# A view of a chunk, which has to be a contiguous buffer of unsigned bytes like the
+# compiled parser requires
+def _byte_view(data):
+    view = memoryview(data)
+    ndim, format, contiguous = view.ndim, view.format, view.c_contiguous
+
+    if ndim == 1 and format in ("B", "c") and contiguous:
+        return view.cast("B") if format != "B" else view
+
+    view.release()
+
+    if ndim != 1:
+        raise ValueError(
+            f"Buffer has wrong number of dimensions (expected 1, got {ndim})"
+        )
+    if format not in ("B", "c"):
+        raise ValueError(
+            f"Buffer dtype mismatch, expected unsigned bytes but got {format!r}"
+        )
+
+    raise ValueError("Buffer is not C-contiguous")
+
+
+_tracer_hooks = ("on_part_start", "on_first_byte", "on_part_end", "on_complete")
+
+
+# Whether any hook of the tracer is a coroutine function
+def _is_async_tracer(tracer):
+    return any(
+        inspect.iscoroutinefunction(getattr(tracer, hook)) for hook in _tracer_hooks
+    )
+
+
+def _call_hook(result):
+    if inspect.isawaitable(result):
+        result.close()
+        raise TypeError("Async tracers require the async parser methods")
+
+
+async def _await_hook(result):
+    if inspect.isawaitable(result):
+        await result
+
+
+class Part:
+    """One part of a multipart/form-data request"""
+
+    def __init__(self, name, target, matches=None):
+        self.name = name
+        self.targets = [target]
+        self.matches = matches or eq
+
+        # Whether all targets accept memoryview chunks, and whether they are all
+        # nonblocking (see BaseTarget)
+        self.accepts_memoryview = getattr(target, "accepts_memoryview", False)
+        self.is_nonblocking = getattr(target, "is_nonblocking", False)
+
+        # Whether the async methods run the targets concurrently
+        self.concurrent = False
+
+        # Whether the time spent in the targets is added up, in elapsed for all of
+        # them (concurrent ones counted once) and in target_elapsed for each one
+        self.timed = False
+        self.elapsed = 0.0
+        self.target_elapsed = [0.0]
+
+        # The tracer (see set_tracer) and the trace of the part being handed
+        # over, along with elapsed at the time it started
+        self.tracer = None
+        self._trace = None
+        self._trace_elapsed = 0.0
+
+    def add_target(self, target):
+        self.targets.append(target)
+        self.target_elapsed.append(0.0)
+        self.accepts_memoryview = self.accepts_memoryview and getattr(
+            target, "accepts_memoryview", False
+        )
+        self.is_nonblocking = self.is_nonblocking and getattr(
+            target, "is_nonblocking", False
+        )
+
+    # Report the lifecycle of the parts handed over to the targets to the given
+    # tracer. Parts with async tracers are never called synchronously.
+    def set_tracer(self, tracer):
+        self.tracer = tracer
+
+        if tracer is not None:
+            self.timed = True
+            if _is_async_tracer(tracer):
+                self.is_nonblocking = False
+
+    # The headers of the part to be handed over next have been parsed
+    def begin_trace(self, name, filename, content_type):
+        self._trace = PartTrace(
+            name, filename, content_type, list(self.targets), perf_counter()
+        )
+        self._trace_elapsed = self.elapsed
+
+    def _trace_data(self, chunk):
+        trace = self._trace
+        trace.bytes_received += len(chunk)
+
+        if trace.first_byte_at is None:
+            trace.first_byte_at = perf_counter()
+            return self.tracer.on_first_byte(trace)
+
+    def _end_trace(self):
+        trace, self._trace = self._trace, None
+        trace.ended_at = perf_counter()
+        trace.target_time = self.elapsed - self._trace_elapsed
+
+        return self.tracer.on_part_end(trace)
+
+    def set_multipart_filename(self, value):
+        for target in self.targets:
+            target.set_multipart_filename(value)
+
+    def set_multipart_content_type(self, value):
+        for target in self.targets:
+            target.set_multipart_content_type(value)
+
+    # Call the given method of every target, timing each one
+    def _call_timed(self, method, args):
+        for position, target in enumerate(self.targets):
+            started = perf_counter()
+            try:
+                getattr(target, method)(*args)
+            finally:
+                elapsed = perf_counter() - started
+                self.target_elapsed[position] += elapsed
+                self.elapsed += elapsed
+
+    async def _await_timed(self, position, coro):
+        started = perf_counter()
+
+        try:
+            await coro
+        finally:
+            self.target_elapsed[position] += perf_counter() - started
+
+    # Await the given method of every target (concurrently if enabled), timing
+    # each one
+    async def _acall_timed(self, method, args):
+        started = perf_counter()
+
+        try:
+            if self.concurrent and len(self.targets) > 1:
+                await _gather(
+                    [
+                        self._await_timed(position, getattr(target, method)(*args))
+                        for position, target in enumerate(self.targets)
+                    ]
+                )
+            else:
+                for position, target in enumerate(self.targets):
+                    await self._await_timed(position, getattr(target, method)(*args))
+        finally:
+            self.elapsed += perf_counter() - started
+
+    def start(self):
+        if self._trace is not None:
+            _call_hook(self.tracer.on_part_start(self._trace))
+
+        if self.timed:
+            self._call_timed("start", ())
+        else:
+            for target in self.targets:
+                target.start()
+
+    def data_received(self, chunk):
+        if self._trace is not None:
+            _call_hook(self._trace_data(chunk))
+
+        if self.timed:
+            self._call_timed("data_received", (chunk,))
+        else:
+            for target in self.targets:
+                target.data_received(chunk)
+
+    def finish(self):
+        if self.timed:
+            self._call_timed("finish", ())
+        else:
+            for target in self.targets:
+                target.finish()
+
+        if self._trace is not None:
+            _call_hook(self._end_trace())
+
+    async def astart(self):
+        if self._trace is not None:
+            await _await_hook(self.tracer.on_part_start(self._trace))
+
+        if self.timed:
+            await self._acall_timed("astart", ())
+        elif self.concurrent and len(self.targets) > 1:
+            await _gather([target.astart() for target in self.targets])
+        else:
+            for target in self.targets:
+                await target.astart()
+
+    async def adata_received(self, chunk):
+        if self._trace is not None:
+            await _await_hook(self._trace_data(chunk))
+
+        if self.timed:
+            await self._acall_timed("adata_received", (chunk,))
+        elif self.concurrent and len(self.targets) > 1:
+            await _gather([target.adata_received(chunk) for target in self.targets])
+        else:
+            for target in self.targets:
+                await target.adata_received(chunk)
+
+    async def afinish(self):
+        if self.timed:
+            await self._acall_timed("afinish", ())
+        elif self.concurrent and len(self.targets) > 1:
+            await _gather([target.afinish() for target in self.targets])
+        else:
+            for target in self.targets:
+                await target.afinish()
+
+        if self._trace is not None:
+            await _await_hook(self._end_trace())
+
+
+# Regular expression matchers which can be combined into a single pattern. The
+# templates turn each pattern into one which is to be matched at the start of
+# the name, like re.match does.
+_regex_templates = {
+    re.fullmatch: r"(?:%s)\Z",
+    re.match: r"(?:%s)",
+    re.search: r"(?s:.*?)(?:%s)",
+}
+
+
+class PartIndex:
+    """Finds the first registered part matching a name
+
+    See the extension module for how it works.
+    """
+
+    def __init__(self, entries):
+        alternatives = []
+
+        self.exact = {}
+        self.pattern = None
+        self.pattern_positions = []
+        self.others = []
+
+        for position, (name, matches) in enumerate(entries):
+            if matches is None or matches is eq:
+                self.exact.setdefault(name, position)
+                continue
+
+            template = _regex_templates.get(matches)
+
+            if template is not None and PartIndex._combinable(name):
+                alternatives.append("(" + template % name + ")")
+                self.pattern_positions.append(position)
+            else:
+                self.others.append((position, name, matches))
+
+        if alternatives:
+            self.pattern = re.compile("|".join(alternatives))
+
+    @staticmethod
+    def _combinable(pattern):
+        # Patterns with groups of their own (and thus possibly backreferences)
+        # or global flags can not be embedded into a larger one.
+        try:
+            compiled = re.compile(pattern)
+        except re.error:
+            return False
+
+        return compiled.groups == 0 and compiled.flags == re.UNICODE
+
+    def find(self, name):
+        best = self.exact.get(name, -1)
+
+        if self.pattern is not None:
+            match = self.pattern.match(name)
+            if match is not None:
+                position = self.pattern_positions[match.lastindex - 1]
+                if best < 0 or position < best:
+                    best = position
+
+        for position, entry_name, matches in self.others:
+            if best >= 0 and position > best:
+                break
+            if matches(entry_name, name):
+                return position
+
+        return best
+
+
+# Part header parsing, see the extension module for the details. Whenever a
+# header line looks unusual in any way, it is parsed using the email package.
+
+HK_OTHER = 0
+HK_CONTENT_DISPOSITION = 1
+HK_CONTENT_TYPE = 2
+
+_OWS = re.compile(rb"[ \t]*")
+# RFC 7230 tokens, and RFC 2231 attributes (tokens without "*'%")
+_TOKEN = re.compile(rb"[!#$%&'*+\-.^_`|~0-9A-Za-z]*")
+_ATTRIBUTE = re.compile(rb"[!#$&+\-.^_`|~0-9A-Za-z]*")
+# A backslash escapes any byte, other control characters are not allowed
+_QUOTED_STRING = re.compile(
+    rb'"([^"\\\x00-\x08\x0a-\x1f\x7f]*(?:\\[\x00-\xff][^"\\\x00-\x08\x0a-\x1f\x7f]*)*)"'
+)
+_QUOTED_PAIR = re.compile(rb"\\([\x00-\xff])")
+# RFC 5987 value-chars
+_EXT_VALUE_CHARS = re.compile(rb"(?:%[\x00-\xff]{2}|[!#$&+\-.^_`|~0-9A-Za-z])*")
+
+
+def _decode_ext_value(value):
+    # RFC 5987: charset "'" [ language ] "'" value-chars
+    fields = value.split(b"'", 2)
+    if len(fields) != 3:
+        return None
+
+    charset = fields[0].lower()
+    if charset not in (b"utf-8", b"iso-8859-1", b"us-ascii"):
+        return None
+
+    if _EXT_VALUE_CHARS.fullmatch(fields[2]) is None:
+        return None
+
+    try:
+        return unquote_to_bytes(fields[2]).decode(charset.decode("ascii"))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def _parse_params(line, pos):
+    # *( OWS ";" OWS attribute [ "*" ] OWS "=" OWS ( token / quoted-string ) ) OWS
+    #
+    # Returns a dict of (lowercase) parameter names to values, or None if the
+    # parameters look unusual. If a parameter is given more than once, the first
+    # value wins; an extended (name*=) value always wins over a regular one.
+    params = {}
+    extended = {}
+    end = len(line)
+
+    while True:
+        pos = _OWS.match(line, pos).end()
+        if pos == end:
+            break
+        if line[pos] != _semicolon:
+            return None
+
+        pos = _OWS.match(line, pos + 1).end()
+        if pos == end:
+            break
+
+        start = pos
+        pos = _ATTRIBUTE.match(line, pos).end()
+        if pos == start:
+            return None
+        # RFC 2231 continuations (name*0=...) are left to the email package
+        if pos < end and line[pos] == _asterisk:
+            pos += 1
+        name = line[start:pos].lower()
+
+        pos = _OWS.match(line, pos).end()
+        if pos == end or line[pos] != _equals:
+            return None
+        pos = _OWS.match(line, pos + 1).end()
+
+        if pos < end and line[pos] == _quote:
+            quoted = True
+            match = _QUOTED_STRING.match(line, pos)
+            if match is None:
+                return None
+
+            value = match.group(1)
+            if b"\\" in value:
+                value = _QUOTED_PAIR.sub(rb"\1", value)
+            pos = match.end()
+        else:
+            quoted = False
+            start = pos
+            pos = _TOKEN.match(line, pos).end()
+            if pos == start:
+                return None
+            value = line[start:pos]
+            if b"*" in value:
+                return None
+
+        if name.endswith(b"*"):
+            if quoted:
+                return None
+            value = _decode_ext_value(value)
+            if value is None:
+                return None
+            extended.setdefault(name[:-1].decode("ascii"), value)
+        elif not quoted and b"'" in value:
+            return None
+        else:
+            try:
+                params.setdefault(name.decode("ascii"), value.decode("utf-8"))
+            except UnicodeDecodeError:
+                return None
+
+    params.update(extended)
+    return params
+
+
+def _parse_header_line_email(line):
+    message = Parser(policy=HTTP).parsestr(line.decode("utf-8"))
+
+    if "content-disposition" in message:
+        return (
+            HK_CONTENT_DISPOSITION,
+            message.get_content_disposition(),
+            dict(message["content-disposition"].params),
+        )
+    elif "content-type" in message:
+        return (HK_CONTENT_TYPE, message.get_content_type(), None)
+
+    return (HK_OTHER, None, None)
+
+
+def _parse_header_line(line):
+    # Parse a single header line (without the trailing CRLF) and return a
+    # (kind, value, params) tuple. For Content-Disposition the value is the
+    # (lowercase) disposition type, for Content-Type the (lowercase) media type.
+    end = len(line)
+
+    pos = _TOKEN.match(line).end()
+    if pos == 0 or pos == end or line[pos] != _colon:
+        return _parse_header_line_email(line)
+
+    name = line[:pos].lower()
+
+    if name == b"content-disposition":
+        start = _OWS.match(line, pos + 1).end()
+        pos = _TOKEN.match(line, start).end()
+        if pos > start:
+            params = _parse_params(line, pos)
+            if params is not None:
+                return (
+                    HK_CONTENT_DISPOSITION,
+                    line[start:pos].lower().decode("ascii"),
+                    params,
+                )
+
+    elif name == b"content-type":
+        start = _OWS.match(line, pos + 1).end()
+        pos = _TOKEN.match(line, start).end()
+        if pos > start and pos < end and line[pos] == _slash:
+            pos = _TOKEN.match(line, pos + 1).end()
+            if line[pos - 1] != _slash:
+                media_type_end = pos
+                pos = _OWS.match(line, pos).end()
+                if pos == end or line[pos] == _semicolon:
+                    return (
+                        HK_CONTENT_TYPE,
+                        line[start:media_type_end].lower().decode("ascii"),
+                        None,
+                    )
+
+    else:
+        return (HK_OTHER, None, None)
+
+    return _parse_header_line_email(line)
+
+
+def _parse_part_headers(block):
+    # Parse the header block of a part (all header lines including the CRLF
+    # terminating the block) into a (valid, name, filename, content_type) tuple
+    params = None
+    content_type = None
+
+    for line in block.split(b"\r\n"):
+        if not line:
+            continue
+
+        header = _parse_header_line(line)
+
+        if header[0] == HK_CONTENT_DISPOSITION:
+            if header[1] != "form-data":
+                return (False, None, None, None)
+            params = header[2]
+        elif header[0] == HK_CONTENT_TYPE:
+            content_type = header[1]
+
+    if params is None:
+        return (True, None, None, content_type)
+
+    return (True, params.get("name"), params.get("filename"), content_type)
+
+
+PS_START = 0
+PS_START_CR = 1
+
+PS_STARTING_BOUNDARY = 2
+PS_READING_BOUNDARY = 3
+PS_ENDING_BOUNDARY = 4
+
+PS_READING_HEADER = 5
+PS_ENDING_HEADER = 6
+PS_ENDED_HEADER = 7
+PS_ENDING_ALL_HEADERS = 8
+
+PS_READING_BODY = 9
+
+PS_END = 10
+
+PS_ERROR = 11
+
+# States in which the bytes since the start of the current boundary line or
+# header block have to be kept when a chunk ends
+_UNFINISHED_STATES = frozenset(
+    (
+        PS_STARTING_BOUNDARY,
+        PS_READING_BOUNDARY,
+        PS_ENDING_BOUNDARY,
+        PS_READING_HEADER,
+        PS_ENDING_HEADER,
+        PS_ENDED_HEADER,
+        PS_ENDING_ALL_HEADERS,
+    )
+)
+
+
+class _Parser:
+    # The structure follows the extension module: the chunk being parsed is
+    # scanned from _index on, and stream bytes which could not be resolved by
+    # the end of the previous chunk are kept in _carry, logically occupying the
+    # range [-len(_carry), 0) in front of the chunk. _buffer_start is the start
+    # of the boundary line, header block or body data currently being read.
+
+    def __init__(
+        self,
+        delimiter,
+        ender,
+        strict,
+        zero_copy=False,
+        min_emit_size=_min_file_body_chunk_size,
+        max_emit_size=None,
+        concurrent_targets=False,
+        stats=False,
+        tracer=None,
+        scan_budget=None,
+        scan_time_budget=None,
+    ):
+        if min_emit_size < 0:
+            raise ValueError("min_emit_size must not be negative")
+
+        if max_emit_size is not None and max_emit_size < max(min_emit_size, 1):
+            raise ValueError(
+                "max_emit_size must be positive and not below min_emit_size"
+            )
+
+        self.default_part = Part("_default", NullTarget())
+
+        self._header_cache = {}
+
+        self.zero_copy = zero_copy
+        self.min_emit_size = min_emit_size
+        self.max_emit_size = max_emit_size or 0
+
+        self.strict = strict
+        self.concurrent_targets = concurrent_targets
+        self._stats = stats
+
+        # passed on to the registered parts, see Part.set_tracer
+        self.tracer = tracer
+
+        # In async mode, the loop yields to the event loop between actions once
+        # _scan_time_budget seconds have passed (if not negative), or else once
+        # _scan_budget bytes of body data have been emitted, since the call
+        # started or the loop last yielded.
+        self._budgeted = scan_budget is not None or scan_time_budget is not None
+        self._scan_budget = scan_budget or 0
+        self._scan_time_budget = (
+            scan_time_budget / 1e6 if scan_time_budget is not None else -1
+        )
+        self._scan_used = 0
+        self._scan_started = 0.0
+
+        self.delimiter = None
+        self.ender = None
+        self._carry = bytearray()
+
+        self.reset(delimiter, ender)
+
+    # Prepare the parser for a new request, which may use a different boundary.
+    # Registered parts are dropped, the configuration is kept.
+    def reset(self, delimiter, ender):
+        if delimiter != self.delimiter or ender != self.ender:
+            self._set_delimiter(delimiter, ender)
+
+        self.state = PS_START
+
+        self.expected_parts = []
+        self.part_index = None
+
+        self.active_part = None
+
+        self._carry.clear()
+        self._chunk = b""
+        self._index = 0
+        self._buffer_start = 0
+
+        self._emit_data = None
+        self._emit_views = False
+        self._view = None
+
+        self._coalesce = bytearray()
+        self._emit_rest = None
+        self._emit_offset = 0
+
+        self._pending_finish = False
+        self._error_code = 0
+
+        # In event mode (see events), parts are reported as events instead of
+        # being passed on to targets
+        self._events = False
+        self._part_start = None
+        self._event_part = None
+
+        # In index mode (see index), which builds on event mode, bodies are
+        # skipped instead of being emitted, and only the offsets of the part at
+        # hand are recorded, relative to the first byte passed to index
+        self._indexing = False
+        self._stream_offset = 0
+        self._body_start = 0
+        self._body_end = 0
+
+        # While scanning in an executor thread (see adata_received_offloaded), the
+        # parts are looked up and set up by the caller on the event loop instead,
+        # as that calls into user code (matchers, targets and tracers).
+        # _part_start is then the event for the part which has just started.
+        # _abandoned is set when the caller went away while the executor was still
+        # scanning, which leaves the parser in an undefined state.
+        self._deferred = False
+        self._abandoned = False
+
+        self.unexpected_part_name = ""
+
+        # Statistics (see stats), only collected when _stats is set, apart from
+        # _false_matches: the prefix of the boundary found in body data without
+        # being followed by the end of the boundary line, which is rare enough
+        # to be counted in any case. _emit_sizes[n] counts the emits of at least
+        # 2**(n-1) and less than 2**n bytes.
+        self._chunks = self._bytes_received = 0
+        self._searches = self._bytes_searched = self._false_matches = 0
+        self._emits = self._emitted_bytes = 0
+        self._emit_sizes = [0] * 65
+        self._headers_parsed = self._header_cache_hits = 0
+        self._header_time = 0.0
+        self._carries = self._carried_bytes = 0
+
+    # The statistics collected since the last reset as a dict, or None if not
+    # enabled
+    def stats(self):
+        if not self._stats:
+            return None
+
+        return {
+            "chunks": self._chunks,
+            "bytes_received": self._bytes_received,
+            "searches": self._searches,
+            "bytes_searched": self._bytes_searched,
+            "false_matches": self._false_matches,
+            "emits": self._emits,
+            "emitted_bytes": self._emitted_bytes,
+            "emit_sizes": {
+                1 << (bits - 1): count
+                for bits, count in enumerate(self._emit_sizes)
+                if count
+            },
+            "headers_parsed": self._headers_parsed,
+            "header_cache_hits": self._header_cache_hits,
+            "header_time": self._header_time,
+            "carries": self._carries,
+            "carried_bytes": self._carried_bytes,
+            "target_time": {
+                target: elapsed
+                for part in self.expected_parts
+                for target, elapsed in zip(part.targets, part.target_elapsed)
+            },
+        }
+
+    # Whether the final boundary has been reached
+    @property
+    def finished(self):
+        return self.state == PS_END
+
+    def _set_delimiter(self, delimiter, ender):
+        if (
+            len(delimiter) != len(ender)
+            or len(delimiter) < 5
+            or delimiter[:-2] != ender[:-2]
+        ):
+            raise ValueError("Delimiter and ender must only differ in the end")
+
+        self.delimiter = delimiter
+        self.ender = ender
+
+        # The delimiter (\r\n--{boundary}\r\n) and the ender (\r\n--{boundary}--)
+        # have the same length and only differ in their last two bytes, so the
+        # body is searched for their shared prefix.
+        self.delimiter_length = len(delimiter)
+        self._prefix = delimiter[:-2]
+
+    def register(self, name, target, matches=None):
+        part = self._part_for(name)
+
+        if part:
+            part.add_target(target)
+        else:
+            part = Part(name, target, matches)
+            part.concurrent = self.concurrent_targets
+            part.timed = self._stats
+            part.set_tracer(self.tracer)
+            self.expected_parts.append(part)
+            self.part_index = None
+
+    # Use the given parts, along with an index built for them beforehand
+    def set_parts(self, parts, part_index):
+        for part in parts:
+            part.concurrent = self.concurrent_targets
+            part.timed = self._stats
+            part.set_tracer(self.tracer)
+
+        self.expected_parts = parts
+        self.part_index = part_index
+
+    def _set_active_part(self, part, name, filename, content_type):
+        if part.tracer is not None:
+            part.begin_trace(name, filename, content_type)
+        self.active_part = part
+        self._emit_views = self.zero_copy and part.accepts_memoryview
+        self.active_part.set_multipart_filename(filename)
+        if content_type is not None:
+            self.active_part.set_multipart_content_type(content_type)
+
+    def _parse_part_headers(self, block):
+        if self._stats:
+            started = perf_counter()
+
+        headers = self._header_cache.get(block)
+
+        if headers is None:
+            headers = _parse_part_headers(block)
+
+            if len(self._header_cache) < _header_cache_size:
+                self._header_cache[block] = headers
+        elif self._stats:
+            self._header_cache_hits += 1
+
+        if self._stats:
+            self._headers_parsed += 1
+            self._header_time += perf_counter() - started
+
+        return headers
+
+    def _find_part(self, name):
+        if self.part_index is None:
+            self.part_index = PartIndex(
+                [(part.name, part.matches) for part in self.expected_parts]
+            )
+
+        position = self.part_index.find(name)
+        if position < 0:
+            return None
+        return self.expected_parts[position]
+
+    # The registered part the part with the given name is passed on to, if any
+    def lookup(self, name):
+        return self._find_part(name)
+
+    def _part_for(self, name, exact=True):
+        for part in self.expected_parts:
+            if exact and part.name == name or part.matches(part.name, name):
+                return part
+
+    def data_received(self, data):
+        return self._run_loop(data, is_async=False)
+
+    async def adata_received(self, data):
+        ret = self._run_loop(data, is_async=True)
+        if type(ret) is int:
+            return ret
+        return await ret
+
+    # Process several chunks in a row, stopping at the first error
+    def data_received_many(self, chunks):
+        for data in chunks:
+            result = self._run_loop(data, is_async=False)
+            if result:
+                return result
+
+        return 0
+
+    async def adata_received_many(self, chunks):
+        for data in chunks:
+            ret = self._run_loop(data, is_async=True)
+            if type(ret) is not int:
+                ret = await ret
+            if ret:
+                return ret
+
+        return 0
+
+    # data may be any object supporting the buffer protocol. Anything but bytes
+    # is copied into a bytes object first, for bytes.find. In zero copy mode,
+    # the views handed over to the targets still point into data itself.
+    def _run_loop(self, data, is_async):
+        if not self._prepare(data):
+            return 0
+
+        suspended = False
+
+        if is_async and self._budgeted:
+            self._reset_budget()
+
+        try:
+            while True:
+                action = self._scan()
+
+                if action == ACT_CONTINUE:
+                    continue
+
+                elif action == ACT_DONE:
+                    break
+
+                # Nonblocking parts are called synchronously in async mode as
+                # well, which saves creating and awaiting a coroutine.
+                elif action == ACT_EMIT_BODY:
+                    if self.active_part:
+                        if is_async and not self.active_part.is_nonblocking:
+                            suspended = True
+                            return self._await_action(
+                                self.active_part.adata_received(self._emit_data)
+                            )
+                        else:
+                            self.active_part.data_received(self._emit_data)
+                    self._release_emit_data()
+
+                elif action == ACT_PART_START:
+                    if self.active_part:
+                        if is_async and not self.active_part.is_nonblocking:
+                            suspended = True
+                            return self._await_action(self.active_part.astart())
+                        else:
+                            self.active_part.start()
+
+                elif action == ACT_PART_END:
+                    if self.active_part:
+                        if is_async and not self.active_part.is_nonblocking:
+                            part, self.active_part = self.active_part, None
+                            suspended = True
+                            return self._await_action(part.afinish())
+                        else:
+                            self.active_part.finish()
+                        self.active_part = None
+
+                elif action == ACT_ERROR:
+                    if self.active_part:
+                        part, self.active_part = self.active_part, None
+                        if is_async and not part.is_nonblocking:
+                            return self._await_error(part.afinish())
+                        else:
+                            part.finish()
+                    return self._error_code
+
+                if is_async and self._budgeted and self._over_budget():
+                    suspended = True
+                    return self._await_action(self._yield())
+
+            return 0
+        finally:
+            # once suspended, _await_action is done with the chunk instead
+            if not suspended:
+                self._release_view()
+                self._chunk = b""
+
+    # Set up scanning the given chunk, returning it as bytes (empty if there is
+    # nothing to do)
+    def _prepare(self, data):
+        view = None
+
+        if type(data) is bytes:
+            chunk = data
+        else:
+            view = _byte_view(data)
+            chunk = view.tobytes()
+
+        if not chunk:
+            return chunk
+
+        if self._stats:
+            self._chunks += 1
+            self._bytes_received += len(chunk)
+
+        if self.zero_copy or self.min_emit_size or self.max_emit_size:
+            self._view = view if view is not None else memoryview(data)
+        elif view is not None:
+            view.release()
+
+        self._chunk = chunk
+        self._index = 0
+        self._buffer_start = -len(self._carry)
+
+        return chunk
+
+    # Keep the loop going after an await
+    async def _await_action(self, coro):
+        try:
+            await coro
+            self._release_emit_data()
+
+            while True:
+                action = self._scan()
+
+                if action == ACT_CONTINUE:
+                    continue
+                elif action == ACT_DONE:
+                    break
+                elif action == ACT_EMIT_BODY:
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.data_received(self._emit_data)
+                        else:
+                            await part.adata_received(self._emit_data)
+                    self._release_emit_data()
+                elif action == ACT_PART_START:
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.start()
+                        else:
+                            await part.astart()
+                elif action == ACT_PART_END:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+                elif action == ACT_ERROR:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+                    return self._error_code
+
+                if self._budgeted and self._over_budget():
+                    await self._yield()
+            return 0
+        finally:
+            self._release_view()
+            self._chunk = b""
+
+    async def _await_error(self, coro):
+        await coro
+        return self._error_code
+
+    def _reset_budget(self):
+        self._scan_used = 0
+        if self._scan_time_budget >= 0:
+            self._scan_started = perf_counter()
+
+    def _over_budget(self):
+        if self._scan_time_budget >= 0:
+            return perf_counter() - self._scan_started >= self._scan_time_budget
+        return self._scan_used >= self._scan_budget
+
+    async def _yield(self):
+        await asyncio.sleep(0)
+        self._reset_budget()
+
+    # Scan data, yielding the actions the caller has to carry out (anything but
+    # ACT_CONTINUE and ACT_DONE). Body data to be emitted is released when the
+    # generator is resumed, and scanning stops after ACT_ERROR.
+    def _actions(self, data):
+        if not self._prepare(data):
+            return
+
+        try:
+            while True:
+                action = self._scan()
+
+                if action == ACT_CONTINUE:
+                    continue
+
+                if action == ACT_DONE:
+                    return
+
+                yield action
+
+                if action == ACT_ERROR:
+                    return
+
+                self._release_emit_data()
+        finally:
+            self._release_emit_data()
+            self._release_view()
+            self._chunk = b""
+
+    # Parse data like data_received, but yield PartStart, Data and PartEnd events
+    # instead of calling the targets. The generator returns the error code.
+    def events(self, data):
+        actions = self._actions(data)
+
+        self._events = True
+
+        try:
+            for action in actions:
+                if action == ACT_EMIT_BODY:
+                    if self._event_part is not None:
+                        yield Data(self._emit_data)
+
+                elif action == ACT_PART_START:
+                    self._event_part = self._part_start.name
+                    yield self._part_start
+
+                elif action == ACT_PART_END:
+                    if self._event_part is not None:
+                        name, self._event_part = self._event_part, None
+                        yield PartEnd(name)
+
+                elif action == ACT_ERROR:
+                    self._event_part = None
+                    return self._error_code
+
+            return 0
+        finally:
+            self._events = False
+            self._part_start = None
+            actions.close()
+
+    # Scan data without emitting any body data, appending the name, filename,
+    # content type and body offsets of every complete part to form_index.
+    def index(self, data, form_index):
+        chunk = self._prepare(data)
+        if not chunk:
+            return 0
+
+        # the scan is done on a copy of the input if it is not bytes, which is
+        # not needed for emitting either
+        self._release_view()
+
+        self._events = True
+        self._indexing = True
+
+        try:
+            while True:
+                action = self._scan()
+
+                if action == ACT_DONE:
+                    return 0
+
+                elif action == ACT_PART_START:
+                    self._body_start = self._stream_offset + self._index
+
+                elif action == ACT_PART_END:
+                    if self._part_start is not None:
+                        form_index.append(
+                            *self._part_start, self._body_start, self._body_end
+                        )
+                        self._part_start = None
+
+                elif action == ACT_ERROR:
+                    self._part_start = None
+                    return self._error_code
+        finally:
+            self._events = False
+            self._indexing = False
+            self._stream_offset += len(chunk)
+            self._chunk = b""
+
+    # Look up and set up the part which has just started while scanning in
+    # deferred mode, returning whether that worked out (not in strict mode with
+    # an unexpected part)
+    def _start_deferred_part(self):
+        name, filename, content_type = self._part_start
+        self._part_start = None
+
+        part = self._find_part(name)
+        if part is None:
+            if self.strict:
+                self.unexpected_part_name = name
+                self.state = PS_ERROR
+                self._error_code = int(ErrorGroup.UnexpectedPart)
+                return False
+
+            part = self.default_part
+
+        self._set_active_part(part, name, filename, content_type)
+        return True
+
+    # Parse data like adata_received, but scan it in a thread of the given
+    # executor (the default one if None), so that the event loop can run
+    # meanwhile. The parts are still looked up, and the targets called, on the
+    # event loop, in between.
+    async def adata_received_offloaded(self, data, executor=None):
+        loop = asyncio.get_running_loop()
+        actions = self._actions(data)
+
+        self._deferred = True
+
+        try:
+            while True:
+                action = await loop.run_in_executor(executor, next, actions, ACT_DONE)
+
+                if action == ACT_DONE:
+                    return 0
+
+                elif action == ACT_EMIT_BODY:
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.data_received(self._emit_data)
+                        else:
+                            await part.adata_received(self._emit_data)
+
+                elif action == ACT_PART_START:
+                    if not self._start_deferred_part():
+                        return self._error_code
+
+                    part = self.active_part
+                    if part:
+                        if part.is_nonblocking:
+                            part.start()
+                        else:
+                            await part.astart()
+
+                elif action == ACT_PART_END:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+
+                elif action == ACT_ERROR:
+                    part, self.active_part = self.active_part, None
+                    if part:
+                        if part.is_nonblocking:
+                            part.finish()
+                        else:
+                            await part.afinish()
+                    return self._error_code
+        finally:
+            self._deferred = False
+            self._part_start = None
+
+            try:
+                actions.close()
+            except ValueError:
+                # cancelled while the executor is still scanning
+                self._abandoned = True
+                self.state = PS_ERROR
+                self._error_code = ErrorGroup.Internal + 6
+
+    def _release_emit_data(self):
+        if type(self._emit_data) is memoryview:
+            self._emit_data.release()
+        self._emit_data = None
+
+    def _release_view(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+    # Return the stream bytes in [start, end) as a new bytes object. Negative
+    # offsets refer to the bytes carried over from the previous chunk.
+    def _slice(self, start, end):
+        if start >= 0:
+            return self._chunk[start:end]
+
+        carry = self._carry
+        carried = len(carry)
+
+        if end <= 0:
+            return bytes(carry[carried + start : carried + end])
+
+        return bytes(carry[carried + start :]) + self._chunk[:end]
+
+    # Return the body data in [start, end), which is a view into the current
+    # chunk where possible, leaving copying to _next_piece.
+    def _body(self, start, end):
+        if self._view is not None and start >= 0:
+            return self._view[start:end]
+        return self._slice(start, end)
+
+    # Queue resolved body data for being handed over to the targets, taking the
+    # emit sizing into account. Returns whether there is anything to emit now.
+    # final flushes everything collected so far, at the end of a part.
+    def _queue(self, data, final):
+        size = len(data) + len(self._coalesce)
+
+        if size == 0:
+            return False
+
+        if self.min_emit_size:
+            if not final and size < self.min_emit_size:
+                self._coalesce += data
+                if type(data) is memoryview:
+                    data.release()
+                return False
+
+            if self._coalesce:
+                self._coalesce += data
+                if type(data) is memoryview:
+                    data.release()
+
+                data, self._coalesce = self._coalesce, bytearray()
+                if self._emit_views:
+                    data = memoryview(data)
+
+        self._emit_rest = data
+        self._emit_offset = 0
+        return True
+
+    # Take the next piece of at most max_emit_size bytes off _emit_rest, as
+    # bytes unless the targets accept views.
+    def _next_piece(self):
+        data = self._emit_rest
+        start = self._emit_offset
+        end = len(data)
+
+        if self.max_emit_size and end - start > self.max_emit_size:
+            end = start + self.max_emit_size
+            self._emit_offset = end
+        else:
+            self._emit_rest = None
+
+        if self._stats:
+            self._emits += 1
+            self._emitted_bytes += end - start
+            self._emit_sizes[(end - start).bit_length()] += 1
+
+        self._scan_used += end - start
+
+        if type(data) is bytes:
+            if start == 0 and self._emit_rest is None:
+                self._emit_data = data
+            else:
+                self._emit_data = data[start:end]
+        elif self._emit_views:
+            self._emit_data = data[start:end]
+        else:
+            self._emit_data = bytes(data[start:end])
+
+        if self._emit_rest is None and type(data) is memoryview:
+            data.release()
+
+        return ACT_EMIT_BODY
+
+    # Keep the stream bytes from start up to the end of the chunk around for the
+    # next chunk. start may be negative, in which case the tail of the current
+    # carry-over is kept as well.
+    def _keep(self, start):
+        carry = self._carry
+
+        if start < 0:
+            del carry[: len(carry) + start]
+            carry += self._chunk
+        else:
+            carry.clear()
+            carry += self._chunk[start:]
+
+        if self._stats and carry:
+            self._carries += 1
+            self._carried_bytes += len(carry)
+
+    def _error(self, error_code, idx):
+        self.state = PS_ERROR
+        self._error_code = int(error_code)
+        self._index = idx + 1
+        return ACT_ERROR
+
+    # The state machine for everything but part bodies
+    def _scan(self):
+        if self._abandoned:
+            self._error_code = ErrorGroup.Internal + 6
+            return ACT_ERROR
+
+        if self._emit_rest is not None:
+            return self._next_piece()
+
+        if self._pending_finish:
+            self._pending_finish = False
+            return ACT_PART_END
+
+        state = self.state
+
+        if state == PS_END:
+            self._index = len(self._chunk)
+            return ACT_DONE
+
+        if state == PS_ERROR:
+            self._error_code = ErrorGroup.Internal + 5
+            return ACT_ERROR
+
+        if state == PS_READING_BODY:
+            return self._scan_body()
+
+        chunk = self._chunk
+        chunk_len = len(chunk)
+        buffer_start = self._buffer_start
+        idx = self._index
+
+        while idx < chunk_len:
+            if state == PS_READING_BOUNDARY or state == PS_READING_HEADER:
+                # nothing but a CR changes the state, skip to the next one
+                idx = chunk.find(b"\r", idx)
+                if idx < 0:
+                    idx = chunk_len
+                    break
+
+                if state == PS_READING_BOUNDARY:
+                    state = PS_ENDING_BOUNDARY
+                else:
+                    state = PS_ENDING_HEADER
+
+                idx += 1
+                continue
+
+            byte = chunk[idx]
+
+            if state == PS_START:
+                if byte == _hyphen:
+                    buffer_start = idx
+                    state = PS_STARTING_BOUNDARY
+                elif byte == _cr:
+                    state = PS_START_CR
+                else:
+                    return self._error(ErrorGroup.Delimiting + 1, idx)
+
+            elif state == PS_START_CR:
+                if byte == _lf:
+                    state = PS_START
+                else:
+                    return self._error(ErrorGroup.Delimiting + 4, idx)
+
+            elif state == PS_STARTING_BOUNDARY:
+                if byte != _hyphen:
+                    return self._error(ErrorGroup.Delimiting + 2, idx)
+                state = PS_READING_BOUNDARY
+
+            elif state == PS_ENDING_BOUNDARY:
+                if byte != _lf:
+                    return self._error(ErrorGroup.Delimiting + 3, idx)
+
+                # ensure we have read a valid boundary delimiter
+                line = self._slice(buffer_start, idx + 1)
+
+                if b"\r\n" + line == self.delimiter:
+                    buffer_start = idx + 1
+                    self._carry.clear()
+                    state = PS_ENDED_HEADER
+                elif line.startswith(self.ender[2:]):
+                    # end boundary at the start of the stream (empty form)
+                    self.state = PS_END
+                    self._carry.clear()
+                    self._index = chunk_len
+                    return ACT_DONE
+                else:
+                    return self._error(ErrorGroup.Delimiting + 5, idx)
+
+            elif state == PS_ENDING_HEADER:
+                if byte != _lf:
+                    return self._error(ErrorGroup.PartHeaders + 1, idx)
+
+                state = PS_ENDED_HEADER
+
+            elif state == PS_ENDED_HEADER:
+                if byte == _cr:
+                    state = PS_ENDING_ALL_HEADERS
+                else:
+                    state = PS_READING_HEADER
+
+            elif state == PS_ENDING_ALL_HEADERS:
+                if byte != _lf:
+                    return self._error(ErrorGroup.PartHeaders + 2, idx)
+
+                # buffer_start points to the beginning of the header block
+                valid, name, filename, content_type = self._parse_part_headers(
+                    self._slice(buffer_start, idx + 1)
+                )
+                self._carry.clear()
+                self._emit_views = False
+                self._coalesce = bytearray()
+
+                if not valid:
+                    return self._error(ErrorGroup.PartHeaders + 1, idx)
+
+                self.state = PS_READING_BODY
+
+                self._index = idx + 1
+                self._buffer_start = idx + 1
+
+                if name:
+                    if self._deferred:
+                        self._part_start = PartStart(name, filename, content_type)
+                        return ACT_PART_START
+
+                    # in event mode, parts only need to be looked up in strict mode
+                    if self.strict or not self._events:
+                        part = self._find_part(name)
+                        if part is None:
+                            part = self.default_part
+                            if self.strict:
+                                self.unexpected_part_name = name
+                                return self._error(ErrorGroup.UnexpectedPart, idx)
+
+                    if self._events:
+                        self._part_start = PartStart(name, filename, content_type)
+                        self._emit_views = self.zero_copy
+                    else:
+                        self._set_active_part(part, name, filename, content_type)
+                    return ACT_PART_START
+
+                return ACT_CONTINUE
+
+            idx += 1
+
+        self.state = state
+        self._index = idx
+
+        if state in _UNFINISHED_STATES:
+            # unfinished boundary line or header block
+            self._keep(buffer_start)
+        else:
+            self._carry.clear()
+
+        self._buffer_start = chunk_len
+        return ACT_DONE
+
+    # Scan the body of a part for the next boundary. All body data up to the
+    # boundary (or up to a potential boundary at the end of the chunk) is
+    # emitted in a single piece.
+    def _scan_body(self):
+        chunk = self._chunk
+        chunk_len = len(chunk)
+        idx = self._index
+        buffer_start = self._buffer_start
+
+        if idx == chunk_len:
+            # the chunk has been dealt with already
+            return ACT_DONE
+
+        if idx == 0 and buffer_start < 0:
+            # The carried over bytes are the beginning of a potential boundary.
+            # Check whether the boundary actually starts in there, using just
+            # enough bytes from the new chunk to complete it.
+            carried = -buffer_start
+            window = bytes(self._carry) + chunk[: self.delimiter_length - 1]
+
+            match_start, kind = self._find(window, 0, len(window))
+
+            if self._stats:
+                self._searches += 1
+                self._bytes_searched += len(window)
+
+            if kind != MK_NONE and match_start < carried:
+                match_start -= carried
+
+                if kind == MK_PARTIAL:
+                    # the whole chunk might still be part of the boundary
+                    return self._end_body(buffer_start, match_start)
+
+                return self._end_part(kind, buffer_start, match_start)
+
+            if self._view is not None:
+                # The carried over bytes are body data. Hand them over on their
+                # own, so that the rest of the chunk can be passed on as a view.
+                data = self._slice(buffer_start, 0)
+                self._carry.clear()
+                buffer_start = 0
+                self._buffer_start = 0
+                if self._queue(data, False):
+                    return ACT_CONTINUE
+
+        match_start, kind = self._find(chunk, idx, chunk_len)
+
+        if self._stats:
+            self._searches += 1
+            if kind == MK_DELIMITER or kind == MK_ENDER:
+                self._bytes_searched += match_start + self.delimiter_length - idx
+            else:
+                self._bytes_searched += chunk_len - idx
+
+        if kind == MK_DELIMITER or kind == MK_ENDER:
+            return self._end_part(kind, buffer_start, match_start)
+
+        return self._end_body(buffer_start, match_start)
+
+    # A boundary starting at match_start has been found
+    def _end_part(self, kind, buffer_start, match_start):
+        if kind == MK_DELIMITER:
+            # the delimiter includes the CRLF ending its line
+            self.state = PS_ENDED_HEADER
+        else:
+            self.state = PS_END
+
+        self._index = match_start + self.delimiter_length
+        self._buffer_start = match_start + self.delimiter_length
+
+        if self._indexing:
+            self._body_end = self._stream_offset + match_start
+            self._carry.clear()
+            return ACT_PART_END
+
+        if match_start > buffer_start:
+            data = self._body(buffer_start, match_start)
+        else:
+            data = b""
+
+        self._carry.clear()
+
+        if self._queue(data, True):
+            self._pending_finish = True
+            return ACT_CONTINUE
+
+        return ACT_PART_END
+
+    # The chunk ends without a boundary. Everything before match_start (the
+    # start of a potential boundary, if any) is resolved body data; the rest has
+    # to be carried over to the next chunk.
+    def _end_body(self, buffer_start, match_start):
+        chunk_len = len(self._chunk)
+
+        self._index = chunk_len
+        self._buffer_start = chunk_len
+
+        if match_start > buffer_start and not self._indexing:
+            data = self._body(buffer_start, match_start)
+            self._keep(match_start)
+            if self._queue(data, False):
+                return ACT_CONTINUE
+            return ACT_DONE
+
+        self._keep(match_start)
+        return ACT_DONE
+
+    # Search buffer[start:end] for the first boundary and return its position
+    # along with MK_DELIMITER or MK_ENDER. If there is no complete boundary, but
+    # the buffer ends with the beginning of one, its position is returned along
+    # with MK_PARTIAL. Otherwise the result is (end, MK_NONE).
+    def _find(self, buffer, start, end):
+        prefix = self._prefix
+        length = len(prefix)
+
+        pos = buffer.find(prefix, start, end)
+
+        while pos >= 0:
+            after = pos + length
+
+            if after + 2 <= end:
+                if buffer[after] == _cr and buffer[after + 1] == _lf:
+                    return pos, MK_DELIMITER
+                if buffer[after] == _hyphen and buffer[after + 1] == _hyphen:
+                    return pos, MK_ENDER
+            elif after == end or buffer[after] == _cr or buffer[after] == _hyphen:
+                return pos, MK_PARTIAL
+
+            self._false_matches += 1
+            pos = buffer.find(prefix, pos + 1, end)
+
+        # the prefix does not fit in anymore, but the buffer may still end with
+        # the beginning of it
+        pos = buffer.find(b"\r", max(start, end - length + 1), end)
+
+        while pos >= 0:
+            if prefix.startswith(buffer[pos:end]):
+                return pos, MK_PARTIAL
+            pos = buffer.find(b"\r", pos + 1, end)
+
+        return end, MK_NONE
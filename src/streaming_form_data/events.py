@@ -0,0 +1,27 @@
+from typing import NamedTuple, Optional, Union
+
+
+class PartStart(NamedTuple):
+    """A new part begins. filename and content_type are None if not given."""
+
+    name: str
+    filename: Optional[str]
+    content_type: Optional[str]
+
+
+class Data(NamedTuple):
+    """
+    A chunk of the body of the current part. In zero copy mode, data is a memoryview
+    into the input, which is only valid until the next event is requested.
+    """
+
+    data: Union[bytes, memoryview]
+
+
+class PartEnd(NamedTuple):
+    """The body of the part with the given name is complete."""
+
+    name: str
+
+
+Event = Union[PartStart, Data, PartEnd]
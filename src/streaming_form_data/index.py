@@ -0,0 +1,101 @@
+from array import array
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Union, overload
+
+
+class IndexedPart(NamedTuple):
+    """
+    A part of a form, along with the offsets of its body in the request body: the
+    body is found in [start, end).
+    """
+
+    name: str
+    filename: Optional[str]
+    content_type: Optional[str]
+    start: int
+    end: int
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+class FormIndex(Sequence[IndexedPart]):
+    """
+    The parts of a form in the order they appear in the request body. The offsets
+    are kept in arrays, and the parts are only created when accessed.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.filenames: List[Optional[str]] = []
+        self.content_types: List[Optional[str]] = []
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def append(
+        self,
+        name: str,
+        filename: Optional[str],
+        content_type: Optional[str],
+        start: int,
+        end: int,
+    ):
+        self.names.append(name)
+        self.filenames.append(filename)
+        self.content_types.append(content_type)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @overload
+    def __getitem__(self, position: int) -> IndexedPart: ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[IndexedPart]: ...
+
+    def __getitem__(
+        self, position: Union[int, slice]
+    ) -> Union[IndexedPart, List[IndexedPart]]:
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(len(self)))]
+
+        return IndexedPart(
+            self.names[position],
+            self.filenames[position],
+            self.content_types[position],
+            self.starts[position],
+            self.ends[position],
+        )
+
+    def __iter__(self) -> Iterator[IndexedPart]:
+        return map(
+            IndexedPart,
+            self.names,
+            self.filenames,
+            self.content_types,
+            self.starts,
+            self.ends,
+        )
+
+    def find(self, name: str) -> Optional[IndexedPart]:
+        """Return the first part with the given name, or None."""
+        try:
+            return self[self.names.index(name)]
+        except ValueError:
+            return None
+
+    def body(self, data, position: int) -> memoryview:
+        """
+        Return the body of the part at the given position as a view into data, the
+        indexed request body (bytes, an mmap, ...).
+        """
+        return memoryview(data)[self.starts[position] : self.ends[position]]
+
+
+class PartResult(NamedTuple):
+    """The outcome of passing an indexed part on to its targets."""
+
+    part: IndexedPart
+    error: Optional[BaseException]
@@ -0,0 +1,259 @@
+import math
+import threading
+import weakref
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# The label names and values of a series
+Labels = Tuple[Tuple[str, str], ...]
+
+# The series recorded by one thread, by metric name and labels
+Shard = Dict[Tuple[str, Labels], list]
+
+
+class Metric(NamedTuple):
+    name: str
+    type: str
+    help: str
+    # the upper bounds of the buckets of histograms
+    buckets: Tuple[float, ...] = ()
+
+
+SIZE_BUCKETS = tuple(float(1024 * 4**power) for power in range(11))
+SECONDS_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+PARSERS_IN_FLIGHT = Metric(
+    "streaming_form_data_parsers_in_flight",
+    "gauge",
+    "Parsers which received the beginning of a request, but not its end yet",
+)
+REQUESTS = Metric(
+    "streaming_form_data_requests_total",
+    "counter",
+    "Requests parsed up to the final boundary",
+)
+BYTES_RECEIVED = Metric(
+    "streaming_form_data_bytes_received_total",
+    "counter",
+    "Request body data passed to parsers",
+)
+ERRORS = Metric(
+    "streaming_form_data_errors_total",
+    "counter",
+    "Requests failed to parse, by error group",
+)
+PART_SIZE = Metric(
+    "streaming_form_data_part_size_bytes",
+    "histogram",
+    "Size of the parts handed over to targets, by target class",
+    SIZE_BUCKETS,
+)
+TARGET_SECONDS = Metric(
+    "streaming_form_data_target_seconds",
+    "histogram",
+    "Time spent in targets per part, by target class",
+    SECONDS_BUCKETS,
+)
+
+METRICS = (
+    PARSERS_IN_FLIGHT,
+    REQUESTS,
+    BYTES_RECEIVED,
+    ERRORS,
+    PART_SIZE,
+    TARGET_SECONDS,
+)
+
+
+class _ThreadSentinel:
+    # Kept in the thread local storage of a registry, so that it goes away along
+    # with the thread
+    __slots__ = ("__weakref__",)
+
+
+# Fold the shard of a thread which is gone into the total of the registry, if that
+# is still around. The registry is only referenced weakly, so that registries are
+# not kept alive by the threads which used them.
+def _retire(registry_ref: "weakref.ref[MetricsRegistry]", shard: Shard):
+    registry = registry_ref()
+    if registry is not None:
+        registry._retire(shard)
+
+
+def _merge(totals: Shard, shard: Shard):
+    for key, series in shard.items():
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(series)
+        else:
+            for index, value in enumerate(series):
+                total[index] += value
+
+
+class MetricsRegistry:
+    """
+    Aggregates what the parsers and targets using it do. Every thread records into a
+    shard of its own, so recording never waits for other threads. The shards are only
+    added up when rendering, and those of threads which are gone are folded into a
+    shared total.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Shard] = []
+        self._retired: Shard = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # targets pickled for process pools record into a registry of their own
+        return (MetricsRegistry, ())
+
+    def _shard(self) -> Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Shard = {}
+            sentinel = _ThreadSentinel()
+
+            with self._lock:
+                self._shards.append(shard)
+
+            weakref.finalize(sentinel, _retire, weakref.ref(self), shard)
+
+            self._local.shard = shard
+            self._local.sentinel = sentinel
+            return shard
+
+    # The thread of the given shard is gone
+    def _retire(self, shard: Shard):
+        with self._lock:
+            self._shards.remove(shard)
+            _merge(self._retired, shard)
+
+    def add(self, metric: Metric, value: float = 1, labels: Labels = ()):
+        """Add value to a counter or gauge."""
+        shard = self._shard()
+        key = (metric.name, labels)
+
+        series = shard.get(key)
+        if series is None:
+            shard[key] = [value]
+        else:
+            series[0] += value
+
+    def observe(self, metric: Metric, value: float, labels: Labels = ()):
+        """Record value in a histogram."""
+        shard = self._shard()
+        key = (metric.name, labels)
+
+        # counts per bucket (not cumulative), the last one for +Inf, then the sum
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [0] * (len(metric.buckets) + 2)
+
+        series[bisect_left(metric.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self) -> Shard:
+        """Add up the series of all threads."""
+        totals: Shard = {}
+
+        with self._lock:
+            _merge(totals, self._retired)
+            shards = list(self._shards)
+
+        for shard in shards:
+            _merge(totals, shard.copy())
+
+        return totals
+
+    def render(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        totals = self.collect()
+        lines = []
+
+        for metric in METRICS:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+
+            series = sorted(
+                (labels, values)
+                for (name, labels), values in totals.items()
+                if name == metric.name
+            )
+            if not series and metric.type != "histogram":
+                series = [((), [0])]
+
+            for labels, values in series:
+                if metric.type != "histogram":
+                    lines.append(f"{metric.name}{_labels(labels)} {_number(values[0])}")
+                    continue
+
+                count = 0
+                bounds = [*metric.buckets, math.inf]
+
+                for bound, bucket in zip(bounds, values):
+                    count += bucket
+                    bucket_labels = _labels(labels + (("le", _number(bound)),))
+                    lines.append(f"{metric.name}_bucket{bucket_labels} {count}")
+
+                lines.append(
+                    f"{metric.name}_sum{_labels(labels)} {_number(values[-1])}"
+                )
+                lines.append(f"{metric.name}_count{_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+
+    return repr(float(value))
+
+
+# The registry of the process, used unless parsers are given one of their own
+REGISTRY = MetricsRegistry()
+
+
+def render(registry: Optional[MetricsRegistry] = None) -> str:
+    """
+    Return the metrics collected in the given registry (the one of the process by
+    default) in the Prometheus text exposition format, e.g. for serving them from an
+    existing /metrics endpoint.
+    """
+    if registry is None:
+        registry = REGISTRY
+
+    return registry.render()
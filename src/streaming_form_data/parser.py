@@ -1,8 +1,74 @@
-from email.message import EmailMessage
-from typing import Callable, Mapping, Optional
+import asyncio
+import inspect
+import mmap
+import os
+import platform
+import re
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from operator import eq
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
-from streaming_form_data._parser import ErrorGroup, _Parser  # type: ignore
+from streaming_form_data.events import Data, Event, PartStart
+from streaming_form_data.index import FormIndex, PartResult
+from streaming_form_data.metrics import (
+    BYTES_RECEIVED,
+    ERRORS,
+    PARSERS_IN_FLIGHT,
+    REGISTRY,
+    REQUESTS,
+    MetricsRegistry,
+)
+from streaming_form_data.stats import ParserStats
 from streaming_form_data.targets import BaseTarget
+from streaming_form_data.tracing import ParseTrace, Tracer
+
+# The compiled extension is used where available, except on PyPy, where the pure
+# Python implementation is faster. Setting STREAMING_FORM_DATA_PURE_PYTHON forces
+# the latter.
+if platform.python_implementation() == "PyPy" or os.environ.get(
+    "STREAMING_FORM_DATA_PURE_PYTHON"
+):
+    from streaming_form_data._pyparser import ErrorGroup, Part, PartIndex, _Parser
+
+    BACKEND = "python"
+else:
+    try:
+        from streaming_form_data._parser import (  # type: ignore
+            ErrorGroup,
+            Part,
+            PartIndex,
+            _Parser,
+        )
+
+        BACKEND = "cython"
+    except ImportError:
+        from streaming_form_data._pyparser import (  # type: ignore
+            ErrorGroup,
+            Part,
+            PartIndex,
+            _Parser,
+        )
+
+        BACKEND = "python"
 
 
 class ParseFailedException(Exception):
@@ -15,40 +81,592 @@ class UnexpectedPartException(ParseFailedException):
         self.part_name = part_name
 
 
-def parse_content_boundary(headers: Mapping[str, str]) -> bytes:
-    content_type = None
+# RFC 7231, section 3.1.1.1: media-type = type "/" subtype *( OWS ";" OWS parameter )
+_TOKEN = r"[!#$%&'*+\-.^_`|~0-9A-Za-z]+"
+_QUOTED_STRING = r'"(?:[\t !#-\[\]-~\x80-\xff]|\\[\t !-~\x80-\xff])*"'
 
-    for key in headers.keys():
-        if key.lower() == "content-type":
-            content_type = headers.get(key)
-            break
+_MEDIA_TYPE = re.compile(rf"[ \t]*({_TOKEN})/({_TOKEN})[ \t]*")
+_PARAMETER = re.compile(rf";[ \t]*(?:({_TOKEN})=({_TOKEN}|{_QUOTED_STRING})[ \t]*)?")
+_QUOTED_PAIR = re.compile(r"\\(.)")
+
+# RFC 2046, section 5.1.1: boundary characters, where the last one must not be a
+# space
+_BOUNDARY = re.compile(r"[0-9A-Za-z'()+_,\-./:=? ]*[0-9A-Za-z'()+_,\-./:=?]")
 
-    if not content_type:
-        raise ParseFailedException("Missing Content-Type header")
 
-    message = EmailMessage()
-    message["content-type"] = content_type
+@lru_cache(maxsize=256)
+def _parse_boundary(content_type: str) -> bytes:
+    match = _MEDIA_TYPE.match(content_type)
+    if not match:
+        raise ParseFailedException("Invalid Content-Type header")
 
-    if message.get_content_type() != "multipart/form-data":
+    if match.group(1).lower() != "multipart" or match.group(2).lower() != "form-data":
         raise ParseFailedException("Content-Type is not multipart/form-data")
 
-    boundary = message.get_boundary()
+    boundary = None
+    position = match.end()
+
+    while position < len(content_type):
+        match = _PARAMETER.match(content_type, position)
+        if not match:
+            raise ParseFailedException("Invalid Content-Type header")
+
+        position = match.end()
+        name, value = match.groups()
+
+        if boundary is None and name and name.lower() == "boundary":
+            if value.startswith('"'):
+                value = _QUOTED_PAIR.sub(r"\1", value[1:-1])
+            boundary = value
+
     if not boundary:
         raise ParseFailedException("Boundary not found")
 
-    return boundary.encode("utf-8")
+    if not _BOUNDARY.fullmatch(boundary):
+        raise ParseFailedException("Invalid boundary")
+
+    return boundary.encode("ascii")
+
+
+def parse_content_boundary(headers: Mapping[str, str]) -> bytes:
+    content_type = headers.get("Content-Type") or headers.get("content-type")
+
+    if content_type is None:
+        for key in headers.keys():
+            if key.lower() == "content-type":
+                content_type = headers.get(key)
+                break
+
+    if not content_type:
+        raise ParseFailedException("Missing Content-Type header")
+
+    # clients tend to reuse the same boundaries, so parsed values are cached
+    return _parse_boundary(content_type)
+
+
+def _delimiter_and_ender(headers: Mapping[str, str]) -> Tuple[bytes, bytes]:
+    raw_boundary = parse_content_boundary(headers)
+
+    return (b"\r\n--" + raw_boundary + b"\r\n", b"\r\n--" + raw_boundary + b"--")
+
+
+class FormSchema:
+    """
+    A set of registrations, compiled once and shared by any number of parsers.
+
+    Instead of targets, target factories are registered, which are called to create
+    fresh targets whenever a parser is bound to the schema.
+    """
+
+    def __init__(self):
+        # (name, matches) of the distinct parts, in order of registration
+        self._entries: List[Tuple[str, Callable[[str, str], bool]]] = []
+
+        # (name, target factory, position of the part in _entries)
+        self._registrations: List[Tuple[str, Callable[[], BaseTarget], int]] = []
+
+        self._index: Optional[PartIndex] = None
+
+    def register(
+        self,
+        name: str,
+        target_factory: Callable[[], BaseTarget],
+        matches: Optional[Callable[[str, str], bool]] = None,
+    ):
+        position = self._position_for(name)
+
+        if position is None:
+            position = len(self._entries)
+            self._entries.append((name, matches or eq))
+
+        self._registrations.append((name, target_factory, position))
+        self._index = None
+
+    def _position_for(self, name: str) -> Optional[int]:
+        # same semantics as StreamingFormDataParser.register
+        for position, (entry_name, matches) in enumerate(self._entries):
+            if entry_name == name or matches(entry_name, name):
+                return position
+
+        return None
+
+    def _bind(self) -> Tuple[List, PartIndex, Dict[str, List[BaseTarget]]]:
+        if self._index is None:
+            self._index = PartIndex(self._entries)
+
+        parts: List = [None] * len(self._entries)
+        targets: Dict[str, List[BaseTarget]] = {}
+
+        for name, target_factory, position in self._registrations:
+            target = target_factory()
+            targets.setdefault(name, []).append(target)
+
+            if parts[position] is None:
+                entry_name, matches = self._entries[position]
+                parts[position] = Part(entry_name, target, matches)
+            else:
+                parts[position].add_target(target)
+
+        return parts, self._index, targets
+
+
+class FormPart:
+    """
+    A part of a form streamed using StreamingFormDataParser.aparts. Iterating over it
+    asynchronously yields the chunks of its body as they are received.
+    """
+
+    def __init__(self, reader: "_PartReader", event: PartStart):
+        self._reader = reader
+
+        self.name: str = event.name
+        self.filename: Optional[str] = event.filename
+        self.content_type: Optional[str] = event.content_type
+
+        self._finished = False
+
+    def __aiter__(self) -> "FormPart":
+        return self
+
+    async def __anext__(self) -> Union[bytes, memoryview]:
+        if self._finished:
+            raise StopAsyncIteration
+
+        data = await self._reader._next_data()
+
+        if data is None:
+            self._finished = True
+            raise StopAsyncIteration
+
+        return data
+
+    async def read(self) -> bytes:
+        """Read the (rest of the) body of the part into memory."""
+        return b"".join([bytes(chunk) async for chunk in self])
+
+
+class _PartReader:
+    # Turns the events for the chunks of an async stream into FormPart objects,
+    # reading from the stream only as fast as the part bodies are consumed.
+
+    def __init__(self, parser: "StreamingFormDataParser", stream: AsyncIterable):
+        self._parser = parser
+        self._stream = stream.__aiter__()
+        self._events: Iterator[Event] = iter(())
+        self._part: Optional[FormPart] = None
+
+    async def _next_event(self) -> Optional[Event]:
+        while True:
+            event = next(self._events, None)
+            if event is not None:
+                return event
+
+            if self._parser._observed:
+                await self._parser._acomplete()
+
+            try:
+                chunk = await self._stream.__anext__()
+            except StopAsyncIteration:
+                return None
+
+            self._events = self._parser._events(chunk)
+
+    async def _next_data(self) -> Optional[Union[bytes, memoryview]]:
+        event = await self._next_event()
+
+        if type(event) is Data:
+            return event.data
+
+        self._part = None
+
+        if event is None:
+            raise ParseFailedException("Input ended in the middle of a part")
+
+        return None
+
+    async def next_part(self) -> Optional[FormPart]:
+        # skip whatever has not been consumed of the current part's body
+        if self._part is not None:
+            async for _ in self._part:
+                pass
+
+        event = await self._next_event()
+
+        while event is not None and type(event) is not PartStart:
+            event = await self._next_event()
+
+        if event is None:
+            if not self._parser._parser.finished:
+                raise ParseFailedException("Input ended before the final boundary")
+            return None
+
+        self._part = FormPart(self, event)
+        return self._part
+
+
+# Smallest amount of body data handed over to targets at once by default, unless the
+# part ends before
+_MIN_EMIT_SIZE = 1024
+
+# Size of the slices memory mapped files are passed to the parser in, which bounds
+# the memory the pure Python parser needs for its copy of the input
+_FILE_SLICE_SIZE = 16 * 1024 * 1024
+
+
+@contextmanager
+def _map_file(path: Union[str, "os.PathLike[str]"]) -> Iterator[memoryview]:
+    with open(path, "rb") as file:
+        # empty files cannot be mapped
+        if not os.fstat(file.fileno()).st_size:
+            yield memoryview(b"")
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            advice = getattr(mmap, "MADV_SEQUENTIAL", None)
+            if advice is not None:
+                mapped.madvise(advice)
+
+            with memoryview(mapped) as view:
+                yield view
+
+
+# Slice a mapped file for passing it to the parser, releasing every slice when done
+def _file_slices(view: memoryview) -> Iterator[memoryview]:
+    for start in range(0, len(view), _FILE_SLICE_SIZE):
+        with view[start : start + _FILE_SLICE_SIZE] as chunk:
+            yield chunk
+
+
+# Size of the pieces the bodies of stored parts are handed over to targets in
+_PART_CHUNK_SIZE = 1024 * 1024
+
+
+# Pass the bodies of the given parts, which all go to the same registered part, on
+# to its targets one after the other, returning the error raised for each, if any.
+# The request body is either given as data, or mapped from the file at path when
+# running in another process.
+def _process_parts(
+    part: Part,
+    entries: List[Tuple[Optional[str], Optional[str], int, int]],
+    views: bool,
+    data: Any = None,
+    path: Optional[str] = None,
+) -> List[Optional[BaseException]]:
+    if path is not None:
+        with _map_file(path) as view:
+            return _process_parts(part, entries, views, view)
+
+    errors: List[Optional[BaseException]] = []
+
+    with memoryview(data) as view:
+        for filename, content_type, start, end in entries:
+            try:
+                part.set_multipart_filename(filename)
+                if content_type is not None:
+                    part.set_multipart_content_type(content_type)
+
+                part.start()
+
+                for position in range(start, end, _PART_CHUNK_SIZE):
+                    with view[
+                        position : min(position + _PART_CHUNK_SIZE, end)
+                    ] as chunk:
+                        part.data_received(chunk if views else bytes(chunk))
+
+                part.finish()
+            except Exception as error:
+                errors.append(error)
+            else:
+                errors.append(None)
+
+    return errors
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _FlowControl:
+    # Tracks the data held on to by the targets of a parser. Once it exceeds the
+    # high water mark, reading is paused until it has dropped to the low water mark
+    # again. Targets may drain their data in other threads.
+
+    def __init__(
+        self, high_water_mark: int, low_water_mark: int, on_resume: Optional[Callable]
+    ):
+        self.high_water_mark = high_water_mark
+        self.low_water_mark = low_water_mark
+        self.on_resume = on_resume
+
+        self.pending_bytes = 0
+        self.paused = False
+
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def buffered(self, size: int):
+        with self._lock:
+            self.pending_bytes += size
+            if self.pending_bytes > self.high_water_mark:
+                self.paused = True
+
+    def drained(self, size: int):
+        with self._lock:
+            self.pending_bytes -= size
+            if not self.paused or self.pending_bytes > self.low_water_mark:
+                return
+
+            self.paused = False
+            waiters, self._waiters = self._waiters, []
+
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+        if self.on_resume is not None:
+            self.on_resume()
+
+    async def wait(self):
+        with self._lock:
+            if not self.paused:
+                return
+
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+
+        await future
 
 
 class StreamingFormDataParser:
-    def __init__(self, headers: Mapping[str, str], strict: bool = False):
+    def __init__(
+        self,
+        headers: Mapping[str, str],
+        strict: bool = False,
+        zero_copy: bool = False,
+        min_emit_size: Optional[int] = None,
+        max_emit_size: Optional[int] = None,
+        schema: Optional[FormSchema] = None,
+        high_water_mark: Optional[int] = None,
+        low_water_mark: Optional[int] = None,
+        on_resume: Optional[Callable[[], None]] = None,
+        concurrent_targets: bool = False,
+        offload_threshold: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        scan_budget: Optional[int] = None,
+        scan_time_budget: Optional[float] = None,
+        stats: bool = False,
+        tracer: Optional[Tracer] = None,
+        metrics: Union[bool, MetricsRegistry] = False,
+    ):
         self.headers = headers
 
-        raw_boundary = parse_content_boundary(headers)
+        if offload_threshold is not None and offload_threshold < 0:
+            raise ValueError("offload_threshold must not be negative")
+
+        self._offload_threshold = offload_threshold
+        self._executor = executor
+
+        if scan_budget is not None and scan_budget <= 0:
+            raise ValueError("scan_budget must be positive")
+        if scan_time_budget is not None and scan_time_budget < 0:
+            raise ValueError("scan_time_budget must not be negative")
+
+        if high_water_mark is None:
+            if low_water_mark is not None or on_resume is not None:
+                raise ValueError("Flow control requires a high_water_mark")
+        elif low_water_mark is None:
+            low_water_mark = high_water_mark // 4
+        elif not 0 <= low_water_mark <= high_water_mark:
+            raise ValueError("low_water_mark must be between 0 and high_water_mark")
+
+        self._flow_control_options = (high_water_mark, low_water_mark, on_resume)
+        self._flow_control: Optional[_FlowControl] = None
+
+        # the budget is only checked between the pieces of body data
+        if scan_budget is not None and max_emit_size is None:
+            max_emit_size = scan_budget
+
+        if min_emit_size is None:
+            min_emit_size = _MIN_EMIT_SIZE
+            if max_emit_size is not None and max_emit_size > 0:
+                min_emit_size = min(min_emit_size, max_emit_size)
 
-        delimiter = b"\r\n--" + raw_boundary + b"\r\n"
-        ender = b"\r\n--" + raw_boundary + b"--"
+        delimiter, ender = _delimiter_and_ender(headers)
 
-        self._parser = _Parser(delimiter, ender, strict)
+        self._parser = _Parser(
+            delimiter,
+            ender,
+            strict,
+            zero_copy,
+            min_emit_size,
+            max_emit_size,
+            concurrent_targets,
+            stats,
+            tracer,
+            scan_budget,
+            scan_time_budget,
+        )
+
+        if metrics is True:
+            metrics = REGISTRY
+
+        self._tracer = tracer
+        self._metrics: Optional[MetricsRegistry] = metrics or None
+        self._observed = tracer is not None or self._metrics is not None
+
+        self._in_flight = False
+        self._reset_request()
+
+        self._zero_copy = zero_copy
+        self._schema = schema
+        self.targets: Dict[str, List[BaseTarget]] = {}
+
+        self._reset_flow_control()
+
+        if schema is not None:
+            self._bind(schema)
+
+        self._running = False
+
+    def _reset_flow_control(self):
+        high_water_mark, low_water_mark, on_resume = self._flow_control_options
+
+        if high_water_mark is not None:
+            self._flow_control = _FlowControl(
+                high_water_mark, low_water_mark, on_resume
+            )
+
+    # What the tracer and the metrics are told about the current request
+
+    def _reset_request(self):
+        self._request_started_at: Optional[float] = None
+        self._request_bytes = 0
+        self._request_done = False
+
+    def _observe_chunk(self, data: Union[bytes, memoryview]):
+        size = memoryview(data).nbytes
+
+        if self._request_started_at is None:
+            self._request_started_at = time.perf_counter()
+
+            if self._metrics is not None:
+                self._metrics.add(PARSERS_IN_FLIGHT)
+                self._in_flight = True
+
+        self._request_bytes += size
+
+        if self._metrics is not None:
+            self._metrics.add(BYTES_RECEIVED, size)
+
+    def _observe_chunks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self._observe_chunk(chunk)
+            yield chunk
+
+    def _end_request(self):
+        if self._in_flight:
+            cast(MetricsRegistry, self._metrics).add(PARSERS_IN_FLIGHT, -1)
+            self._in_flight = False
+
+    # Once the final boundary has been reached, update the metrics and call
+    # on_complete of the tracer, returning what it returned
+    def _request_complete(self) -> Any:
+        if self._request_done or not self._parser.finished:
+            return None
+
+        self._request_done = True
+
+        if self._metrics is not None:
+            self._end_request()
+            self._metrics.add(REQUESTS)
+
+        if self._tracer is None:
+            return None
+
+        trace = ParseTrace(
+            self._request_started_at or 0.0, time.perf_counter(), self._request_bytes
+        )
+
+        return self._tracer.on_complete(trace)
+
+    def _complete(self):
+        result = self._request_complete()
+
+        if inspect.isawaitable(result):
+            result.close()
+            raise TypeError("Async tracers require the async parser methods")
+
+    async def _acomplete(self):
+        result = self._request_complete()
+
+        if inspect.isawaitable(result):
+            await result
+
+    def __del__(self):
+        # dropped in the middle of a request
+        if getattr(self, "_in_flight", False):
+            self._end_request()
+
+    def _bind(self, schema: FormSchema):
+        parts, index, self.targets = schema._bind()
+        self._parser.set_parts(parts, index)
+
+        for targets in self.targets.values():
+            for target in targets:
+                self._attach(target)
+
+    def _attach(self, target: BaseTarget):
+        if self._flow_control is not None:
+            target._flow_control = self._flow_control
+        if self._metrics is not None:
+            target._metrics = self._metrics
+
+    @property
+    def stats(self) -> Optional[ParserStats]:
+        """
+        Statistics about parsing the current request so far, if enabled with
+        stats=True.
+        """
+        stats = self._parser.stats()
+        return ParserStats(**stats) if stats is not None else None
+
+    @property
+    def pending_bytes(self) -> int:
+        """The amount of data held on to by the targets (with flow control)."""
+        return self._flow_control.pending_bytes if self._flow_control else 0
+
+    @property
+    def paused(self) -> bool:
+        """
+        Whether reading should be paused, because the targets hold on to more data
+        than the high water mark.
+        """
+        return self._flow_control.paused if self._flow_control else False
+
+    async def drain(self):
+        """Wait until reading can be resumed, if paused."""
+        if self._flow_control is not None:
+            await self._flow_control.wait()
+
+    def reset(self, headers: Mapping[str, str]):
+        """
+        Prepare the parser for parsing another request. When created with a schema,
+        new targets are created from it. Otherwise, all registrations are dropped.
+        """
+
+        delimiter, ender = _delimiter_and_ender(headers)
+
+        self.headers = headers
+        self._parser.reset(delimiter, ender)
+
+        self.targets = {}
+        self._reset_flow_control()
+        self._end_request()
+        self._reset_request()
+
+        if self._schema is not None:
+            self._bind(self._schema)
 
         self._running = False
 
@@ -64,9 +682,24 @@ class StreamingFormDataParser:
             )
 
         self._parser.register(name, target, matches)
+        self.targets.setdefault(name, []).append(target)
+        self._attach(target)
+
+    def _count_error(self, result: int):
+        for group in ("UnexpectedPart", "PartHeaders", "Delimiting", "Internal"):
+            if result >= getattr(ErrorGroup, group):
+                break
+
+        cast(MetricsRegistry, self._metrics).add(ERRORS, labels=(("group", group),))
+
+        self._end_request()
+        self._request_done = True
 
     def _handle_result(self, result: int):
         if result > 0:
+            if self._metrics is not None:
+                self._count_error(result)
+
             if ErrorGroup.Internal <= result < ErrorGroup.Delimiting:
                 message = "internal errors"
             elif ErrorGroup.Delimiting <= result < ErrorGroup.PartHeaders:
@@ -83,16 +716,253 @@ class StreamingFormDataParser:
                 "_parser.data_received failed with {}".format(message)
             )
 
-    def data_received(self, data: bytes):
+    def data_received(self, data: Union[bytes, memoryview]):
         if not self._running:
             self._running = True
 
+        if self._observed:
+            self._observe_chunk(data)
+
         result = self._parser.data_received(data)
         self._handle_result(result)
 
-    async def adata_received(self, data: bytes):
+        if self._observed:
+            self._complete()
+
+    def _offload(self, data: Union[bytes, memoryview]) -> bool:
+        return (
+            self._offload_threshold is not None
+            and memoryview(data).nbytes >= self._offload_threshold
+        )
+
+    async def adata_received(self, data: Union[bytes, memoryview]):
+        if not self._running:
+            self._running = True
+
+        if self._observed:
+            self._observe_chunk(data)
+
+        if self._offload(data):
+            result = await self._parser.adata_received_offloaded(data, self._executor)
+        else:
+            result = await self._parser.adata_received(data)
+
+        self._handle_result(result)
+
+        if self._observed:
+            await self._acomplete()
+
+    def data_received_many(self, chunks: Iterable[bytes]):
+        if not self._running:
+            self._running = True
+
+        if self._observed:
+            chunks = self._observe_chunks(chunks)
+
+        result = self._parser.data_received_many(chunks)
+        self._handle_result(result)
+
+        if self._observed:
+            self._complete()
+
+    async def adata_received_many(self, chunks: Iterable[bytes]):
+        if self._offload_threshold is not None:
+            for chunk in chunks:
+                await self.adata_received(chunk)
+            return
+
+        if not self._running:
+            self._running = True
+
+        if self._observed:
+            chunks = self._observe_chunks(chunks)
+
+        result = await self._parser.adata_received_many(chunks)
+        self._handle_result(result)
+
+        if self._observed:
+            await self._acomplete()
+
+    def parse_file(self, path: Union[str, "os.PathLike[str]"]):
+        """
+        Parse a multipart body stored in the file at the given path, e.g. written by
+        a reverse proxy, like data_received. The file is memory mapped and scanned in
+        place. In zero copy mode, the targets accepting memoryviews receive slices of
+        the mapping, which are only valid during the call. Raises ParseFailedException
+        if the file ends before the final boundary.
+        """
+
+        with _map_file(path) as view:
+            for chunk in _file_slices(view):
+                self.data_received(chunk)
+
+        self._ensure_finished()
+
+    async def aparse_file(self, path: Union[str, "os.PathLike[str]"]):
+        """
+        Like parse_file, but calling the targets like adata_received. Reading the file
+        happens through page faults while scanning, so combine this with
+        offload_threshold to keep the event loop running for files not in the page
+        cache.
+        """
+
+        with _map_file(path) as view:
+            for chunk in _file_slices(view):
+                await self.adata_received(chunk)
+
+        self._ensure_finished()
+
+    def index(self, data: Union[bytes, memoryview]) -> FormIndex:
+        """
+        Scan the given complete request body and return where the parts are found in
+        there, without passing their bodies on to any targets. Part lookups only
+        happen in strict mode, which still rejects unexpected parts.
+        """
+
+        return self._index([data])
+
+    def index_file(self, path: Union[str, "os.PathLike[str]"]) -> FormIndex:
+        """Like index, for a request body stored in the file at the given path."""
+
+        with _map_file(path) as view:
+            return self._index(_file_slices(view))
+
+    def _index(self, chunks: Iterable[Union[bytes, memoryview]]) -> FormIndex:
+        if not self._running:
+            self._running = True
+
+        form_index = FormIndex()
+
+        for chunk in chunks:
+            result = self._parser.index(chunk, form_index)
+            self._handle_result(result)
+
+        self._ensure_finished()
+
+        return form_index
+
+    # For methods taking a complete request body
+    def _ensure_finished(self):
+        if not self._parser.finished:
+            raise ParseFailedException("Input ended before the final boundary")
+
+    def process(
+        self, data: Union[bytes, memoryview], executor: Optional[Executor] = None
+    ) -> List[PartResult]:
+        """
+        Pass the parts of the given complete request body on to the registered
+        targets, processing parts which go to different registrations in parallel on
+        the given executor (a new thread pool if not given). Errors raised by the
+        targets don't stop the other parts from being processed, but are reported
+        along with the parts. Returns the results of the parts which have been passed
+        on to any targets, in order.
+        """
+
+        if isinstance(executor, ProcessPoolExecutor):
+            raise ValueError(
+                "Process pools require the request body to be stored in a file"
+            )
+
+        return self._process(self.index(data), executor, data=data)
+
+    def process_file(
+        self, path: Union[str, "os.PathLike[str]"], executor: Optional[Executor] = None
+    ) -> List[PartResult]:
+        """
+        Like process, for a request body stored in the file at the given path. With a
+        process pool, the targets are pickled and map the file on their own in the
+        worker processes, so only their side effects (like written files) remain.
+        """
+
+        return self._process(self.index_file(path), executor, path=os.fspath(path))
+
+    def _process(
+        self,
+        form_index: FormIndex,
+        executor: Optional[Executor],
+        data: Any = None,
+        path: Optional[str] = None,
+    ) -> List[PartResult]:
+        if executor is None:
+            with ThreadPoolExecutor() as pool:
+                return self._process(form_index, pool, data, path)
+
+        # parts going to the same registration share its targets, so they have to
+        # be processed one after the other
+        groups: Dict[int, Tuple[Part, List[int]]] = {}
+
+        for position, name in enumerate(form_index.names):
+            part = self._parser.lookup(name)
+            if part is not None:
+                groups.setdefault(id(part), (part, []))[1].append(position)
+
+        futures = [
+            (
+                positions,
+                executor.submit(
+                    _process_parts,
+                    part,
+                    [
+                        (
+                            form_index.filenames[position],
+                            form_index.content_types[position],
+                            form_index.starts[position],
+                            form_index.ends[position],
+                        )
+                        for position in positions
+                    ],
+                    self._zero_copy and part.accepts_memoryview,
+                    data,
+                    path,
+                ),
+            )
+            for part, positions in groups.values()
+        ]
+
+        results: Dict[int, PartResult] = {}
+
+        for positions, future in futures:
+            for position, error in zip(positions, future.result()):
+                results[position] = PartResult(form_index[position], error)
+
+        return [results[position] for position in sorted(results)]
+
+    def events(self, data: bytes) -> Generator[Event, None, None]:
+        """
+        Parse the given chunk like data_received, but instead of passing the parts on
+        to the registered targets, yield PartStart, Data and PartEnd events for them.
+        The generator has to be exhausted before passing in the next chunk.
+        """
+
+        yield from self._events(data)
+
+        if self._observed:
+            self._complete()
+
+    # events, leaving it to the caller to complete the request
+    def _events(self, data: bytes) -> Generator[Event, None, None]:
         if not self._running:
             self._running = True
 
-        result = await self._parser.adata_received(data)
-        self._handle_result(result)
\ No newline at end of file
+        if self._observed:
+            self._observe_chunk(data)
+
+        result = yield from self._parser.events(data)
+        self._handle_result(result)
+
+    async def aparts(self, stream: AsyncIterable[bytes]) -> AsyncIterator[FormPart]:
+        """
+        Parse the chunks of the given async stream and yield the parts of the form
+        as FormPart objects, which in turn yield their body chunks. Chunks are only
+        read from the stream when needed, and the part bodies not consumed before
+        moving on to the next part are skipped. Registered targets are not called.
+        """
+
+        reader = _PartReader(self, stream)
+
+        while True:
+            part = await reader.next_part()
+            if part is None:
+                break
+
+            yield part
@@ -0,0 +1,47 @@
+from typing import Any, Dict, NamedTuple
+
+
+class ParserStats(NamedTuple):
+    """
+    Statistics about what a parser did since it was created or last reset.
+
+    Attributes:
+        chunks, bytes_received:
+            the number of chunks and bytes passed to the parser
+        searches, bytes_searched:
+            how often part bodies were searched for the boundary, and the amount of
+            body data searched
+        false_matches:
+            how often the beginning of the boundary was found in body data, but turned
+            out not to be the boundary
+        emits, emitted_bytes:
+            how often and how much body data was handed over to targets
+        emit_sizes:
+            a histogram of the sizes of the emits, mapping powers of two to the
+            number of emits of at least that many, but less than twice as many bytes
+        headers_parsed, header_cache_hits, header_time:
+            the number of part header blocks parsed, how many of them were taken
+            from the cache of recently seen ones, and the time spent on that in
+            seconds
+        carries, carried_bytes:
+            how often bytes were carried over to the next chunk (unfinished header
+            lines, or body data which might be the start of a boundary), and how many
+        target_time:
+            the time spent in each registered target in seconds, keyed by the
+            target, including the time the async ones were suspended
+    """
+
+    chunks: int
+    bytes_received: int
+    searches: int
+    bytes_searched: int
+    false_matches: int
+    emits: int
+    emitted_bytes: int
+    emit_sizes: Dict[int, int]
+    headers_parsed: int
+    header_cache_hits: int
+    header_time: float
+    carries: int
+    carried_bytes: int
+    target_time: Dict[Any, float]
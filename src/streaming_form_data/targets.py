@@ -1,11 +1,34 @@
 import hashlib
 import asyncio
+import queue
+import threading
 from pathlib import Path
-from typing import Callable, List, Optional, Union
+from time import perf_counter
+from typing import Any, Callable, List, Optional, Union
 
 import smart_open  # type: ignore
 import aiofiles  # type: ignore
 
+from streaming_form_data.metrics import PART_SIZE, TARGET_SECONDS
+
+
+# Methods which determine how a target handles its input, see
+# BaseTarget.is_nonblocking
+_HANDLER_METHODS = (
+    "start",
+    "on_start",
+    "data_received",
+    "on_data_received",
+    "finish",
+    "on_finish",
+    "astart",
+    "on_start_async",
+    "adata_received",
+    "on_data_received_async",
+    "afinish",
+    "on_finish_async",
+)
+
 
 class BaseTarget:
     """
@@ -20,8 +43,49 @@ class BaseTarget:
             sanitized.
         multipart_content_type:
             MIME Content-Type of the file, extracted from the `Content-Type` HTTP header
+        accepts_memoryview:
+            whether the target can be handed `memoryview` chunks instead of `bytes` by
+            a parser running in zero copy mode. Such a view points into the input
+            passed to the parser and is only valid for the duration of the
+            `data_received` / `adata_received` call, so targets setting this must not
+            keep any reference to the chunk (nor anything derived from it without
+            copying) around.
+        is_nonblocking:
+            whether the async methods of the target never suspend and do exactly what
+            the sync ones do. The async parser then calls the sync methods directly,
+            avoiding the overhead of creating and awaiting coroutines. Subclasses
+            overriding any of the `start`, `data_received` or `finish` methods (or
+            their `on_*` / async counterparts) are considered blocking again unless
+            they set this attribute themselves.
+
+    Targets which write the data out in the background (instead of before returning
+    from `data_received`) should report the amount of data they hold on to by calling
+    `buffered` and `drained`, which parsers use for flow control.
+
+    With a parser collecting metrics, the size of every part and the time spent on it
+    in the methods above are recorded by target class.
     """
 
+    accepts_memoryview = False
+    is_nonblocking = False
+
+    # set by parsers using flow control
+    _flow_control: Any = None
+
+    # set by parsers collecting metrics, along with the size of the current part and
+    # the time spent on it so far
+    _metrics: Any = None
+    _metrics_size = 0
+    _metrics_time = 0.0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if "is_nonblocking" not in cls.__dict__ and any(
+            name in cls.__dict__ for name in _HANDLER_METHODS
+        ):
+            cls.is_nonblocking = False
+
     def __init__(self, validator: Optional[Callable] = None):
         self.multipart_filename: Optional[str] = None
         self.multipart_content_type: Optional[str] = None
@@ -36,52 +100,119 @@ class BaseTarget:
 
     def start(self):
         self._started = True
+
+        if self._metrics is None:
+            self.on_start()
+            return
+
+        started = perf_counter()
         self.on_start()
+        self._metrics_size = 0
+        self._metrics_time = perf_counter() - started
 
     def on_start(self):
         pass
 
     def data_received(self, chunk: bytes):
+        if self._metrics is None:
+            self._validate(chunk)
+            self.on_data_received(chunk)
+            return
+
+        started = perf_counter()
         self._validate(chunk)
         self.on_data_received(chunk)
+        self._metrics_size += len(chunk)
+        self._metrics_time += perf_counter() - started
 
     def on_data_received(self, chunk: bytes):
         raise NotImplementedError()
 
     def finish(self):
+        if self._metrics is None:
+            self.on_finish()
+            self._finished = True
+            return
+
+        started = perf_counter()
         self.on_finish()
         self._finished = True
+        self._metrics_time += perf_counter() - started
+        self._record_metrics()
 
     def on_finish(self):
         pass
 
     async def astart(self):
         self._started = True
+
+        if self._metrics is None:
+            await self.on_start_async()
+            return
+
+        started = perf_counter()
         await self.on_start_async()
+        self._metrics_size = 0
+        self._metrics_time = perf_counter() - started
 
     async def on_start_async(self):
         pass
 
     async def adata_received(self, chunk: bytes):
+        if self._metrics is None:
+            self._validate(chunk)
+            await self.on_data_received_async(chunk)
+            return
+
+        started = perf_counter()
         self._validate(chunk)
         await self.on_data_received_async(chunk)
+        self._metrics_size += len(chunk)
+        self._metrics_time += perf_counter() - started
 
     async def on_data_received_async(self, chunk: bytes):
         raise NotImplementedError()
 
     async def afinish(self):
+        if self._metrics is None:
+            await self.on_finish_async()
+            self._finished = True
+            return
+
+        started = perf_counter()
         await self.on_finish_async()
         self._finished = True
+        self._metrics_time += perf_counter() - started
+        self._record_metrics()
 
     async def on_finish_async(self):
         pass
 
+    def _record_metrics(self):
+        labels = (("target", type(self).__name__),)
+
+        self._metrics.observe(PART_SIZE, self._metrics_size, labels)
+        self._metrics.observe(TARGET_SECONDS, self._metrics_time, labels)
+
     def set_multipart_filename(self, filename: str):
         self.multipart_filename = filename
 
     def set_multipart_content_type(self, content_type: str):
         self.multipart_content_type = content_type
 
+    def buffered(self, size: int):
+        """Report that size bytes have been received, but are not written out yet."""
+        if self._flow_control is not None:
+            self._flow_control.buffered(size)
+
+    def drained(self, size: int):
+        """
+        Report that size bytes reported by buffered have been written out. This may be
+        called from any thread.
+        """
+        if self._flow_control is not None:
+            self._flow_control.drained(size)
+
 
 class MultipleTargets(BaseTarget):
     """
@@ -105,11 +236,13 @@ class MultipleTargets(BaseTarget):
 
     def _prepare_target(self):
         target = self._next_target()
+        target._flow_control = self._flow_control
+        target._metrics = self._metrics
         if self._next_multipart_filename is not None:
             target.set_multipart_filename(self._next_multipart_filename)
             self._next_multipart_filename = None
         if self._next_multipart_content_type is not None:
-            target.set_multipart_filename(self._next_multipart_content_type)
+            target.set_multipart_content_type(self._next_multipart_content_type)
             self._next_multipart_content_type = None
 
         self.targets.append(target)
@@ -151,6 +284,9 @@ class NullTarget(BaseTarget):
     external users.
     """
 
+    accepts_memoryview = True
+    is_nonblocking = True
+
     def on_data_received(self, chunk: bytes):
         pass
 
@@ -166,6 +302,8 @@ class ValueTarget(BaseTarget):
     string.
     """
 
+    is_nonblocking = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -192,6 +330,8 @@ class ListTarget(BaseTarget):
     same argument.
     """
 
+    is_nonblocking = True
+
     def __init__(self, _type=bytes, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -238,6 +378,8 @@ class FileTarget(BaseTarget):
     FileTarget writes (streams) the input to an on-disk file.
     """
 
+    accepts_memoryview = True
+
     def __init__(
         self,
         filename: Union[str, Callable],
@@ -289,6 +431,8 @@ class DirectoryTarget(BaseTarget):
     DirectoryTarget writes (streams) the different inputs to an on-disk directory.
     """
 
+    accepts_memoryview = True
+
     def __init__(
         self,
         directory_path: Union[str, Callable],
@@ -360,6 +504,9 @@ class SHA256Target(BaseTarget):
     SHA256Target calculates the SHA256 hash of the given input.
     """
 
+    accepts_memoryview = True
+    is_nonblocking = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -381,11 +528,14 @@ class SmartOpenTarget(BaseTarget):
     SmartOpenTarget is an adapter for targets using the smart_open library.
     """
 
+    accepts_memoryview = True
+
     def __init__(
         self,
         file_path: Union[str, Callable],
         mode: str,
         transport_params=None,
+        background: bool = False,
         **kwargs,
     ):
         """
@@ -395,6 +545,10 @@ class SmartOpenTarget(BaseTarget):
                 accepts no arguments and returns a string.
             mode:
                 The mode in which the file should be opened
+            background:
+                Whether to write the data in a thread of its own instead of before
+                returning from `data_received`. The data not written yet is reported
+                to parsers using flow control.
         """
 
         super().__init__(**kwargs)
@@ -402,43 +556,93 @@ class SmartOpenTarget(BaseTarget):
         self._file_path = file_path() if callable(file_path) else file_path
         self._mode = mode
         self._transport_params = transport_params
-        self._fd = None
+        self._fd: Any = None
 
-    def on_start(self):
+        self._background = background
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        self._error: Optional[Exception] = None
+
+    def _open(self):
         self._fd = smart_open.open(
             self._file_path,
             self._mode,
             transport_params=self._transport_params,
         )
 
+        if self._background:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._write_queued, daemon=True)
+            self._writer.start()
+
+    def _write(self, chunk: bytes):
+        if self._error is not None:
+            raise self._error
+
+        if self._queue is None:
+            self._fd.write(chunk)
+            return
+
+        # views are only valid until returning
+        chunk = bytes(chunk)
+        self.buffered(len(chunk))
+        self._queue.put(chunk)
+
+    # The background writer, which keeps draining the queue after an error so that
+    # reading is not paused forever
+    def _write_queued(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+
+            try:
+                if self._error is None:
+                    self._fd.write(chunk)
+            except Exception as error:
+                self._error = error
+            finally:
+                self.drained(len(chunk))
+
+    def _close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._queue = self._writer = None
+
+        self._fd.close()
+
+        if self._error is not None:
+            raise self._error
+
+    def on_start(self):
+        self._open()
+
     def on_data_received(self, chunk: bytes):
         if self._fd:
-            self._fd.write(chunk)
+            self._write(chunk)
 
     def on_finish(self):
         if self._fd:
-            self._fd.close()
+            self._close()
 
     async def on_start_async(self):
         loop = asyncio.get_running_loop()
-        self._fd = await loop.run_in_executor(
-            None,
-            lambda: smart_open.open(
-                self._file_path,
-                self._mode,
-                transport_params=self._transport_params,
-            ),
-        )
+        await loop.run_in_executor(None, self._open)
 
     async def on_data_received_async(self, chunk: bytes):
         if self._fd:
+            if self._background:
+                self._write(chunk)
+                return
+
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, self._fd.write, chunk)
+            await loop.run_in_executor(None, self._write, chunk)
 
     async def on_finish_async(self):
         if self._fd:
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, self._fd.close)
+            await loop.run_in_executor(None, self._close)
 
 
 class S3Target(SmartOpenTarget):
@@ -463,6 +667,8 @@ class CSVTarget(BaseTarget):
     the need to wait for the whole file and/or save the file locally.
     """
 
+    is_nonblocking = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
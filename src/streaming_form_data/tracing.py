@@ -0,0 +1,92 @@
+from typing import Any, List, Optional
+
+
+class PartTrace:
+    """
+    The timeline of a part handed over to registered targets. Timestamps are taken
+    from time.perf_counter.
+
+    Attributes:
+        name, filename, content_type:
+            from the headers of the part
+        targets:
+            the targets the part is handed over to
+        headers_parsed_at:
+            when the headers of the part were parsed
+        first_byte_at:
+            when the first body data was handed over to the targets, None for
+            parts without body data (or before that)
+        ended_at:
+            when the targets were done with the part
+        bytes_received:
+            the amount of body data handed over to the targets so far
+        target_time:
+            the time spent in the targets, including the time the async ones were
+            suspended. The rest of the time between headers_parsed_at and ended_at
+            went into parsing or waiting for input.
+    """
+
+    __slots__ = (
+        "name",
+        "filename",
+        "content_type",
+        "targets",
+        "headers_parsed_at",
+        "first_byte_at",
+        "ended_at",
+        "bytes_received",
+        "target_time",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        filename: Optional[str],
+        content_type: Optional[str],
+        targets: List[Any],
+        headers_parsed_at: float,
+    ):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.targets = targets
+        self.headers_parsed_at = headers_parsed_at
+        self.first_byte_at: Optional[float] = None
+        self.ended_at: Optional[float] = None
+        self.bytes_received = 0
+        self.target_time = 0.0
+
+
+class ParseTrace:
+    """
+    The timeline of a request, from the first chunk passed to the parser until the
+    final boundary. Timestamps are taken from time.perf_counter.
+    """
+
+    __slots__ = ("started_at", "completed_at", "bytes_received")
+
+    def __init__(self, started_at: float, completed_at: float, bytes_received: int):
+        self.started_at = started_at
+        self.completed_at = completed_at
+        self.bytes_received = bytes_received
+
+
+class Tracer:
+    """
+    Receives the lifecycle of the parts of a request and of the request itself,
+    e.g. for exporting them as spans to a tracing system. Subclasses override the
+    methods they are interested in. These may also be coroutine functions, which
+    are then awaited, but only work with the async parser methods.
+    """
+
+    def on_part_start(self, trace: PartTrace):
+        """The headers of a part have been parsed, and the targets are started."""
+
+    def on_first_byte(self, trace: PartTrace):
+        """The first body data of a part is about to be handed over."""
+
+    def on_part_end(self, trace: PartTrace):
+        """The targets are done with a part."""
+
+    def on_complete(self, trace: ParseTrace):
+        """The final boundary has been reached."""
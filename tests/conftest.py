@@ -0,0 +1,19 @@
+import importlib
+
+import pytest
+
+from streaming_form_data import parser
+
+
+@pytest.fixture(params=["cython", "python"])
+def backend(request, monkeypatch):
+    """Run a test against both the compiled and the pure Python parser."""
+    if request.param == "cython":
+        module = pytest.importorskip("streaming_form_data._parser")
+    else:
+        module = importlib.import_module("streaming_form_data._pyparser")
+
+    for name in ("ErrorGroup", "Part", "PartIndex", "_Parser"):
+        monkeypatch.setattr(parser, name, getattr(module, name))
+
+    return request.param
@@ -6,6 +6,8 @@ from streaming_form_data import StreamingFormDataParser
 from streaming_form_data.targets import ValueTarget
 from streaming_form_data.parser import UnexpectedPartException
 
+pytestmark = pytest.mark.usefixtures("backend")
+
 
 class CustomTarget(ValueTarget):
     def data_received(self, chunk):
@@ -0,0 +1,308 @@
+import gc
+import pickle
+import threading
+import weakref
+
+import pytest
+from requests_toolbelt import MultipartEncoder
+
+from streaming_form_data import ParseFailedException, StreamingFormDataParser
+from streaming_form_data.metrics import (
+    PART_SIZE,
+    REGISTRY,
+    REQUESTS,
+    MetricsRegistry,
+    render,
+)
+from streaming_form_data.targets import MultipleTargets, NullTarget, ValueTarget
+
+
+def samples(registry):
+    return dict(
+        line.rsplit(" ", 1)
+        for line in registry.render().splitlines()
+        if not line.startswith("#")
+    )
+
+
+def test_render_empty():
+    text = MetricsRegistry().render()
+
+    assert "# TYPE streaming_form_data_parsers_in_flight gauge\n" in text
+    assert "# TYPE streaming_form_data_requests_total counter\n" in text
+    assert "# TYPE streaming_form_data_part_size_bytes histogram\n" in text
+    assert "streaming_form_data_parsers_in_flight 0\n" in text
+    assert "streaming_form_data_part_size_bytes_count" not in text
+
+
+def test_histogram():
+    registry = MetricsRegistry()
+    labels = (("target", 'a "b"\n'),)
+
+    registry.observe(PART_SIZE, 1024, labels)
+    registry.observe(PART_SIZE, 1025, labels)
+    registry.observe(PART_SIZE, 2**40, labels)
+
+    values = samples(registry)
+    prefix = 'streaming_form_data_part_size_bytes_bucket{target="a \\"b\\"\\n",le='
+
+    assert values[prefix + '"1024"}'] == "1"
+    assert values[prefix + '"4096"}'] == "2"
+    assert values[prefix + '"1073741824"}'] == "2"
+    assert values[prefix + '"+Inf"}'] == "3"
+    assert values[
+        'streaming_form_data_part_size_bytes_sum{target="a \\"b\\"\\n"}'
+    ] == str(1024 + 1025 + 2**40)
+    assert (
+        values['streaming_form_data_part_size_bytes_count{target="a \\"b\\"\\n"}']
+        == "3"
+    )
+
+
+def test_threads():
+    registry = MetricsRegistry()
+
+    def count():
+        for _ in range(1000):
+            registry.add(REQUESTS)
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert samples(registry)["streaming_form_data_requests_total"] == "8000"
+
+
+def test_threads_gone():
+    registry = MetricsRegistry()
+
+    for _ in range(50):
+        thread = threading.Thread(target=registry.add, args=(REQUESTS,))
+        thread.start()
+        thread.join()
+
+    gc.collect()
+
+    # the shards of the threads are folded into the total
+    assert registry._shards == []
+    assert samples(registry)["streaming_form_data_requests_total"] == "50"
+
+
+def test_threads_registry_not_kept_alive():
+    registry = MetricsRegistry()
+    registry.add(REQUESTS)
+    registry_ref = weakref.ref(registry)
+
+    del registry
+    gc.collect()
+
+    # even though the shard of this thread is still around
+    assert registry_ref() is None
+
+
+def test_pickle():
+    registry = MetricsRegistry()
+    registry.add(REQUESTS)
+
+    assert (
+        samples(pickle.loads(pickle.dumps(registry)))[
+            "streaming_form_data_requests_total"
+        ]
+        == "0"
+    )
+
+
+def test_render_process_registry():
+    assert render() == REGISTRY.render()
+
+
+@pytest.mark.usefixtures("backend")
+def test_parser():
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "file": ("file.txt", b"x" * 5000, "text/plain"),
+            "ignored": "value",
+        }
+    )
+    body = encoder.to_string()
+
+    registry = MetricsRegistry()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, metrics=registry
+    )
+    parser.register("name", ValueTarget())
+    parser.register("file", NullTarget())
+
+    parser.data_received(body[:100])
+
+    values = samples(registry)
+    assert values["streaming_form_data_parsers_in_flight"] == "1"
+    assert values["streaming_form_data_bytes_received_total"] == "100"
+
+    parser.data_received(body[100:])
+
+    values = samples(registry)
+    assert values["streaming_form_data_parsers_in_flight"] == "0"
+    assert values["streaming_form_data_requests_total"] == "1"
+    assert values["streaming_form_data_bytes_received_total"] == str(len(body))
+    assert (
+        values['streaming_form_data_part_size_bytes_sum{target="ValueTarget"}'] == "5"
+    )
+    assert (
+        values['streaming_form_data_part_size_bytes_sum{target="NullTarget"}'] == "5000"
+    )
+    assert (
+        values['streaming_form_data_target_seconds_count{target="NullTarget"}'] == "1"
+    )
+
+
+@pytest.mark.usefixtures("backend")
+def test_parser_multiple_targets():
+    encoder = MultipartEncoder(
+        fields=[
+            ("files", ("a.txt", b"a" * 10, "text/plain")),
+            ("files", ("b.txt", b"b" * 20, "text/plain")),
+        ]
+    )
+
+    registry = MetricsRegistry()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, metrics=registry
+    )
+    parser.register("files", MultipleTargets(NullTarget))
+
+    parser.data_received(encoder.to_string())
+
+    values = samples(registry)
+    # the targets created for every part record into the registry too
+    assert (
+        values['streaming_form_data_part_size_bytes_count{target="NullTarget"}'] == "2"
+    )
+    assert (
+        values['streaming_form_data_part_size_bytes_sum{target="NullTarget"}'] == "30"
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("backend")
+async def test_parser_async():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+
+    registry = MetricsRegistry()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, metrics=registry
+    )
+    parser.register("name", ValueTarget())
+
+    await parser.adata_received_many([encoder.to_string()])
+
+    values = samples(registry)
+    assert values["streaming_form_data_requests_total"] == "1"
+    assert (
+        values['streaming_form_data_target_seconds_count{target="ValueTarget"}'] == "1"
+    )
+
+
+@pytest.mark.usefixtures("backend")
+def test_parser_errors():
+    data = b"""\
+--1234
+Content-Disposition: invalid; name="files"
+
+Foo
+--1234--""".replace(b"\n", b"\r\n")
+
+    registry = MetricsRegistry()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"},
+        metrics=registry,
+    )
+
+    with pytest.raises(ParseFailedException):
+        parser.data_received(data)
+
+    values = samples(registry)
+    assert values['streaming_form_data_errors_total{group="PartHeaders"}'] == "1"
+    assert values["streaming_form_data_parsers_in_flight"] == "0"
+    assert values["streaming_form_data_requests_total"] == "0"
+
+
+@pytest.mark.usefixtures("backend")
+def test_parser_in_flight():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    body = encoder.to_string()
+    headers = {"Content-Type": encoder.content_type}
+
+    registry = MetricsRegistry()
+
+    parser = StreamingFormDataParser(headers=headers, metrics=registry)
+    parser.data_received(body[:10])
+    assert samples(registry)["streaming_form_data_parsers_in_flight"] == "1"
+
+    parser.reset(headers=headers)
+    assert samples(registry)["streaming_form_data_parsers_in_flight"] == "0"
+
+    parser.data_received(body[:10])
+    assert samples(registry)["streaming_form_data_parsers_in_flight"] == "1"
+
+    del parser
+    assert samples(registry)["streaming_form_data_parsers_in_flight"] == "0"
+
+
+def test_parser_process_registry():
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}, metrics=True
+    )
+    target = ValueTarget()
+    parser.register("name", target)
+
+    assert target._metrics is REGISTRY
+
+
+@pytest.mark.usefixtures("backend")
+def test_parser_events():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    body = encoder.to_string()
+
+    registry = MetricsRegistry()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, metrics=registry
+    )
+
+    list(parser.events(body[:10]))
+    assert samples(registry)["streaming_form_data_parsers_in_flight"] == "1"
+
+    list(parser.events(body[10:]))
+
+    values = samples(registry)
+    assert values["streaming_form_data_parsers_in_flight"] == "0"
+    assert values["streaming_form_data_requests_total"] == "1"
+    assert values["streaming_form_data_bytes_received_total"] == str(len(body))
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("backend")
+async def test_parser_aparts():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    body = encoder.to_string()
+
+    async def stream():
+        for index in range(0, len(body), 10):
+            yield body[index : index + 10]
+
+    registry = MetricsRegistry()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, metrics=registry
+    )
+
+    async for part in parser.aparts(stream()):
+        assert await part.read() == b"hello"
+        assert samples(registry)["streaming_form_data_parsers_in_flight"] == "1"
+
+    values = samples(registry)
+    assert values["streaming_form_data_parsers_in_flight"] == "0"
+    assert values["streaming_form_data_requests_total"] == "1"
+    assert values["streaming_form_data_bytes_received_total"] == str(len(body))
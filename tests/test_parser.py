@@ -1,22 +1,44 @@
+import asyncio
 import hashlib
+import mmap
 import os
 import re
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO
 
+import numpy
 import pytest
 from requests_toolbelt import MultipartEncoder
 
-from streaming_form_data import ParseFailedException, StreamingFormDataParser
+from streaming_form_data import (
+    FormSchema,
+    ParseFailedException,
+    StreamingFormDataParser,
+)
+from streaming_form_data import parser as parser_module
+from streaming_form_data import targets as targets_module
+from streaming_form_data.events import Data, PartEnd, PartStart
+from streaming_form_data.index import IndexedPart
+from streaming_form_data.parser import UnexpectedPartException, parse_content_boundary
 from streaming_form_data.targets import (
     BaseTarget,
     DirectoryTarget,
     FileTarget,
+    ListTarget,
     MultipleTargets,
     SHA256Target,
+    SmartOpenTarget,
     ValueTarget,
 )
+from streaming_form_data.tracing import Tracer
 from streaming_form_data.validators import MaxSizeValidator, ValidationError
 
+pytestmark = pytest.mark.usefixtures("backend")
+
 dataset = {
     "file.txt": b"this is a txt file\r\n" * 10,
     "image-600x400.png": os.urandom(1780),
@@ -115,6 +137,33 @@ def test_incorrect_content_type():
             StreamingFormDataParser({"Content-Type": value})
 
 
+def test_parse_content_boundary():
+    for value, boundary in (
+        ("multipart/form-data; boundary=1234", b"1234"),
+        ("multipart/form-data;boundary=1234", b"1234"),
+        ("Multipart/Form-Data; BOUNDARY=1234", b"1234"),
+        ('multipart/form-data; boundary="12 34"', b"12 34"),
+        ('multipart/form-data; boundary="12\\:34"', b"12:34"),
+        ("multipart/form-data; charset=utf-8; boundary=1234;", b"1234"),
+        ("  multipart/form-data ;  boundary=1234  ", b"1234"),
+        ("multipart/form-data; boundary=1234; boundary=5678", b"1234"),
+    ):
+        assert parse_content_boundary({"Content-Type": value}) == boundary
+
+    for value in (
+        "multipart/form-data; boundary=",
+        "multipart/form-data; boundary=12 34",
+        "multipart/form-data; boundary=12/34",
+        'multipart/form-data; boundary="1234',
+        'multipart/form-data; boundary="1234 "',
+        'multipart/form-data; boundary="12\\"34"',
+        "multipart/form-data; boundary",
+        "multipart; boundary=1234",
+    ):
+        with pytest.raises(ParseFailedException):
+            parse_content_boundary({"Content-Type": value})
+
+
 def test_basic_multiple():
     first = ValueTarget()
     second = ValueTarget()
@@ -600,6 +649,35 @@ Foo
     assert target.value == b""
 
 
+def test_missing_headers_after_first_part():
+    data = """\
+--1234
+Content-Disposition: form-data; name="first"
+
+Foo
+--1234
+
+
+--1234
+Content-Disposition: form-data; name="second"
+
+Bar
+--1234--""".replace("\n", "\r\n").encode("utf-8")
+
+    first, second = ValueTarget(), ValueTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("first", first)
+    parser.register("second", second)
+
+    parser.data_received(data)
+
+    assert first.value == b"Foo"
+    assert second.value == b"Bar"
+
+
 def test_invalid_content_disposition():
     data = b"""\
 --1234
@@ -662,6 +740,29 @@ Foo
     assert target.value == b"Foo"
 
 
+def test_epilogue_after_final_boundary():
+    data = b"""\
+--1234
+Content-Disposition: form-data; name="files"; filename="ab.txt"
+
+Foo
+--1234--
+This is the epilogue, which should be ignored.
+""".replace(b"\n", b"\r\n")
+
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("files", target)
+
+    parser.data_received(data)
+
+    assert target.value == b"Foo"
+    assert target._finished
+
+
 def test_register_after_data_received():
     encoder = MultipartEncoder(fields={"name": "hello"})
 
@@ -801,6 +902,103 @@ def test_content_type_passed_to_target():
             assert target.multipart_content_type == content_type
 
 
+def test_content_type_available_on_start():
+    data = b"""\
+--1234
+Content-Type: text/csv
+Content-Disposition: form-data; name="files"; filename="ab.csv"
+
+Foo
+--1234--""".replace(b"\n", b"\r\n")
+
+    class StartTarget(ValueTarget):
+        def on_start(self):
+            self.started_with = (self.multipart_filename, self.multipart_content_type)
+
+    target = StartTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("files", target)
+
+    parser.data_received(data)
+
+    assert target.value == b"Foo"
+    assert target.started_with == ("ab.csv", "text/csv")
+
+
+def test_header_parameters():
+    headers = [
+        ('form-data; name="files"; filename="ab.txt"', "ab.txt"),
+        ("FORM-DATA; NAME=files; FILENAME=ab.txt", "ab.txt"),
+        ('form-data;name="files";filename="a;b.txt";', "a;b.txt"),
+        ('form-data; name="files"; filename="a\\"b\\\\c.txt"', 'a"b\\c.txt'),
+        (
+            'form-data; name="files"; filename="r\u00e9sum\u00e9.pdf"',
+            "r\u00e9sum\u00e9.pdf",
+        ),
+        (
+            "form-data; name=files; filename*=UTF-8''%E2%82%AC%20rates.txt",
+            "\u20ac rates.txt",
+        ),
+        ("form-data; name=files; filename*=iso-8859-1'en'%A3%20rates", "\u00a3 rates"),
+        (
+            "form-data; name=files; filename=rates.txt; filename*=UTF-8''%E2%82%AC.txt",
+            "\u20ac.txt",
+        ),
+        ('form-data; name=files; filename*0="ab"; filename*1=".txt"', "ab.txt"),
+        ("form-data; name=files; filename=a;b.txt", "a"),
+        ("form-data; name=files", None),
+    ]
+
+    for header, filename in headers:
+        data = (
+            b"--1234\r\nContent-Disposition: "
+            + header.encode("utf-8")
+            + b"\r\nContent-Type: Text/Plain; charset=utf-8\r\n\r\nFoo\r\n--1234--"
+        )
+
+        target = ValueTarget()
+
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": "multipart/form-data; boundary=1234"}
+        )
+        parser.register("files", target)
+
+        parser.data_received(data)
+
+        assert target.value == b"Foo"
+        assert target.multipart_filename == filename
+        assert target.multipart_content_type == "text/plain"
+
+
+def test_repeated_headers():
+    encoder = MultipartEncoder(
+        fields=[("tags", str(index)) for index in range(100)]
+        + [
+            ("files", ("a.txt", b"a", "text/plain")),
+            ("files", ("a.txt", b"b", "text/csv")),
+        ]
+    )
+
+    tags = ListTarget(str)
+    files = MultipleTargets(ValueTarget)
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("tags", tags)
+    parser.register("files", files)
+
+    parser.data_received(encoder.to_string())
+
+    assert tags.value == [str(index) for index in range(100)]
+    assert [target.value for target in files.targets] == [b"a", b"b"]
+    assert [target.multipart_content_type for target in files.targets] == [
+        "text/plain",
+        "text/csv",
+    ]
+
+
 def test_multiple_targets():
     filename = "image-600x400.png"
 
@@ -954,364 +1152,2377 @@ def test_regex_not_matches():
     assert not target._finished
 
 
-@pytest.mark.asyncio
-async def test_smoke_async():
-    encoder = MultipartEncoder(fields={"name": "hello"})
+def test_first_match_wins():
+    encoder = MultipartEncoder(
+        fields=[
+            ("value", "first"),
+            ("valve", "second"),
+            ("vowel", "third"),
+            ("field-42", "fourth"),
+            ("other", "fifth"),
+        ]
+    )
+
+    regex_target = ValueTarget()
+    search_target = ValueTarget()
+    callable_target = ValueTarget()
+    exact_targets = [ValueTarget() for _ in range(100)]
 
     parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("val.*", regex_target, re.fullmatch)
+    for index, target in enumerate(exact_targets):
+        parser.register(f"field-{index}", target)
+    parser.register("value", ValueTarget())
+    parser.register("w", search_target, re.search)
+    parser.register("o", callable_target, lambda name, value: name[-1] in value)
 
-    await parser.adata_received(encoder.to_string())
+    parser.data_received(encoder.to_string())
 
+    assert regex_target.value == b"firstsecond"
+    assert search_target.value == b"third"
+    assert exact_targets[42].value == b"fourth"
+    assert callable_target.value == b"fifth"
 
-@pytest.mark.asyncio
-async def test_basic_single_async():
-    target = ValueTarget()
 
-    encoder = MultipartEncoder(fields={"value": "hello world"})
+def test_body_contains_boundary_prefix():
+    value = b"foo\r\n--1234-bar\r\n--1234 baz\r\n--123\r\n--1234\r"
 
-    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
-    parser.register("value", target)
+    data = (
+        b"--1234\r\n"
+        b'Content-Disposition: form-data; name="value"\r\n'
+        b"\r\n" + value + b"\r\n"
+        b"--1234--\r\n"
+    )
 
-    await parser.adata_received(encoder.to_string())
+    for index in range(len(data)):
+        target = ValueTarget()
 
-    assert target.value == b"hello world"
-    assert target._started
-    assert target._finished
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": "multipart/form-data; boundary=1234"}
+        )
+        parser.register("value", target)
 
+        parser.data_received(data[:index])
+        parser.data_received(data[index:])
 
-@pytest.mark.asyncio
-async def test_chunked_single_async():
-    expected_value = "hello world"
+        assert target.value == value
 
-    target = ValueTarget()
 
-    encoder = MultipartEncoder(fields={"value": expected_value})
+def test_small_chunks():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
 
-    body = encoder.to_string()
+    with open_dataset("file.txt") as dataset_:
+        fields = {
+            "name": "hello world",
+            "delimiter": "\r\n--" + "-" * 30,
+            "cv.txt": ("file.txt", dataset_, "text/plain"),
+        }
 
-    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
-    parser.register("value", target)
+        encoder = MultipartEncoder(fields=fields)
 
-    index = body.index(b"world")
+        body = encoder.to_string()
+        content_type = encoder.content_type
 
-    await parser.adata_received(body[:index])
-    await parser.adata_received(body[index:])
+    for size in (1, 2, 7, 64):
+        name = ValueTarget()
+        delimiter = ValueTarget()
+        cv = ValueTarget()
 
-    assert target.value == expected_value.encode("utf-8")
+        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
 
+        parser.register("name", name)
+        parser.register("delimiter", delimiter)
+        parser.register("cv.txt", cv)
 
-@pytest.mark.asyncio
-async def test_chunked_multiple_async():
-    expected_first_value = "foo" * 1000
-    expected_second_value = "bar" * 1000
-    expected_third_value = "baz" * 1000
+        for index in range(0, len(body), size):
+            parser.data_received(body[index : index + size])
 
-    first = ValueTarget()
-    second = ValueTarget()
-    third = ValueTarget()
+        assert name.value == b"hello world"
+        assert delimiter.value == b"\r\n--" + b"-" * 30
+        assert cv.value == expected_value
+        assert cv.multipart_filename == "file.txt"
+        assert cv._finished
 
-    encoder = MultipartEncoder(
-        fields={
-            "first": expected_first_value,
-            "second": expected_second_value,
-            "third": expected_third_value,
-        }
-    )
 
-    body = encoder.to_string()
+def test_buffer_protocol_input():
+    with open_dataset("image-2560x1600.png") as dataset_:
+        expected_value = dataset_.read()
 
-    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
-    parser.register("first", first)
-    parser.register("second", second)
-    parser.register("third", third)
+    content_type, body = encoded_dataset("image-2560x1600.png")
 
-    chunks = []
-    size = 100
+    for data in (
+        bytearray(body),
+        memoryview(body),
+        memoryview(bytearray(body)),
+        numpy.frombuffer(body, dtype=numpy.uint8),
+    ):
+        target = ValueTarget()
 
-    while len(body):
-        chunks.append(body[:size])
-        body = body[size:]
+        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+        parser.register("image-2560x1600.png", target)
 
-    for chunk in chunks:
-        await parser.adata_received(chunk)
+        parser.data_received(data)
 
-    assert first.value == expected_first_value.encode("utf-8")
-    assert second.value == expected_second_value.encode("utf-8")
-    assert third.value == expected_third_value.encode("utf-8")
+        assert target.value == expected_value
 
 
-@pytest.mark.asyncio
-async def test_break_chunk_at_boundary_async():
-    expected_first_value = "hello" * 500
-    expected_second_value = "hello" * 500
+def test_mmap_input(tmp_path):
+    with open_dataset("1M.dat") as dataset_:
+        expected_value = dataset_.read()
 
-    first = ValueTarget()
-    second = ValueTarget()
+    content_type, body = encoded_dataset("1M.dat")
 
-    encoder = MultipartEncoder(fields={"first": "hello" * 500, "second": "hello" * 500})
+    path = tmp_path / "body"
+    path.write_bytes(body)
 
-    body = encoder.to_string()
-    boundary = encoder.boundary.encode("utf-8")
+    target = ValueTarget()
 
-    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
-    parser.register("first", first)
-    parser.register("second", second)
+    parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+    parser.register("1M.dat", target)
 
-    index = body[50:].index(boundary) + 5
+    with open(path, "rb") as file_:
+        with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            parser.data_received(mapped)
 
-    await parser.adata_received(body[:index])
-    await parser.adata_received(body[index:])
+    assert target.value == expected_value
 
-    assert first.value == expected_first_value.encode("utf-8")
-    assert second.value == expected_second_value.encode("utf-8")
 
+def test_recycled_buffer_input():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
 
-@pytest.mark.asyncio
-async def test_file_upload_async():
-    data = b"""\
---1234
-Content-Disposition: form-data; name="files"; filename="ab.txt"
+    content_type, body = encoded_dataset("file.txt")
 
-Foo
---1234--""".replace(b"\n", b"\r\n")
+    for size in (1, 7, 64, 1000):
+        target = ValueTarget()
 
-    target = ValueTarget()
+        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+        parser.register("file.txt", target)
 
-    parser = StreamingFormDataParser(
-        headers={"Content-Type": "multipart/form-data; boundary=1234"}
-    )
-    parser.register("files", target)
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        stream = BytesIO(body)
 
-    await parser.adata_received(data)
+        while True:
+            count = stream.readinto(buffer)
+            if not count:
+                break
 
-    assert target.multipart_filename == "ab.txt"
-    assert target.value == b"Foo"
-    assert target._started
-    assert target._finished
+            parser.data_received(view[:count])
 
+        assert target.value == expected_value
 
-@pytest.mark.asyncio
-async def test_directory_upload_async(tmp_path):
-    data = b"""\
---1234
-Content-Disposition: form-data; name="files"; filename="ab.txt"
 
-Foo
---1234
-Content-Disposition: form-data; name="files"; filename="cd.txt"
+class ViewTarget(BaseTarget):
+    accepts_memoryview = True
 
-Bar
---1234--""".replace(b"\n", b"\r\n")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
 
-    target = DirectoryTarget(tmp_path)
+        self.chunks = []
+        self.views = []
 
-    parser = StreamingFormDataParser(
-        headers={"Content-Type": "multipart/form-data; boundary=1234"}
-    )
-    parser.register("files", target)
+    def on_data_received(self, chunk):
+        self.chunks.append(bytes(chunk))
+        self.views.append(chunk)
 
-    await parser.adata_received(data)
+    async def on_data_received_async(self, chunk):
+        self.on_data_received(chunk)
 
-    with open(tmp_path / "ab.txt") as file:
-        assert file.read() == "Foo"
+    @property
+    def value(self):
+        return b"".join(self.chunks)
 
-    with open(tmp_path / "cd.txt") as file:
-        assert file.read() == "Bar"
 
-    assert target.multipart_filenames == ["ab.txt", "cd.txt"]
-    assert tmp_path
-    assert target._started
-    assert target._finished
-
-
-@pytest.mark.asyncio
-async def test_mixed_content_varying_chunk_size_async():
+def test_zero_copy():
     with open_dataset("file.txt") as dataset_:
         expected_value = dataset_.read()
 
-    with open_dataset("file.txt") as dataset_:
-        fields = {
-            "name": "hello world",
-            "age": "10",
-            "cv.txt": ("file.txt", dataset_, "text/plain"),
-        }
-
-        encoder = MultipartEncoder(fields=fields)
-
-        body = encoder.to_string()
-
-        content_type = encoder.content_type
+    content_type, body = encoded_dataset("file.txt")
 
-    for index in range(len(body)):
-        name = ValueTarget()
-        age = ValueTarget()
-        cv = ValueTarget()
+    for size in (1, 7, 64, 1000, len(body)):
+        target = ViewTarget()
 
-        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
-        parser.register("name", name)
-        parser.register("age", age)
-        parser.register("cv.txt", cv)
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": content_type}, zero_copy=True
+        )
+        parser.register("file.txt", target)
 
-        await parser.adata_received(body[:index])
-        await parser.adata_received(body[index:])
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        stream = BytesIO(body)
 
-        assert name.value == b"hello world"
-        assert age.value == b"10"
-        assert cv.value == expected_value
+        while True:
+            count = stream.readinto(buffer)
+            if not count:
+                break
 
+            parser.data_received(view[:count])
 
-@pytest.mark.asyncio
-async def test_register_after_data_received_async():
-    encoder = MultipartEncoder(fields={"name": "hello"})
+        assert target.value == expected_value
+        assert any(type(chunk) is memoryview for chunk in target.views)
 
-    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+        # views are only valid during the callback
+        for chunk in target.views:
+            if type(chunk) is memoryview:
+                with pytest.raises(ValueError):
+                    chunk.tobytes()
 
-    await parser.adata_received(encoder.to_string())
+        # and the input buffer is not pinned
+        view.release()
+        buffer.clear()
 
-    with pytest.raises(ParseFailedException):
-        parser.register("name", ValueTarget())
 
+def test_zero_copy_mixed_targets():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
 
-@pytest.mark.asyncio
-async def test_target_raises_exception_async():
-    filename = "file.txt"
-    content_type, body = encoded_dataset(filename)
+    content_type, body = encoded_dataset("file.txt")
 
-    class BadTarget(BaseTarget):
-        async def on_data_received_async(self, data):
-            raise ValueError()
+    view_target = ViewTarget()
+    value_target = ValueTarget()
 
-    target = BadTarget()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type}, zero_copy=True
+    )
+    parser.register("file.txt", view_target)
+    parser.register("file.txt", value_target)
 
-    parser = StreamingFormDataParser(headers={"Content-Type": content_type})
-    parser.register(filename, target)
+    parser.data_received(body)
 
-    with pytest.raises(ValueError):
-        await parser.adata_received(body)
+    assert value_target.value == expected_value
+    assert view_target.value == expected_value
+    assert all(type(chunk) is bytes for chunk in view_target.views)
 
 
-@pytest.mark.asyncio
-async def test_multiple_targets_async():
+def test_zero_copy_file_target(tmp_path):
     filename = "image-600x400.png"
     with open_dataset(filename) as dataset_:
         expected_data = dataset_.read()
 
-    value_target = ValueTarget()
+    file_target = FileTarget(tmp_path / filename)
     sha256_target = SHA256Target()
 
     with open_dataset(filename) as file_:
         encoder = MultipartEncoder(fields={filename: (filename, file_, "image/png")})
+        body = encoder.to_string()
 
-        parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
-        parser.register(filename, value_target)
-        parser.register(filename, sha256_target)
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, zero_copy=True
+    )
+    parser.register(filename, file_target)
+    parser.register(filename, sha256_target)
 
-        assert not value_target.value
-        assert sha256_target.value == hashlib.sha256(b"").hexdigest()
+    for index in range(0, len(body), 1000):
+        parser.data_received(body[index : index + 1000])
 
-        await parser.adata_received(encoder.to_string())
+    with open(tmp_path / filename, "rb") as file_:
+        assert file_.read() == expected_data
+    assert sha256_target.value == hashlib.sha256(expected_data).hexdigest()
 
-        assert value_target.value == expected_data
-        assert sha256_target.value == hashlib.sha256(expected_data).hexdigest()
 
+def test_emit_sizes():
+    with open_dataset("image-2560x1600.png") as dataset_:
+        expected_value = dataset_.read()
 
-@pytest.mark.asyncio
-async def test_multiple_inputs_async(tmp_path):
-    for filename in ("first.txt", "second.txt", "third.txt"):
-        with open(tmp_path / filename, "w") as file:
-            file.write(f"{filename}")
+    content_type, body = encoded_dataset("image-2560x1600.png")
 
-    encoder = MultipartEncoder(
-        fields=[
-            ("files", ("files", open(tmp_path / "first.txt", "rb"), "text/plain")),
-            ("files", ("files", open(tmp_path / "second.txt", "rb"), "text/plain")),
-            ("files", ("files", open(tmp_path / "third.txt", "rb"), "text/plain")),
-        ]
+    for zero_copy in (False, True):
+        for size in (1, 7, 64, 1000, len(body)):
+            target = ViewTarget()
+
+            parser = StreamingFormDataParser(
+                headers={"Content-Type": content_type},
+                zero_copy=zero_copy,
+                min_emit_size=1024,
+                max_emit_size=4096,
+            )
+            parser.register("image-2560x1600.png", target)
+
+            for index in range(0, len(body), size):
+                parser.data_received(body[index : index + size])
+
+            assert target.value == expected_value
+            assert all(1024 <= len(chunk) <= 4096 for chunk in target.chunks[:-1])
+            assert 0 < len(target.chunks[-1]) <= 4096
+
+
+def test_emit_sizes_flush_at_part_end():
+    target = ViewTarget()
+
+    encoder = MultipartEncoder(fields={"value": "hello world"})
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, min_emit_size=1024
     )
+    parser.register("value", target)
 
-    class next_target:
-        def __init__(self):
-            self._index = 0
+    for byte in encoder.to_string():
+        parser.data_received(bytes([byte]))
 
-        def __call__(self):
-            return ValueTarget()
+    assert target.chunks == [b"hello world"]
 
-    target = MultipleTargets(next_target())
 
-    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
-    parser.register("files", target)
+def test_emit_sizes_default():
+    with open_dataset("image-2560x1600.png") as dataset_:
+        expected_value = dataset_.read()
 
-    await parser.adata_received(encoder.to_string())
+    content_type, body = encoded_dataset("image-2560x1600.png")
 
-    assert len(target.targets) == 3
-    assert target.targets[0].value == b"first.txt"
-    assert target.targets[1].value == b"second.txt"
-    assert target.targets[2].value == b"third.txt"
+    for min_emit_size, max_emit_size in ((None, None), (None, 100), (0, None)):
+        target = ViewTarget()
 
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": content_type},
+            min_emit_size=min_emit_size,
+            max_emit_size=max_emit_size,
+        )
+        parser.register("image-2560x1600.png", target)
 
-@pytest.mark.asyncio
-async def test_missing_headers_async():
-    data = """\
---1234
+        for index in range(0, len(body), 100):
+            parser.data_received(body[index : index + 100])
 
-Foo
---1234--""".replace("\n", "\r\n").encode("utf-8")
+        assert target.value == expected_value
 
-    target = ValueTarget()
+        if min_emit_size == 0:
+            # one call per input chunk
+            assert len(target.chunks) > len(expected_value) // 100
+        elif max_emit_size is None:
+            # small chunks are collected up to 1024 bytes
+            assert all(len(chunk) >= 1024 for chunk in target.chunks[:-1])
+        else:
+            # clamped to max_emit_size
+            assert all(len(chunk) <= 100 for chunk in target.chunks)
 
-    parser = StreamingFormDataParser(
-        headers={"Content-Type": "multipart/form-data; boundary=1234"}
-    )
-    parser.register("files", target)
 
-    await parser.adata_received(data)
+def test_invalid_emit_sizes():
+    headers = {"Content-Type": "multipart/form-data; boundary=1234"}
 
-    assert target.value == b""
+    with pytest.raises(ValueError):
+        StreamingFormDataParser(headers=headers, min_emit_size=-1)
 
+    with pytest.raises(ValueError):
+        StreamingFormDataParser(headers=headers, max_emit_size=0)
 
-@pytest.mark.asyncio
-async def test_invalid_content_disposition_async():
+    with pytest.raises(ValueError):
+        StreamingFormDataParser(headers=headers, min_emit_size=10, max_emit_size=5)
+
+
+def test_data_received_many():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
+
+    content_type, body = encoded_dataset("file.txt")
+
+    for size in (1, 7, 64, 1000):
+        target = ValueTarget()
+
+        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+        parser.register("file.txt", target)
+
+        chunks = [body[index : index + size] for index in range(0, len(body), size)]
+        parser.data_received_many(chunks)
+
+        assert target.value == expected_value
+        assert target._finished
+
+
+def test_data_received_many_invalid():
     data = b"""\
 --1234
-Content-Disposition: invalid; name="files"; filename="ab.txt"
+Content-Disposition: invalid; name="files"
 
 Foo
 --1234--""".replace(b"\n", b"\r\n")
 
-    target = ValueTarget()
-
     parser = StreamingFormDataParser(
         headers={"Content-Type": "multipart/form-data; boundary=1234"}
     )
-    parser.register("files", target)
 
     with pytest.raises(ParseFailedException):
-        await parser.adata_received(data)
+        parser.data_received_many(iter([data[:20], data[20:]]))
 
-    assert target.value == b""
 
+def test_events():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
 
-@pytest.mark.asyncio
-async def test_file_target_async(tmp_path):
-    filename = tmp_path / "file.txt"
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "file.txt": ("file.txt", expected_value, "text/plain"),
+        }
+    )
+    body = encoder.to_string()
+
+    for size in (1, 7, 64, 1000, len(body)):
+        target = ValueTarget()
+
+        parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+        parser.register("name", target)
+
+        events = []
+        values = {}
+
+        for index in range(0, len(body), size):
+            for event in parser.events(body[index : index + size]):
+                if type(event) is Data:
+                    # Data events follow the PartStart of their part
+                    values[events[-1].name] += event.data
+                else:
+                    events.append(event)
+                    if type(event) is PartStart:
+                        values[event.name] = b""
+
+        assert events == [
+            PartStart("name", None, None),
+            PartEnd("name"),
+            PartStart("file.txt", "file.txt", "text/plain"),
+            PartEnd("file.txt"),
+        ]
+        assert values == {"name": b"hello", "file.txt": expected_value}
+
+        # targets are not called in event mode
+        assert target.value == b""
+
+
+def test_events_zero_copy():
+    content_type, body = encoded_dataset("file.txt")
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type}, zero_copy=True
+    )
+
+    views = [event.data for event in parser.events(body) if type(event) is Data]
+
+    assert views
+    assert all(type(view) is memoryview for view in views)
+
+    # views are only valid until the next event
+    for view in views:
+        with pytest.raises(ValueError):
+            view.tobytes()
+
+
+def test_events_invalid():
     data = b"""\
 --1234
-Content-Disposition: form-data; name="files"; filename="ab.txt"
+Content-Disposition: form-data; name="files"
 
 Foo
---1234--""".replace(b"\n", b"\r\n")
+--1234
+Content-Disposition: invalid; name="files"
 
-    target = FileTarget(filename)
+Bar
+--1234--""".replace(b"\n", b"\r\n")
 
     parser = StreamingFormDataParser(
         headers={"Content-Type": "multipart/form-data; boundary=1234"}
     )
-    parser.register("files", target)
 
-    await parser.adata_received(data)
+    events = []
+    with pytest.raises(ParseFailedException):
+        for event in parser.events(data):
+            events.append(event)
 
-    assert target.multipart_filename == "ab.txt"
-    assert os.path.exists(filename)
+    assert events == [PartStart("files", None, None), Data(b"Foo"), PartEnd("files")]
 
-    with open(filename, "rb") as f:
-        assert f.read() == b"Foo"
+
+def test_events_strict():
+    encoder = MultipartEncoder(fields={"name": "hello", "extra": "field"})
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, strict=True
+    )
+    parser.register("name", ValueTarget())
+
+    with pytest.raises(UnexpectedPartException):
+        list(parser.events(encoder.to_string()))
+
+
+def test_schema():
+    schema = FormSchema()
+    schema.register("name", ValueTarget)
+    schema.register("file", ValueTarget)
+    schema.register("file", SHA256Target)
+    schema.register("val.*", ValueTarget, re.fullmatch)
+
+    for value in ("first", "second"):
+        encoder = MultipartEncoder(
+            fields={"name": value, "file": value * 2, "value": value * 3}
+        )
+
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": encoder.content_type}, schema=schema
+        )
+        parser.data_received(encoder.to_string())
+
+        (name,) = parser.targets["name"]
+        file, sha256 = parser.targets["file"]
+        (regex,) = parser.targets["val.*"]
+
+        assert name.value == value.encode("utf-8")
+        assert file.value == value.encode("utf-8") * 2
+        assert sha256.value == hashlib.sha256(file.value).hexdigest()
+        assert regex.value == value.encode("utf-8") * 3
+
+
+def test_reset():
+    schema = FormSchema()
+    schema.register("name", ValueTarget)
+
+    first = MultipartEncoder(fields={"name": "first"})
+    second = MultipartEncoder(fields={"name": "second", "other": "value"})
+
+    assert first.boundary != second.boundary
+
+    first_body = first.to_string()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": first.content_type}, schema=schema
+    )
+
+    # abandon the first request halfway through
+    parser.data_received(first_body[: len(first_body) // 2])
+
+    parser.reset(headers={"Content-Type": second.content_type})
+    parser.data_received(second.to_string())
+
+    assert parser.targets["name"][0].value == b"second"
+
+    parser.reset(headers={"Content-Type": first.content_type})
+    parser.data_received(first_body)
+
+    assert parser.targets["name"][0].value == b"first"
+
+
+def test_reset_without_schema():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    headers = {"Content-Type": encoder.content_type}
+    body = encoder.to_string()
+
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(headers=headers)
+    parser.register("name", target)
+    parser.data_received(body)
+
+    assert parser.targets == {"name": [target]}
+
+    parser.reset(headers=headers)
+    assert parser.targets == {}
+
+    other_target = ValueTarget()
+    parser.register("name", other_target)
+    parser.data_received(body)
+
+    assert target.value == b"hello"
+    assert other_target.value == b"hello"
+
+
+class BufferingTarget(BaseTarget):
+    """Holds on to the data until drain is called, like a background writer."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.written = b""
+
+    def on_data_received(self, chunk):
+        self.chunks.append(chunk)
+        self.buffered(len(chunk))
+
+    async def on_data_received_async(self, chunk):
+        self.on_data_received(chunk)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        for chunk in chunks:
+            self.written += chunk
+            self.drained(len(chunk))
+
+
+def test_flow_control():
+    content_type, body = encoded_dataset("image-2560x1600.png")
+
+    resumed = []
+    target = BufferingTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type},
+        high_water_mark=4096,
+        low_water_mark=1024,
+        on_resume=lambda: resumed.append(parser.pending_bytes),
+    )
+    parser.register("image-2560x1600.png", target)
+
+    index = 0
+    while not parser.paused:
+        parser.data_received(body[index : index + 1000])
+        index += 1000
+
+    assert parser.pending_bytes > 4096
+    assert not resumed
+
+    target.drain()
+
+    assert not parser.paused
+    assert parser.pending_bytes == 0
+    # resumed as soon as the low water mark was reached
+    assert len(resumed) == 1 and resumed[0] <= 1024
+
+    parser.data_received(body[index:])
+    target.drain()
+
+    assert target.written == dataset["image-2560x1600.png"]
+
+
+@pytest.fixture()
+def gated_smart_open(monkeypatch):
+    """Make the files opened by SmartOpenTarget wait for the gate to be set."""
+    gate = threading.Event()
+    smart_open = targets_module.smart_open.open
+
+    class GatedFile:
+        def __init__(self, *args, **kwargs):
+            self._file = smart_open(*args, **kwargs)
+
+        def write(self, chunk):
+            gate.wait()
+            return self._file.write(chunk)
+
+        def close(self):
+            self._file.close()
+
+    monkeypatch.setattr(targets_module.smart_open, "open", GatedFile)
+    return gate
+
+
+def test_flow_control_background_writer(tmp_path, gated_smart_open):
+    content_type, body = encoded_dataset("image-500k.png")
+    path = tmp_path / "image.png"
+
+    resumed = threading.Event()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type},
+        high_water_mark=64 * 1024,
+        on_resume=resumed.set,
+    )
+    parser.register("image-500k.png", SmartOpenTarget(str(path), "wb", background=True))
+
+    index = 0
+    while not parser.paused:
+        parser.data_received(body[index : index + 10_000])
+        index += 10_000
+
+    assert parser.pending_bytes > 64 * 1024
+
+    gated_smart_open.set()
+
+    assert resumed.wait(5)
+    assert not parser.paused
+
+    parser.data_received(body[index:])
+
+    assert parser.pending_bytes == 0
+    assert path.read_bytes() == dataset["image-500k.png"]
+
+
+def test_flow_control_disabled():
+    content_type, body = encoded_dataset("file.txt")
+
+    parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+    parser.register("file.txt", BufferingTarget())
+
+    parser.data_received(body)
+
+    assert not parser.paused
+    assert parser.pending_bytes == 0
+
+
+def test_invalid_flow_control():
+    headers = {"Content-Type": "multipart/form-data; boundary=1234"}
+
+    with pytest.raises(ValueError):
+        StreamingFormDataParser(headers=headers, low_water_mark=10)
+
+    with pytest.raises(ValueError):
+        StreamingFormDataParser(headers=headers, high_water_mark=10, low_water_mark=20)
+
+
+def test_parsing_in_threads():
+    filename = "1M.dat"
+    with open_dataset(filename) as dataset_:
+        expected_value = dataset_.read()
+
+    content_type, body = encoded_dataset(filename)
+
+    def parse(target):
+        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+        parser.register(filename, target)
+
+        for index in range(0, len(body), 65536):
+            parser.data_received(body[index : index + 65536])
+
+    targets = [ValueTarget() for _ in range(4)]
+    threads = [threading.Thread(target=parse, args=(target,)) for target in targets]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for target in targets:
+        assert target.value == expected_value
+
+
+@pytest.mark.asyncio
+async def test_smoke_async():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    await parser.adata_received(encoder.to_string())
+
+
+@pytest.mark.asyncio
+async def test_basic_single_async():
+    target = ValueTarget()
+
+    encoder = MultipartEncoder(fields={"value": "hello world"})
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("value", target)
+
+    await parser.adata_received(encoder.to_string())
+
+    assert target.value == b"hello world"
+    assert target._started
+    assert target._finished
+
+
+@pytest.mark.asyncio
+async def test_chunked_single_async():
+    expected_value = "hello world"
+
+    target = ValueTarget()
+
+    encoder = MultipartEncoder(fields={"value": expected_value})
+
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("value", target)
+
+    index = body.index(b"world")
+
+    await parser.adata_received(body[:index])
+    await parser.adata_received(body[index:])
+
+    assert target.value == expected_value.encode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_chunked_multiple_async():
+    expected_first_value = "foo" * 1000
+    expected_second_value = "bar" * 1000
+    expected_third_value = "baz" * 1000
+
+    first = ValueTarget()
+    second = ValueTarget()
+    third = ValueTarget()
+
+    encoder = MultipartEncoder(
+        fields={
+            "first": expected_first_value,
+            "second": expected_second_value,
+            "third": expected_third_value,
+        }
+    )
+
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("first", first)
+    parser.register("second", second)
+    parser.register("third", third)
+
+    chunks = []
+    size = 100
+
+    while len(body):
+        chunks.append(body[:size])
+        body = body[size:]
+
+    for chunk in chunks:
+        await parser.adata_received(chunk)
+
+    assert first.value == expected_first_value.encode("utf-8")
+    assert second.value == expected_second_value.encode("utf-8")
+    assert third.value == expected_third_value.encode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_break_chunk_at_boundary_async():
+    expected_first_value = "hello" * 500
+    expected_second_value = "hello" * 500
+
+    first = ValueTarget()
+    second = ValueTarget()
+
+    encoder = MultipartEncoder(fields={"first": "hello" * 500, "second": "hello" * 500})
+
+    body = encoder.to_string()
+    boundary = encoder.boundary.encode("utf-8")
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("first", first)
+    parser.register("second", second)
+
+    index = body[50:].index(boundary) + 5
+
+    await parser.adata_received(body[:index])
+    await parser.adata_received(body[index:])
+
+    assert first.value == expected_first_value.encode("utf-8")
+    assert second.value == expected_second_value.encode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_file_upload_async():
+    data = b"""\
+--1234
+Content-Disposition: form-data; name="files"; filename="ab.txt"
+
+Foo
+--1234--""".replace(b"\n", b"\r\n")
+
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("files", target)
+
+    await parser.adata_received(data)
+
+    assert target.multipart_filename == "ab.txt"
+    assert target.value == b"Foo"
+    assert target._started
+    assert target._finished
+
+
+@pytest.mark.asyncio
+async def test_directory_upload_async(tmp_path):
+    data = b"""\
+--1234
+Content-Disposition: form-data; name="files"; filename="ab.txt"
+
+Foo
+--1234
+Content-Disposition: form-data; name="files"; filename="cd.txt"
+
+Bar
+--1234--""".replace(b"\n", b"\r\n")
+
+    target = DirectoryTarget(tmp_path)
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("files", target)
+
+    await parser.adata_received(data)
+
+    with open(tmp_path / "ab.txt") as file:
+        assert file.read() == "Foo"
+
+    with open(tmp_path / "cd.txt") as file:
+        assert file.read() == "Bar"
+
+    assert target.multipart_filenames == ["ab.txt", "cd.txt"]
+    assert tmp_path
+    assert target._started
+    assert target._finished
+
+
+@pytest.mark.asyncio
+async def test_mixed_content_varying_chunk_size_async():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
+
+    with open_dataset("file.txt") as dataset_:
+        fields = {
+            "name": "hello world",
+            "age": "10",
+            "cv.txt": ("file.txt", dataset_, "text/plain"),
+        }
+
+        encoder = MultipartEncoder(fields=fields)
+
+        body = encoder.to_string()
+
+        content_type = encoder.content_type
+
+    for index in range(len(body)):
+        name = ValueTarget()
+        age = ValueTarget()
+        cv = ValueTarget()
+
+        parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+        parser.register("name", name)
+        parser.register("age", age)
+        parser.register("cv.txt", cv)
+
+        await parser.adata_received(body[:index])
+        await parser.adata_received(body[index:])
+
+        assert name.value == b"hello world"
+        assert age.value == b"10"
+        assert cv.value == expected_value
+
+
+@pytest.mark.asyncio
+async def test_register_after_data_received_async():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    await parser.adata_received(encoder.to_string())
+
+    with pytest.raises(ParseFailedException):
+        parser.register("name", ValueTarget())
+
+
+@pytest.mark.asyncio
+async def test_target_raises_exception_async():
+    filename = "file.txt"
+    content_type, body = encoded_dataset(filename)
+
+    class BadTarget(BaseTarget):
+        async def on_data_received_async(self, data):
+            raise ValueError()
+
+    target = BadTarget()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+    parser.register(filename, target)
+
+    with pytest.raises(ValueError):
+        await parser.adata_received(body)
+
+
+@pytest.mark.asyncio
+async def test_multiple_targets_async():
+    filename = "image-600x400.png"
+    with open_dataset(filename) as dataset_:
+        expected_data = dataset_.read()
+
+    value_target = ValueTarget()
+    sha256_target = SHA256Target()
+
+    with open_dataset(filename) as file_:
+        encoder = MultipartEncoder(fields={filename: (filename, file_, "image/png")})
+
+        parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+        parser.register(filename, value_target)
+        parser.register(filename, sha256_target)
+
+        assert not value_target.value
+        assert sha256_target.value == hashlib.sha256(b"").hexdigest()
+
+        await parser.adata_received(encoder.to_string())
+
+        assert value_target.value == expected_data
+        assert sha256_target.value == hashlib.sha256(expected_data).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_multiple_inputs_async(tmp_path):
+    for filename in ("first.txt", "second.txt", "third.txt"):
+        with open(tmp_path / filename, "w") as file:
+            file.write(f"{filename}")
+
+    encoder = MultipartEncoder(
+        fields=[
+            ("files", ("files", open(tmp_path / "first.txt", "rb"), "text/plain")),
+            ("files", ("files", open(tmp_path / "second.txt", "rb"), "text/plain")),
+            ("files", ("files", open(tmp_path / "third.txt", "rb"), "text/plain")),
+        ]
+    )
+
+    class next_target:
+        def __init__(self):
+            self._index = 0
+
+        def __call__(self):
+            return ValueTarget()
+
+    target = MultipleTargets(next_target())
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("files", target)
+
+    await parser.adata_received(encoder.to_string())
+
+    assert len(target.targets) == 3
+    assert target.targets[0].value == b"first.txt"
+    assert target.targets[1].value == b"second.txt"
+    assert target.targets[2].value == b"third.txt"
+
+
+@pytest.mark.asyncio
+async def test_missing_headers_async():
+    data = """\
+--1234
+
+Foo
+--1234--""".replace("\n", "\r\n").encode("utf-8")
+
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("files", target)
+
+    await parser.adata_received(data)
+
+    assert target.value == b""
+
+
+@pytest.mark.asyncio
+async def test_invalid_content_disposition_async():
+    data = b"""\
+--1234
+Content-Disposition: invalid; name="files"; filename="ab.txt"
+
+Foo
+--1234--""".replace(b"\n", b"\r\n")
+
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("files", target)
+
+    with pytest.raises(ParseFailedException):
+        await parser.adata_received(data)
+
+    assert target.value == b""
+
+
+@pytest.mark.asyncio
+async def test_file_target_async(tmp_path):
+    filename = tmp_path / "file.txt"
+    data = b"""\
+--1234
+Content-Disposition: form-data; name="files"; filename="ab.txt"
+
+Foo
+--1234--""".replace(b"\n", b"\r\n")
+
+    target = FileTarget(filename)
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    parser.register("files", target)
+
+    await parser.adata_received(data)
+
+    assert target.multipart_filename == "ab.txt"
+    assert os.path.exists(filename)
+
+    with open(filename, "rb") as f:
+        assert f.read() == b"Foo"
+
+
+@pytest.mark.asyncio
+async def test_recycled_buffer_input_async():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
+
+    content_type, body = encoded_dataset("file.txt")
+
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+    parser.register("file.txt", target)
+
+    buffer = bytearray(64)
+    view = memoryview(buffer)
+    stream = BytesIO(body)
+
+    while True:
+        count = stream.readinto(buffer)
+        if not count:
+            break
+
+        await parser.adata_received(view[:count])
+
+    assert target.value == expected_value
+
+
+@pytest.mark.asyncio
+async def test_zero_copy_async():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
+
+    content_type, body = encoded_dataset("file.txt")
+
+    target = ViewTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type}, zero_copy=True
+    )
+    parser.register("file.txt", target)
+
+    buffer = bytearray(64)
+    view = memoryview(buffer)
+    stream = BytesIO(body)
+
+    while True:
+        count = stream.readinto(buffer)
+        if not count:
+            break
+
+        await parser.adata_received(view[:count])
+
+    assert target.value == expected_value
+    assert any(type(chunk) is memoryview for chunk in target.views)
+
+    view.release()
+    buffer.clear()
+
+
+@pytest.mark.asyncio
+async def test_emit_sizes_async():
+    with open_dataset("image-2560x1600.png") as dataset_:
+        expected_value = dataset_.read()
+
+    content_type, body = encoded_dataset("image-2560x1600.png")
+
+    target = ViewTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type},
+        zero_copy=True,
+        min_emit_size=1024,
+        max_emit_size=4096,
+    )
+    parser.register("image-2560x1600.png", target)
+
+    for index in range(0, len(body), 7):
+        await parser.adata_received(body[index : index + 7])
+
+    assert target.value == expected_value
+    assert all(1024 <= len(chunk) <= 4096 for chunk in target.chunks[:-1])
+
+
+@pytest.mark.asyncio
+async def test_data_received_many_async():
+    with open_dataset("file.txt") as dataset_:
+        expected_value = dataset_.read()
+
+    content_type, body = encoded_dataset("file.txt")
+
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": content_type})
+    parser.register("file.txt", target)
+
+    await parser.adata_received_many(
+        body[index : index + 7] for index in range(0, len(body), 7)
+    )
+
+    assert target.value == expected_value
+    assert target._finished
+
+
+@pytest.mark.asyncio
+async def test_nonblocking_targets_async():
+    class SyncOnlyTarget(ValueTarget):
+        is_nonblocking = True
+
+        async def on_data_received_async(self, chunk):
+            raise AssertionError("should be called synchronously")
+
+    class AsyncOnlyTarget(ValueTarget):
+        def on_data_received(self, chunk):
+            raise AssertionError("should be called asynchronously")
+
+    encoder = MultipartEncoder(fields={"first": "foo", "second": "bar"})
+
+    first = SyncOnlyTarget()
+    second = AsyncOnlyTarget()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("first", first)
+    parser.register("second", second)
+
+    await parser.adata_received(encoder.to_string())
+
+    assert first.value == b"foo"
+    assert second.value == b"bar"
+    assert first._finished
+    assert second._finished
+
+
+@pytest.mark.asyncio
+async def test_schema_async():
+    schema = FormSchema()
+    schema.register("name", ValueTarget)
+
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, schema=schema
+    )
+
+    for _ in range(2):
+        await parser.adata_received(body)
+
+        assert parser.targets["name"][0].value == b"hello"
+
+        parser.reset(headers={"Content-Type": encoder.content_type})
+
+
+async def chunked(body, size):
+    for index in range(0, len(body), size):
+        yield body[index : index + size]
+
+
+@pytest.mark.asyncio
+async def test_aparts():
+    with open_dataset("image-2560x1600.png") as dataset_:
+        expected_value = dataset_.read()
+
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "skipped": "not read",
+            "file": ("image.png", expected_value, "image/png"),
+        }
+    )
+    body = encoder.to_string()
+
+    for size in (1, 7, 1000, len(body)):
+        parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+        parts = []
+        values = {}
+
+        async for part in parser.aparts(chunked(body, size)):
+            parts.append((part.name, part.filename, part.content_type))
+            if part.name != "skipped":
+                values[part.name] = await part.read()
+
+        assert parts == [
+            ("name", None, None),
+            ("skipped", None, None),
+            ("file", "image.png", "image/png"),
+        ]
+        assert values == {"name": b"hello", "file": expected_value}
+
+
+@pytest.mark.asyncio
+async def test_aparts_reads_lazily():
+    encoder = MultipartEncoder(fields={"first": "foo", "second": "bar"})
+    body = encoder.to_string()
+
+    received = 0
+
+    async def stream():
+        nonlocal received
+        for index in range(0, len(body), 10):
+            received += 10
+            yield body[index : index + 10]
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    async for part in parser.aparts(stream()):
+        assert part.name == "first"
+        # nothing has been read beyond the first part's headers
+        assert received < body.index(b"foo") + 10
+        break
+
+
+@pytest.mark.asyncio
+async def test_aparts_truncated():
+    encoder = MultipartEncoder(
+        fields=[
+            ("file", ("file.txt", b"x" * 1000, "text/plain")),
+            ("name", "value"),
+        ]
+    )
+    body = encoder.to_string()
+    second = body.index(b"--" + encoder.boundary_value.encode(), 10)
+
+    for end in (
+        # in the preamble, in the headers, in the body, between parts
+        3,
+        73,
+        500,
+        second,
+        second + 20,
+    ):
+        parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+        with pytest.raises(ParseFailedException):
+            async for part in parser.aparts(chunked(body[:end], 100)):
+                await part.read()
+
+
+@pytest.mark.asyncio
+async def test_flow_control_async():
+    content_type, body = encoded_dataset("image-2560x1600.png")
+
+    target = BufferingTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type}, high_water_mark=4096
+    )
+    parser.register("image-2560x1600.png", target)
+
+    for index in range(0, len(body), 1000):
+        await parser.adata_received(body[index : index + 1000])
+
+        if parser.paused:
+            # drained by another thread
+            drainer = threading.Timer(0.01, target.drain)
+            drainer.start()
+
+            await parser.drain()
+
+            assert parser.pending_bytes <= 1024
+            drainer.join()
+
+    target.drain()
+
+    assert target.written == dataset["image-2560x1600.png"]
+
+
+@pytest.mark.asyncio
+async def test_flow_control_background_writer_async(tmp_path, gated_smart_open):
+    content_type, body = encoded_dataset("image-500k.png")
+    path = tmp_path / "image.png"
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": content_type}, high_water_mark=64 * 1024
+    )
+    parser.register("image-500k.png", SmartOpenTarget(str(path), "wb", background=True))
+
+    index = 0
+    while not parser.paused:
+        await parser.adata_received(body[index : index + 10_000])
+        index += 10_000
+
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.01, gated_smart_open.set)
+
+    await parser.drain()
+
+    assert parser.pending_bytes <= 16 * 1024
+
+    await parser.adata_received(body[index:])
+
+    assert parser.pending_bytes == 0
+    assert path.read_bytes() == dataset["image-500k.png"]
+
+
+class SlowTarget(ValueTarget):
+    def __init__(self, active, fail=False):
+        super().__init__()
+        self.active = active
+        self.fail = fail
+        self.max_active = 0
+
+    async def on_data_received_async(self, chunk):
+        self.active.append(self)
+        self.max_active = max(self.max_active, len(self.active))
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.active.remove(self)
+
+        if self.fail:
+            raise ValueError("failed")
+
+        await super().on_data_received_async(chunk)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_targets():
+    encoder = MultipartEncoder(fields={"value": "hello"})
+    body = encoder.to_string()
+
+    for concurrent_targets in (False, True):
+        active = []
+        first, second = SlowTarget(active), SlowTarget(active)
+
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": encoder.content_type},
+            concurrent_targets=concurrent_targets,
+        )
+        parser.register("value", first)
+        parser.register("value", second)
+
+        await parser.adata_received(body)
+
+        assert first.value == second.value == b"hello"
+        assert first._finished and second._finished
+        assert max(first.max_active, second.max_active) == (
+            2 if concurrent_targets else 1
+        )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_targets_error():
+    encoder = MultipartEncoder(fields={"value": "hello"})
+
+    active = []
+    failing, other = SlowTarget(active, fail=True), SlowTarget(active)
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, concurrent_targets=True
+    )
+    parser.register("value", failing)
+    parser.register("value", other)
+
+    with pytest.raises(ValueError):
+        await parser.adata_received(encoder.to_string())
+
+    # the other target is not interrupted
+    assert other.value == b"hello"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_targets_cancelled():
+    encoder = MultipartEncoder(fields={"value": "hello"})
+
+    active = []
+    first, second = SlowTarget(active), SlowTarget(active)
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, concurrent_targets=True
+    )
+    parser.register("value", first)
+    parser.register("value", second)
+
+    task = asyncio.ensure_future(parser.adata_received(encoder.to_string()))
+    await asyncio.sleep(0.005)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # both targets have been cancelled
+    assert active == []
+    assert first.value == second.value == b""
+
+
+class ThreadTarget(ValueTarget):
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    async def on_data_received_async(self, chunk):
+        self.threads.add(threading.get_ident())
+        await super().on_data_received_async(chunk)
+
+
+@pytest.mark.asyncio
+async def test_offload():
+    data = os.urandom(300_000)
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "file": ("file.bin", data, "application/octet-stream"),
+        }
+    )
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, offload_threshold=50_000
+    )
+    name, file = ValueTarget(), ThreadTarget()
+    parser.register("name", name)
+    parser.register("file", file)
+
+    async for chunk in chunked(body, 100_000):
+        await parser.adata_received(chunk)
+
+    assert name.value == b"hello"
+    assert file.value == data
+    # the targets are still called on the event loop
+    assert file.threads == {threading.get_ident()}
+
+
+@pytest.mark.asyncio
+async def test_offload_many():
+    encoder = MultipartEncoder(fields={"first": "hello", "second": "world"})
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, offload_threshold=16
+    )
+    first, second = ValueTarget(), ValueTarget()
+    parser.register("first", first)
+    parser.register("second", second)
+
+    await parser.adata_received_many(
+        [body[index : index + 32] for index in range(0, len(body), 32)]
+    )
+
+    assert first.value == b"hello"
+    assert second.value == b"world"
+
+
+@pytest.mark.asyncio
+async def test_offload_error():
+    encoder = MultipartEncoder(fields={"value": "hello", "other": "world"})
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type},
+        strict=True,
+        offload_threshold=0,
+    )
+    target = ValueTarget()
+    parser.register("value", target)
+
+    with pytest.raises(UnexpectedPartException):
+        await parser.adata_received(encoder.to_string())
+
+    assert target.value == b"hello"
+
+
+@pytest.mark.asyncio
+async def test_offload_callbacks():
+    encoder = MultipartEncoder(
+        fields={"file": ("file.txt", b"x" * 1000, "text/plain"), "value": "hello"}
+    )
+    threads = set()
+
+    class FilenameTarget(ThreadTarget):
+        def set_multipart_filename(self, filename):
+            threads.add(threading.get_ident())
+            super().set_multipart_filename(filename)
+
+    def matches(name, part_name):
+        threads.add(threading.get_ident())
+        return part_name == "value"
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, offload_threshold=0
+    )
+    file, value = FilenameTarget(), ValueTarget()
+    parser.register("file", file)
+    parser.register("values", value, matches)
+
+    await parser.adata_received(encoder.to_string())
+
+    assert file.multipart_filename == "file.txt"
+    assert value.value == b"hello"
+    # parts are looked up and set up on the event loop too
+    assert threads == {threading.get_ident()}
+
+
+@pytest.mark.asyncio
+async def test_offload_cancelled(monkeypatch):
+    data = b"""\
+--1234
+Content-Disposition: form-data; name*0="val"; name*1="ue"
+
+hello
+--1234--""".replace(b"\n", b"\r\n")
+
+    scanning, resume = threading.Event(), threading.Event()
+    backend = sys.modules[parser_module._Parser.__module__]
+    email_parser = backend.Parser
+
+    # the unusual header is parsed by the email package in the executor thread
+    def blocking_parser(**kwargs):
+        scanning.set()
+        resume.wait()
+        return email_parser(**kwargs)
+
+    monkeypatch.setattr(backend, "Parser", blocking_parser)
+
+    with ThreadPoolExecutor(1) as executor:
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": "multipart/form-data; boundary=1234"},
+            offload_threshold=0,
+            executor=executor,
+        )
+        parser.register("value", ValueTarget())
+
+        task = asyncio.ensure_future(parser.adata_received(data))
+        await asyncio.get_running_loop().run_in_executor(None, scanning.wait)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        resume.set()
+
+        # the parser is in an undefined state now
+        with pytest.raises(ParseFailedException):
+            await parser.adata_received(data)
+
+        with pytest.raises(ParseFailedException):
+            parser.data_received(data)
+
+
+def test_invalid_offload_threshold():
+    with pytest.raises(ValueError):
+        StreamingFormDataParser(
+            headers={"Content-Type": "multipart/form-data; boundary=1234"},
+            offload_threshold=-1,
+        )
+
+
+async def count_ticks(ticks, stop):
+    while not stop.is_set():
+        ticks.append(None)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "options, yields",
+    [
+        ({}, False),
+        ({"scan_budget": 1024}, True),
+        ({"scan_budget": 1024, "scan_time_budget": 0}, True),
+        ({"scan_budget": 1024, "scan_time_budget": 60_000_000}, False),
+    ],
+)
+async def test_scan_budget(options, yields):
+    data = os.urandom(100_000)
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "file": ("file.bin", data, "application/octet-stream"),
+        }
+    )
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, **options
+    )
+    name, file = ValueTarget(), ValueTarget()
+    parser.register("name", name)
+    parser.register("file", file)
+
+    ticks, stop = [], asyncio.Event()
+    ticker = asyncio.ensure_future(count_ticks(ticks, stop))
+    await asyncio.sleep(0)
+    ticks.clear()
+
+    await parser.adata_received(body)
+
+    stop.set()
+    await ticker
+
+    assert name.value == b"hello"
+    assert file.value == data
+    assert (len(ticks) > 10) == yields
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "options, sizes",
+    [
+        ({"scan_time_budget": 0}, [100_000]),
+        ({"scan_time_budget": 0, "max_emit_size": 30_000}, [30_000] * 3 + [10_000]),
+        ({"scan_budget": 30_000}, [30_000] * 3 + [10_000]),
+    ],
+)
+async def test_scan_budget_emits(options, sizes):
+    data = os.urandom(100_000)
+    encoder = MultipartEncoder(
+        fields={"file": ("file.bin", data, "application/octet-stream")}
+    )
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, **options
+    )
+    target = ViewTarget()
+    parser.register("file", target)
+
+    ticks, stop = [], asyncio.Event()
+    ticker = asyncio.ensure_future(count_ticks(ticks, stop))
+    await asyncio.sleep(0)
+    ticks.clear()
+
+    await parser.adata_received(encoder.to_string())
+
+    stop.set()
+    await ticker
+
+    # yielding in between does not split up the body data any further
+    assert [len(chunk) for chunk in target.chunks] == sizes
+    assert target.value == data
+    # at least after every piece but the last one
+    assert len(ticks) >= len(sizes) - 1
+
+
+@pytest.mark.asyncio
+async def test_scan_budget_error():
+    encoder = MultipartEncoder(fields={"value": "hello", "other": "world"})
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, strict=True, scan_budget=16
+    )
+    parser.register("value", ValueTarget())
+
+    with pytest.raises(UnexpectedPartException):
+        await parser.adata_received_many([encoder.to_string()])
+
+
+@pytest.mark.parametrize(
+    "options", [{"scan_budget": 0}, {"scan_budget": -1}, {"scan_time_budget": -1}]
+)
+def test_invalid_scan_budget(options):
+    with pytest.raises(ValueError):
+        StreamingFormDataParser(
+            headers={"Content-Type": "multipart/form-data; boundary=1234"}, **options
+        )
+
+
+def test_parse_file(tmp_path, monkeypatch):
+    data = os.urandom(100_000)
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "file": ("file.bin", data, "application/octet-stream"),
+        }
+    )
+    path = tmp_path / "body"
+    path.write_bytes(encoder.to_string())
+
+    for slice_size in (7, 4096, 16 * 1024 * 1024):
+        monkeypatch.setattr(parser_module, "_FILE_SLICE_SIZE", slice_size)
+
+        parser = StreamingFormDataParser(
+            headers={"Content-Type": encoder.content_type}, zero_copy=True
+        )
+        name, file = ValueTarget(), ViewTarget()
+        parser.register("name", name)
+        parser.register("file", file)
+
+        parser.parse_file(path)
+
+        assert name.value == b"hello"
+        assert file.value == data
+        # the target got slices of the mapping
+        assert any(type(chunk) is memoryview for chunk in file.views)
+
+
+def test_parse_file_empty(tmp_path):
+    path = tmp_path / "body"
+    path.write_bytes(b"")
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+    target = ValueTarget()
+    parser.register("value", target)
+
+    # not even the first boundary
+    with pytest.raises(ParseFailedException):
+        parser.parse_file(str(path))
+
+    assert target.value == b""
+
+
+class FinishTarget(ValueTarget):
+    def on_finish(self):
+        self.finished = True
+
+
+def test_parse_file_truncated(tmp_path):
+    encoder = MultipartEncoder(fields={"value": "hello", "other": "world"})
+    body = encoder.to_string()
+    path = tmp_path / "body"
+    path.write_bytes(body[: body.index(b"world") + 2])
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    value, other = ValueTarget(), FinishTarget()
+    parser.register("value", value)
+    parser.register("other", other)
+
+    with pytest.raises(ParseFailedException):
+        parser.parse_file(path)
+
+    assert value.value == b"hello"
+    assert not hasattr(other, "finished")
+
+
+@pytest.mark.asyncio
+async def test_aparse_file_truncated(tmp_path):
+    encoder = MultipartEncoder(fields={"value": "hello", "other": "world"})
+    body = encoder.to_string()
+    path = tmp_path / "body"
+    path.write_bytes(body[:-10])
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    parser.register("value", ValueTarget())
+
+    with pytest.raises(ParseFailedException):
+        await parser.aparse_file(path)
+
+
+def test_parse_file_error(tmp_path):
+    encoder = MultipartEncoder(fields={"value": "hello", "other": "world"})
+    path = tmp_path / "body"
+    path.write_bytes(encoder.to_string())
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, strict=True
+    )
+    parser.register("value", ValueTarget())
+
+    with pytest.raises(UnexpectedPartException):
+        parser.parse_file(path)
+
+
+@pytest.mark.asyncio
+async def test_aparse_file(tmp_path, monkeypatch):
+    data = os.urandom(100_000)
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "file": ("file.bin", data, "application/octet-stream"),
+        }
+    )
+    path = tmp_path / "body"
+    path.write_bytes(encoder.to_string())
+
+    monkeypatch.setattr(parser_module, "_FILE_SLICE_SIZE", 4096)
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    name, file = ValueTarget(), ThreadTarget()
+    parser.register("name", name)
+    parser.register("file", file)
+
+    await parser.aparse_file(path)
+
+    assert name.value == b"hello"
+    assert file.value == data
+
+
+def test_index():
+    data = os.urandom(100_000)
+    encoder = MultipartEncoder(
+        fields=[
+            ("name", "hello"),
+            ("empty", ""),
+            ("file", ("file.bin", data, "application/octet-stream")),
+            ("name", "world"),
+        ]
+    )
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+    target = ValueTarget()
+    parser.register("name", target)
+
+    form_index = parser.index(body)
+
+    # the targets are not called
+    assert target.value == b""
+
+    assert [part.name for part in form_index] == ["name", "empty", "file", "name"]
+    assert [body[part.start : part.end] for part in form_index] == [
+        b"hello",
+        b"",
+        data,
+        b"world",
+    ]
+
+    file = form_index.find("file")
+    assert file == form_index[2]
+    assert file.filename == "file.bin"
+    assert file.content_type == "application/octet-stream"
+    assert file.size == len(data)
+    assert form_index.body(body, 2) == data
+
+    assert form_index.find("name").start == form_index[0].start
+    assert form_index.find("missing") is None
+    assert form_index[-1:] == [form_index[3]]
+    assert len(form_index) == 4
+
+
+def test_index_file(tmp_path, monkeypatch):
+    encoder = MultipartEncoder(
+        fields=[
+            ("name", "hello"),
+            ("file", ("file.txt", b"line\r\n" * 100, "text/plain")),
+        ]
+    )
+    body = encoder.to_string()
+
+    path = tmp_path / "body"
+    path.write_bytes(body)
+
+    expected = list(
+        StreamingFormDataParser(headers={"Content-Type": encoder.content_type}).index(
+            body
+        )
+    )
+
+    for slice_size in (1, 7, 64, 1000):
+        monkeypatch.setattr(parser_module, "_FILE_SLICE_SIZE", slice_size)
+
+        parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+        assert list(parser.index_file(path)) == expected
+
+    assert expected[1] == IndexedPart(
+        "file",
+        "file.txt",
+        "text/plain",
+        expected[1].start,
+        expected[1].start + 600,
+    )
+
+
+def test_index_strict():
+    encoder = MultipartEncoder(fields={"value": "hello", "other": "world"})
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, strict=True
+    )
+    parser.register("value", ValueTarget())
+
+    with pytest.raises(UnexpectedPartException):
+        parser.index(encoder.to_string())
+
+
+def test_index_incomplete():
+    encoder = MultipartEncoder(fields={"value": "hello", "other": "world"})
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    with pytest.raises(ParseFailedException):
+        parser.index(body[:-10])
+
+
+class ThreadRecordingTarget(ValueTarget):
+    def __init__(self, threads, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = threads
+
+    def on_data_received(self, chunk):
+        self.threads.add(threading.get_ident())
+        super().on_data_received(chunk)
+
+
+def test_process():
+    files = {f"file{index}": os.urandom(10_000 + index) for index in range(8)}
+    encoder = MultipartEncoder(
+        fields=[
+            *(
+                (name, (f"{name}.bin", data, "application/octet-stream"))
+                for name, data in files.items()
+            ),
+            ("name", "hello"),
+            ("name", "world"),
+            ("other", "ignored"),
+        ]
+    )
+    body = encoder.to_string()
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    threads = set()
+    targets = {name: ThreadRecordingTarget(threads) for name in files}
+    for name, target in targets.items():
+        parser.register(name, target)
+
+    values = ListTarget()
+    parser.register("name", values)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = parser.process(body, executor)
+
+    assert [result.part.name for result in results] == [*files, "name", "name"]
+    assert all(result.error is None for result in results)
+
+    for name, data in files.items():
+        assert targets[name].value == data
+        assert targets[name].multipart_filename == f"{name}.bin"
+        assert targets[name].multipart_content_type == "application/octet-stream"
+
+    # parts going to the same target are processed in order
+    assert values.value == [b"hello", b"world"]
+
+    assert threading.get_ident() not in threads
+
+
+def test_process_errors():
+    encoder = MultipartEncoder(
+        fields=[("small", "hello"), ("large", "x" * 100), ("after", "world")]
+    )
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    small, after = ValueTarget(), ValueTarget()
+    parser.register("small", small)
+    parser.register("large", ValueTarget(validator=MaxSizeValidator(10)))
+    parser.register("after", after)
+
+    results = parser.process(encoder.to_string())
+
+    assert [type(result.error) for result in results] == [
+        type(None),
+        ValidationError,
+        type(None),
+    ]
+    assert small.value == b"hello"
+    assert after.value == b"world"
+
+
+def test_process_file(tmp_path):
+    files = {f"file{index}": os.urandom(10_000 + index) for index in range(4)}
+    encoder = MultipartEncoder(
+        fields={
+            name: (f"{name}.bin", data, "application/octet-stream")
+            for name, data in files.items()
+        }
+    )
+    path = tmp_path / "body"
+    path.write_bytes(encoder.to_string())
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    for name in files:
+        parser.register(name, FileTarget(str(tmp_path / f"{name}.out")))
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        results = parser.process_file(path, executor)
+
+    assert [result.error for result in results] == [None] * len(files)
+
+    for name, data in files.items():
+        assert (tmp_path / f"{name}.out").read_bytes() == data
+
+
+def test_process_pool_requires_file():
+    encoder = MultipartEncoder(fields={"value": "hello"})
+
+    parser = StreamingFormDataParser(headers={"Content-Type": encoder.content_type})
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(ValueError):
+            parser.process(encoder.to_string(), executor)
+
+
+def test_stats_disabled():
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+
+    assert parser.stats is None
+
+
+def test_stats():
+    encoder = MultipartEncoder(
+        fields=[
+            ("name", "hello"),
+            ("name", "world"),
+            ("file", ("file.txt", b"x" * 5000, "text/plain")),
+        ]
+    )
+    body = encoder.to_string()
+    boundary = encoder.boundary_value.encode()
+
+    # the beginning of the boundary, but not the boundary itself
+    fake = b"\r\n--" + boundary + b"xx"
+    body = body.replace(b"x" * 50, fake, 1)
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, stats=True
+    )
+    name, file = ValueTarget(), ValueTarget()
+    parser.register("name", name)
+    parser.register("file", file)
+
+    for index in range(0, len(body), 100):
+        parser.data_received(body[index : index + 100])
+
+    stats = parser.stats
+
+    assert stats.chunks == len(range(0, len(body), 100))
+    assert stats.bytes_received == len(body)
+    assert stats.searches >= stats.chunks
+    assert stats.bytes_searched > 5000
+    assert stats.false_matches == 1
+    assert stats.emitted_bytes == len(b"helloworld") + 5000 - 50 + len(fake)
+    assert sum(stats.emit_sizes.values()) == stats.emits
+    # both values are 5 bytes long
+    assert stats.emit_sizes[4] == 2
+    assert stats.headers_parsed == 3
+    # both name parts have the same headers
+    assert stats.header_cache_hits == 1
+    assert stats.header_time > 0
+    assert stats.carries > 0
+    assert stats.carried_bytes > 0
+    assert set(stats.target_time) == {name, file}
+    assert all(elapsed > 0 for elapsed in stats.target_time.values())
+
+    parser.reset(headers={"Content-Type": encoder.content_type})
+    assert parser.stats.bytes_received == 0
+    assert parser.stats.target_time == {}
+
+
+@pytest.mark.asyncio
+async def test_stats_async():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type},
+        stats=True,
+        concurrent_targets=True,
+    )
+    slow, fast = SlowTarget([]), ValueTarget()
+    parser.register("name", slow)
+    parser.register("name", fast)
+
+    await parser.adata_received(encoder.to_string())
+
+    assert parser.stats.emits == 1
+    # including the time the target was suspended
+    assert parser.stats.target_time[slow] >= 0.01
+    # timed separately, even though awaited concurrently
+    assert parser.stats.target_time[fast] < 0.01
+
+
+def test_stats_targets_of_part():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+
+    class SleepingTarget(ValueTarget):
+        def on_data_received(self, chunk):
+            time.sleep(0.01)
+            super().on_data_received(chunk)
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, stats=True
+    )
+    slow, fast = SleepingTarget(), ValueTarget()
+    parser.register("name", slow)
+    parser.register("name", fast)
+
+    parser.data_received(encoder.to_string())
+
+    assert parser.stats.target_time[slow] >= 0.01
+    assert parser.stats.target_time[fast] < 0.01
+
+
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.calls = []
+
+    def on_part_start(self, trace):
+        self.calls.append(("start", trace.name, trace.bytes_received))
+
+    def on_first_byte(self, trace):
+        self.calls.append(("first_byte", trace.name, trace.bytes_received))
+
+    def on_part_end(self, trace):
+        self.calls.append(("end", trace.name, trace))
+
+    def on_complete(self, trace):
+        self.calls.append(("complete", trace))
+
+
+def test_tracer():
+    encoder = MultipartEncoder(
+        fields={
+            "name": "hello",
+            "empty": "",
+            "ignored": "value",
+            "file": ("file.txt", b"x" * 5000, "text/plain"),
+        }
+    )
+    body = encoder.to_string()
+
+    tracer = RecordingTracer()
+    target = ValueTarget()
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, tracer=tracer
+    )
+    parser.register("name", ValueTarget())
+    parser.register("empty", ValueTarget())
+    parser.register("file", target)
+
+    for index in range(0, len(body), 1000):
+        parser.data_received(body[index : index + 1000])
+
+    assert [call[:2] for call in tracer.calls] == [
+        ("start", "name"),
+        ("first_byte", "name"),
+        ("end", "name"),
+        ("start", "empty"),
+        ("end", "empty"),
+        ("start", "file"),
+        ("first_byte", "file"),
+        ("end", "file"),
+        ("complete", tracer.calls[-1][1]),
+    ]
+
+    # the data about to be handed over is already counted
+    assert tracer.calls[1][2] == len(b"hello")
+
+    trace = tracer.calls[-2][2]
+    assert trace.filename == "file.txt"
+    assert trace.content_type == "text/plain"
+    assert trace.targets == [target]
+    assert trace.bytes_received == 5000
+    assert trace.headers_parsed_at <= trace.first_byte_at <= trace.ended_at
+    assert trace.target_time > 0
+
+    empty = tracer.calls[4][2]
+    assert empty.first_byte_at is None
+    assert empty.bytes_received == 0
+
+    complete = tracer.calls[-1][1]
+    assert complete.bytes_received == len(body)
+    assert complete.started_at <= trace.headers_parsed_at
+    assert complete.completed_at >= trace.ended_at
+
+    # once only
+    parser.data_received(b"")
+    assert len(tracer.calls) == 9
+
+
+def test_tracer_reset():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    body = encoder.to_string()
+
+    tracer = RecordingTracer()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, tracer=tracer
+    )
+    parser.register("name", ValueTarget())
+    parser.data_received_many([body])
+
+    parser.reset(headers={"Content-Type": encoder.content_type})
+    parser.register("name", ValueTarget())
+    parser.data_received(body)
+
+    completes = [call[1] for call in tracer.calls if call[0] == "complete"]
+    assert [complete.bytes_received for complete in completes] == [len(body)] * 2
+
+
+def test_tracer_events():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    body = encoder.to_string()
+
+    tracer = RecordingTracer()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, tracer=tracer
+    )
+
+    for index in range(0, len(body), 10):
+        list(parser.events(body[index : index + 10]))
+
+    ((call, complete),) = tracer.calls
+    assert call == "complete"
+    assert complete.bytes_received == len(body)
+
+
+class AsyncRecordingTracer(RecordingTracer):
+    async def on_first_byte(self, trace):
+        await asyncio.sleep(0)
+        super().on_first_byte(trace)
+
+    async def on_complete(self, trace):
+        await asyncio.sleep(0)
+        super().on_complete(trace)
+
+
+@pytest.mark.asyncio
+async def test_tracer_async():
+    encoder = MultipartEncoder(
+        fields={"name": "hello", "file": ("file.txt", b"x" * 5000, "text/plain")}
+    )
+
+    tracer = AsyncRecordingTracer()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, tracer=tracer
+    )
+    parser.register("name", SlowTarget([]))
+    parser.register("file", ValueTarget())
+
+    await parser.adata_received_many([encoder.to_string()])
+
+    assert [call[0] for call in tracer.calls] == [
+        "start",
+        "first_byte",
+        "end",
+        "start",
+        "first_byte",
+        "end",
+        "complete",
+    ]
+
+    # including the time the target was suspended
+    assert tracer.calls[2][2].target_time >= 0.01
+
+
+@pytest.mark.asyncio
+async def test_tracer_aparts():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+    body = encoder.to_string()
+
+    tracer = AsyncRecordingTracer()
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, tracer=tracer
+    )
+
+    async for part in parser.aparts(chunked(body, 10)):
+        await part.read()
+
+    ((call, complete),) = tracer.calls
+    assert call == "complete"
+    assert complete.bytes_received == len(body)
+
+
+def test_tracer_async_requires_async_methods():
+    encoder = MultipartEncoder(fields={"name": "hello"})
+
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": encoder.content_type}, tracer=AsyncRecordingTracer()
+    )
+    parser.register("name", ValueTarget())
+
+    with pytest.raises(TypeError):
+        parser.data_received(encoder.to_string())
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        array("b", b"--1234"),
+        numpy.zeros(4, dtype=numpy.int8),
+        numpy.zeros(4, dtype=numpy.uint16),
+        numpy.zeros((2, 4), dtype=numpy.uint8),
+        numpy.zeros(8, dtype=numpy.uint8)[::2],
+    ],
+)
+def test_invalid_buffer_input(data):
+    parser = StreamingFormDataParser(
+        headers={"Content-Type": "multipart/form-data; boundary=1234"}
+    )
+
+    with pytest.raises(ValueError):
+        parser.data_received(data)
@@ -331,6 +331,31 @@ def test_s3_upload(mock_client):
     assert resp == "my test file"
 
 
+def test_s3_upload_background(mock_client):
+    test_key = "test_background.txt"
+    path = f"s3://{BUCKET_NAME}/{test_key}"
+    target = S3Target(
+        path,
+        "wb",
+        transport_params={"client": mock_client},
+        background=True,
+    )
+
+    target.start()
+
+    chunk = bytearray(b"my test")
+    target.data_received(memoryview(chunk))
+    # the data has been copied before returning
+    chunk[:] = b"changed"
+    target.data_received(b" file")
+
+    target.finish()
+
+    resp = mock_client.get_object(Bucket=BUCKET_NAME, Key=test_key)["Body"].read()
+
+    assert resp == b"my test file"
+
+
 def test_csv_upload__incomplete_line_gets_completed_next_chunk__pop_between_chunks():
     target = CSVTarget()
     target.start()
@@ -406,6 +431,35 @@ def test_csv_upload__incomplete_line_in_the_end_of_chunk__include_partial():
     target.finish()
 
 
+def test_nonblocking_targets():
+    assert NullTarget.is_nonblocking
+    assert ValueTarget.is_nonblocking
+    assert ListTarget.is_nonblocking
+    assert CSVTarget.is_nonblocking
+    assert not BaseTarget.is_nonblocking
+    assert not FileTarget.is_nonblocking
+    assert not S3Target.is_nonblocking
+
+
+def test_nonblocking_subclass():
+    class PlainTarget(ValueTarget):
+        pass
+
+    class AsyncTarget(ValueTarget):
+        async def on_data_received_async(self, chunk):
+            pass
+
+    class DeclaredTarget(ValueTarget):
+        is_nonblocking = True
+
+        def on_data_received(self, chunk):
+            pass
+
+    assert PlainTarget.is_nonblocking
+    assert not AsyncTarget.is_nonblocking
+    assert DeclaredTarget.is_nonblocking
+
+
 @pytest.mark.asyncio
 async def test_value_target_basic_async():
     target = ValueTarget()